@@ -0,0 +1,192 @@
+"""
+Columnar Parquet archive of price_time_series.
+
+Layout (hive partitioned, readable with pyarrow.dataset / pandas):
+    price_archive/month=2026-01/search_id=3/part-2026-01-01-2026-01-07.parquet
+    price_archive/month=2026-01/search_id=3/data.parquet   (after compaction)
+
+Needs the optional dependency pyarrow (`uv sync --extra archive`).
+"""
+import os
+import time
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from db import get_engine
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+ARCHIVE_DIR = "price_archive"
+COMPACTED_FILE = "data.parquet"
+
+# Dates are near-sorted integers, prices repeat a lot
+PARQUET_OPTIONS = {
+    "compression": "zstd",
+    "use_dictionary": ["price", "scraped_at"],
+    "column_encoding": {"departure_date": "DELTA_BINARY_PACKED"},
+}
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "The Parquet archive needs pyarrow, install it with `uv sync --extra archive`."
+        ) from e
+    return pa, pq
+
+
+def _schema(pa):
+    return pa.schema([
+        ("departure_date", pa.date32()),
+        ("price", pa.int32()),
+        ("scraped_at", pa.date32()),
+    ])
+
+
+def _partition_dir(archive_dir: str, month: str, search_id: int) -> str:
+    return os.path.join(archive_dir, f"month={month}", f"search_id={search_id}")
+
+
+def _write_parquet(frame: pd.DataFrame, path: str) -> None:
+    pa, pq = _require_pyarrow()
+    table = pa.Table.from_pandas(frame, schema=_schema(pa), preserve_index=False)
+    # Write next to the target and rename, readers never see half a file
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, **PARQUET_OPTIONS)
+    os.replace(tmp_path, path)
+
+
+def export_prices(
+        engine: Optional[Engine] = None,
+        archive_dir: str = ARCHIVE_DIR,
+        until: Optional[date] = None,
+        ) -> int:
+    """
+    Appends all price rows not archived yet to the Parquet archive.
+
+    Works per route from its watermark (archive_state.exported_through) and
+    only exports finished scrape days (before `until`, defaults to today),
+    so the DB is never rescanned and a day is never exported twice.
+
+    :return: number of exported rows
+    :rtype: int
+    """
+    engine = engine or get_engine()
+    _require_pyarrow()
+    until = until or date.today()
+
+    with engine.connect() as conn:
+        watermarks: Dict[int, Optional[str]] = dict(conn.execute(text(
+            "SELECT s.id, a.exported_through FROM searches s "
+            "LEFT JOIN archive_state a ON a.search_id = s.id"
+        )).all())
+
+    exported = 0
+    for search_id, watermark in watermarks.items():
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            # Served by the (search_id, scraped_at, departure_date, price) covering index
+            frame = pd.read_sql(
+                text(
+                    "SELECT departure_date, price, scraped_at FROM price_time_series "
+                    "WHERE search_id = :s AND scraped_at > :after AND scraped_at < :until "
+                    "ORDER BY scraped_at, departure_date"
+                ),
+                conn,
+                params={"s": search_id, "after": watermark or "", "until": until.isoformat()},
+            )
+        if frame.empty:
+            continue
+
+        for column in ("departure_date", "scraped_at"):
+            frame[column] = pd.to_datetime(frame[column]).dt.date
+        frame["price"] = frame["price"].astype("Int32")
+
+        months = pd.to_datetime(frame["scraped_at"]).dt.strftime("%Y-%m")
+        for month, part in frame.groupby(months):
+            directory = _partition_dir(archive_dir, month, search_id)
+            os.makedirs(directory, exist_ok=True)
+            first, last = part["scraped_at"].min(), part["scraped_at"].max()
+            _write_parquet(part, os.path.join(directory, f"part-{first}-{last}.parquet"))
+
+        # The watermark only moves after the files are safely on disk
+        exported_through = frame["scraped_at"].max().isoformat()
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO archive_state (search_id, exported_through) VALUES (:s, :d) "
+                    "ON CONFLICT (search_id) DO UPDATE SET exported_through = excluded.exported_through"
+                ),
+                {"s": search_id, "d": exported_through},
+            )
+
+        exported += len(frame)
+        logger.info(
+            f"Search {search_id}: archived {len(frame)} rows through {exported_through} "
+            f"in {time.perf_counter() - start:.1f}s."
+        )
+
+    return exported
+
+
+def compact_archive(archive_dir: str = ARCHIVE_DIR) -> int:
+    """
+    Merges the small part files of every month/route partition into one file.
+
+    :return: number of partitions compacted
+    :rtype: int
+    """
+    pa, pq = _require_pyarrow()
+    compacted = 0
+
+    if not os.path.isdir(archive_dir):
+        return compacted
+
+    for month_dir in sorted(os.listdir(archive_dir)):
+        month_path = os.path.join(archive_dir, month_dir)
+        if not os.path.isdir(month_path):
+            continue
+        for search_dir in sorted(os.listdir(month_path)):
+            directory = os.path.join(month_path, search_dir)
+            parts = sorted(f for f in os.listdir(directory) if f.startswith("part-") and f.endswith(".parquet"))
+            if not parts:
+                continue
+
+            files: List[str] = parts
+            if os.path.exists(os.path.join(directory, COMPACTED_FILE)):
+                files = [COMPACTED_FILE] + parts
+
+            tables = [pq.read_table(os.path.join(directory, f), schema=_schema(pa)) for f in files]
+            frame = pa.concat_tables(tables).to_pandas()
+            frame["price"] = frame["price"].astype("Int32")
+            # Parts left over by an interrupted compaction are already in data.parquet
+            frame = (
+                frame.drop_duplicates(subset=["departure_date", "scraped_at"], keep="last")
+                .sort_values(["scraped_at", "departure_date"])
+            )
+            _write_parquet(frame, os.path.join(directory, COMPACTED_FILE))
+
+            for f in parts:
+                os.remove(os.path.join(directory, f))
+            compacted += 1
+            logger.info(f"Compacted {len(files)} files in {directory}.")
+
+    return compacted
+
+
+def read_archive(archive_dir: str = ARCHIVE_DIR, search_id: Optional[int] = None) -> pd.DataFrame:
+    """Loads the archive (optionally one route) as a DataFrame with search_id and month columns."""
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(archive_dir, format="parquet", partitioning="hive")
+    filter_ = ds.field("search_id") == search_id if search_id is not None else None
+    return dataset.to_table(filter=filter_).to_pandas()
@@ -0,0 +1,150 @@
+"""
+Backfill planner: finds the scrape days a route missed, e.g. while the
+container was down, and queues one catch-up scrape for every route that is
+still overdue.
+
+A gap is a stretch of days in which a route was due but not scraped
+according to scrape_runs and its cadence. Past prices cannot be scraped
+after the fact, so gaps between two scrapes are only reported. A route whose
+last scrape is overdue gets a single job of kind "backfill" for today, with
+BACKFILL_PRIORITY below every regular job and at most KIND_LIMITS["backfill"]
+of them running at a time (see job_queue.py).
+"""
+from __future__ import annotations
+import math
+import logging
+from datetime import date, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from db import RegisteredSearch, get_engine
+from job_queue import enqueue_jobs
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+BACKFILL_LOOKBACK_DAYS = 30     # gaps older than this are not reported
+BACKFILL_PRIORITY = -1          # regular jobs have priorities >= 0
+
+
+class Gap(NamedTuple):
+    search: RegisteredSearch
+    first_missing: date
+    last_missing: date
+    ongoing: bool   # no scrape since, a catch-up scrape makes sense
+
+    @property
+    def days(self) -> int:
+        return (self.last_missing - self.first_missing).days + 1
+
+
+class BackfillPlan(NamedTuple):
+    gaps: List[Gap]
+    enqueued: int
+
+
+def _due_days(cadence: int) -> int:
+    """Days between two scrapes of a route with `cadence` seconds, at least one."""
+    return max(1, math.ceil(cadence / 86400))
+
+
+def find_gaps(
+        routes: Iterable[Tuple[RegisteredSearch, int]],
+        today: Optional[date] = None,
+        lookback_days: int = BACKFILL_LOOKBACK_DAYS,
+        engine: Optional[Engine] = None,
+        ) -> List[Gap]:
+    """
+    Finds the missed scrape days of every route within the lookback window.
+
+    Routes that were never scraped have no gaps, their first scrape is just pending.
+
+    :param routes: (search, cadence in seconds) per configured route
+    :param today: the current day, it is not missed before it is over
+    :return: the gaps, oldest first per route
+    :rtype: List[Gap]
+    """
+    engine = engine or get_engine()
+    today = today or date.today()
+    since = today - timedelta(days=lookback_days)
+    routes = list(routes)
+
+    with engine.connect() as conn:
+        # Consecutive scrapes of a route more than a day apart, and the last scrape of every route
+        steps = conn.execute(
+            text(
+                "SELECT search_id, previous, scraped_at FROM ("
+                "  SELECT search_id, scraped_at,"
+                "         LAG(scraped_at) OVER (PARTITION BY search_id ORDER BY scraped_at) AS previous"
+                "  FROM scrape_runs WHERE scraped_at <= :today"
+                ") WHERE scraped_at >= :since AND julianday(scraped_at) - julianday(previous) > 1"
+            ),
+            {"today": today.isoformat(), "since": since.isoformat()},
+        ).all()
+        last_scraped = dict(conn.execute(
+            text("SELECT search_id, MAX(scraped_at) FROM scrape_runs WHERE scraped_at <= :today GROUP BY search_id"),
+            {"today": today.isoformat()},
+        ).all())
+
+    due_days = {search.id: _due_days(cadence) for search, cadence in routes}
+    by_id = {search.id: search for search, _ in routes}
+    as_date = lambda value: date.fromisoformat(str(value)[:10])
+
+    gaps = []
+    for search_id, previous, scraped_at in steps:
+        if search_id not in by_id:
+            continue
+        first_missing = max(as_date(previous) + timedelta(days=due_days[search_id]), since)
+        last_missing = as_date(scraped_at) - timedelta(days=1)
+        if first_missing <= last_missing:
+            gaps.append(Gap(by_id[search_id], first_missing, last_missing, ongoing=False))
+
+    for search_id, last in last_scraped.items():
+        if search_id not in by_id:
+            continue
+        first_missing = as_date(last) + timedelta(days=due_days[search_id])
+        last_missing = today - timedelta(days=1)
+        if first_missing <= last_missing:
+            gaps.append(Gap(by_id[search_id], max(first_missing, since), last_missing, ongoing=True))
+
+    return sorted(gaps, key=lambda gap: (gap.search.id, gap.first_missing))
+
+
+def plan_backfill(
+        routes: Iterable[Tuple[RegisteredSearch, int]],
+        today: Optional[date] = None,
+        enqueue: bool = True,
+        engine: Optional[Engine] = None,
+        ) -> BackfillPlan:
+    """
+    Reports the gaps of all routes and queues one catch-up job per overdue route.
+
+    The catch-up job is the route's job of today's run, a regular run later
+    that day does not scrape the route a second time.
+
+    :param routes: (search, cadence in seconds) per configured route
+    :param enqueue: False only reports the gaps (dry run)
+    :return: the gaps and the number of new catch-up jobs
+    :rtype: BackfillPlan
+    """
+    engine = engine or get_engine()
+    today = today or date.today()
+    gaps = find_gaps(routes, today, engine=engine)
+
+    for gap in gaps:
+        route = f"{gap.search.origin} -> {gap.search.destination}"
+        span = f"{gap.first_missing}" if gap.days == 1 else f"{gap.first_missing} to {gap.last_missing}"
+        logger.warning(
+            f"{route} was not scraped when due for {gap.days} days ({span})"
+            f"{', still overdue' if gap.ongoing else ''}."
+        )
+
+    overdue = sorted({gap.search.id for gap in gaps if gap.ongoing})
+    enqueued = 0
+    if enqueue and overdue:
+        enqueued = enqueue_jobs(overdue, today, priority=BACKFILL_PRIORITY, engine=engine, kind="backfill")
+
+    logger.info(f"Backfill: {len(gaps)} gaps, {len(overdue)} overdue routes, {enqueued} catch-up jobs queued.")
+    return BackfillPlan(gaps, enqueued)
@@ -0,0 +1,306 @@
+"""
+Benchmarks for the storage layer, run against throw-away databases.
+
+Usage:
+    uv run benchmark.py storage [--routes 30] [--days 30]
+    uv run benchmark.py indexes [--routes 30] [--days 920]   (~10M rows)
+    uv run benchmark.py snapshots [--routes 30] [--days 90]
+    uv run benchmark.py imports [--repeat 5] [--top 5] [--budget-ms 1500]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from datetime import date, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import insert, text
+
+from db import Base, PriceTimeSeries, SQLITE_PRAGMAS, Search, create_db_engine, migrate
+from ingestion import PriceWriter
+from snapshot_storage import load_snapshots
+
+
+CALENDAR_DAYS = 365
+
+# Entry modules and the heavy packages they must not load at import time.
+# CLI tools and worker processes only pay for what they actually use.
+IMPORT_GUARDS = {
+    "db": ("pandas", "numpy", "selenium", "webdriver_manager"),
+    "maintenance": ("pandas", "selenium", "webdriver_manager"),
+    "ingestion": ("pandas", "numpy", "selenium", "webdriver_manager"),
+    "web_scraper": ("pandas", "selenium.webdriver.chrome.webdriver", "webdriver_manager"),
+    "http_scraper": ("pandas", "selenium"),
+    "route_executor": ("pandas", "selenium"),
+    "main": ("pandas", "numpy", "selenium", "webdriver_manager"),
+    "coordinator": ("pandas", "selenium", "webdriver_manager"),
+    # Fleet workers never touch the database
+    "fleet_worker": ("pandas", "sqlalchemy", "selenium"),
+}
+
+
+def fake_scrapes(routes: int, days: int, start: date = date(2025, 1, 1)) -> Iterator[List[Dict]]:
+    """Yields the rows of one route's daily scrape at a time, like the tracker produces them."""
+    rng = random.Random(42)
+    for day in range(days):
+        scraped_at = start + timedelta(days=day)
+        for search_id in range(1, routes + 1):
+            yield [
+                {
+                    "search_id": search_id,
+                    "departure_date": scraped_at + timedelta(days=offset),
+                    "price": rng.choice((None, rng.randint(40, 900))),
+                    "scraped_at": scraped_at,
+                }
+                for offset in range(CALENDAR_DAYS)
+            ]
+
+
+def add_routes(engine, routes: int) -> None:
+    """Adds the searches rows fake_scrapes refers to, foreign keys are enforced."""
+    with engine.begin() as conn:
+        conn.execute(insert(Search.__table__), [
+            {"id": search_id, "origin": f"Origin {search_id}", "destination": f"Destination {search_id}", "distance": 1000}
+            for search_id in range(1, routes + 1)
+        ])
+
+
+def _timed(label: str, func, rows: int | None = None) -> float:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({rows / elapsed:,.0f} rows/s)" if rows else ""
+    print(f"  {label:<28} {elapsed:8.3f}s{rate}")
+    return elapsed
+
+
+def bench_storage(args: argparse.Namespace) -> None:
+    """Insert and read throughput with SQLite defaults vs. the SQLITE_PRAGMAS profile."""
+    total_rows = args.routes * args.days * CALENDAR_DAYS
+    print(f"{args.routes} routes x {args.days} scrape days = {total_rows:,} rows")
+
+    for label, pragmas in (("sqlite defaults", {}), ("storage profile", SQLITE_PRAGMAS)):
+        print(f"\n{label}:")
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_db_engine(os.path.join(tmp, "bench.db"), pragmas=pragmas)
+            Base.metadata.create_all(engine)
+            add_routes(engine, args.routes)
+            table = PriceTimeSeries.__table__
+
+            def write():
+                # One transaction per route, like the daily run
+                for rows in fake_scrapes(args.routes, args.days):
+                    with engine.begin() as conn:
+                        conn.execute(insert(table), rows)
+
+            def read_history():
+                with engine.connect() as conn:
+                    for search_id in range(1, args.routes + 1):
+                        conn.execute(
+                            text("SELECT scraped_at, price FROM price_time_series "
+                                 "WHERE search_id = :s AND departure_date = :d"),
+                            {"s": search_id, "d": date(2025, 6, 1)},
+                        ).fetchall()
+
+            def read_aggregate():
+                with engine.connect() as conn:
+                    conn.execute(
+                        text("SELECT search_id, scraped_at, MIN(price) FROM price_time_series "
+                             "GROUP BY search_id, scraped_at")
+                    ).fetchall()
+
+            _timed("insert", write, total_rows)
+            _timed("price history per route", read_history)
+            _timed("cheapest per route and day", read_aggregate, total_rows)
+            engine.dispose()
+
+
+def _fill(engine, routes: int, days: int, batch_rows: int = 200_000) -> None:
+    table = PriceTimeSeries.__table__
+    batch: List[Dict] = []
+    with engine.begin() as conn:
+        for rows in fake_scrapes(routes, days):
+            batch.extend(rows)
+            if len(batch) >= batch_rows:
+                conn.execute(insert(table), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(table), batch)
+
+
+def bench_indexes(args: argparse.Namespace) -> None:
+    """Main read queries on a large table before and after db.migrate adds the indexes."""
+    total_rows = args.routes * args.days * CALENDAR_DAYS
+    print(f"{args.routes} routes x {args.days} scrape days = {total_rows:,} rows")
+
+    queries = {
+        "price history route/date": (
+            "SELECT scraped_at, price FROM price_time_series "
+            "WHERE search_id = :s AND departure_date = :d ORDER BY scraped_at",
+            {"s": args.routes // 2 + 1, "d": date(2025, 6, 1)},
+        ),
+        "latest scrape of a route": (
+            "SELECT departure_date, price FROM price_time_series "
+            "WHERE search_id = :s AND scraped_at = "
+            "(SELECT MAX(scraped_at) FROM price_time_series WHERE search_id = :s)",
+            {"s": args.routes // 2 + 1},
+        ),
+        "latest scrape day per route": (
+            "SELECT search_id, MAX(scraped_at) FROM price_time_series GROUP BY search_id",
+            {},
+        ),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(os.path.join(tmp, "bench.db"))
+        # Start from the old layout: the table without any secondary index
+        with engine.begin() as conn:
+            Search.__table__.create(conn)
+            PriceTimeSeries.__table__.create(conn)
+            for index in PriceTimeSeries.__table__.indexes:
+                index.drop(conn)
+        add_routes(engine, args.routes)
+
+        _timed("fill", lambda: _fill(engine, args.routes, args.days), total_rows)
+
+        def run_queries(label):
+            print(f"\n{label}:")
+            with engine.connect() as conn:
+                for name, (sql, params) in queries.items():
+                    _timed(name, lambda: conn.execute(text(sql), params).fetchall())
+
+        run_queries("without indexes")
+        print()
+        _timed("migrate (build indexes)", lambda: migrate(engine), total_rows)
+        run_queries("with indexes")
+        engine.dispose()
+
+
+def _file_size_mb(engine, path: str) -> float:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path) / 1024 / 1024
+
+
+def bench_snapshots(args: argparse.Namespace) -> None:
+    """Storage size and read latency of row-per-cell price_time_series vs. packed price_snapshots."""
+    total_rows = args.routes * args.days * CALENDAR_DAYS
+    print(f"{args.routes} routes x {args.days} scrape days = {total_rows:,} rows")
+    search_id = args.routes // 2 + 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, storage_mode in (("price_time_series", "append"), ("price_snapshots", "snapshot")):
+            print(f"\n{label}:")
+            path = os.path.join(tmp, f"{storage_mode}.db")
+            engine = create_db_engine(path)
+            Base.metadata.create_all(engine)
+            add_routes(engine, args.routes)
+            writer = PriceWriter(engine, flush_rows=200_000, storage_mode=storage_mode)
+
+            def write():
+                for rows in fake_scrapes(args.routes, args.days):
+                    writer._write(rows)
+
+            if storage_mode == "append":
+                def read():
+                    with engine.connect() as conn:
+                        conn.execute(
+                            text("SELECT scraped_at, departure_date, price FROM price_time_series "
+                                 "WHERE search_id = :s ORDER BY scraped_at, departure_date"),
+                            {"s": search_id},
+                        ).fetchall()
+            else:
+                def read():
+                    load_snapshots(engine, search_id)
+
+            _timed("insert", write, total_rows)
+            _timed("read route history", read)
+            print(f"  {'file size':<28} {_file_size_mb(engine, path):8.1f} MB")
+            engine.dispose()
+
+
+def import_profile(module: str) -> Dict[str, int]:
+    """
+    Imports `module` in a fresh interpreter with `-X importtime`.
+
+    :return: cumulative import time in microseconds of every module loaded
+    :rtype: Dict[str, int]
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=repo_dir)
+    # Run outside of the repo, importing some modules creates log files in the working directory
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=tmp, env=env, capture_output=True, text=True, check=True,
+        )
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def bench_imports(args: argparse.Namespace) -> None:
+    """Import time of the entry modules, fails if one loads a forbidden package or exceeds the budget."""
+    failures = []
+    for module, forbidden in IMPORT_GUARDS.items():
+        # Best of several runs, the first one also pays for cold disk caches
+        profiles = [import_profile(module) for _ in range(args.repeat)]
+        profile = min(profiles, key=lambda p: p[module])
+        total_ms = profile[module] / 1000
+
+        print(f"\n{module}: {total_ms:.0f} ms")
+        heaviest = sorted((name for name in profile if name != module), key=profile.get, reverse=True)
+        for name in heaviest[:args.top]:
+            print(f"  {name:<40} {profile[name] / 1000:8.1f} ms")
+
+        loaded = [name for name in profile if any(name == f or name.startswith(f + ".") for f in forbidden)]
+        if loaded:
+            failures.append(f"{module} imports {', '.join(sorted(loaded)[:3])}")
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            failures.append(f"{module} takes {total_ms:.0f} ms, budget is {args.budget_ms:.0f} ms")
+
+    if failures:
+        print("\nImport time regressions:\n  " + "\n  ".join(failures))
+        raise SystemExit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    storage = subparsers.add_parser("storage", help=bench_storage.__doc__)
+    storage.add_argument("--routes", type=int, default=30)
+    storage.add_argument("--days", type=int, default=30)
+    storage.set_defaults(func=bench_storage)
+
+    indexes = subparsers.add_parser("indexes", help=bench_indexes.__doc__)
+    indexes.add_argument("--routes", type=int, default=30)
+    indexes.add_argument("--days", type=int, default=920)
+    indexes.set_defaults(func=bench_indexes)
+
+    snapshots = subparsers.add_parser("snapshots", help=bench_snapshots.__doc__)
+    snapshots.add_argument("--routes", type=int, default=30)
+    snapshots.add_argument("--days", type=int, default=90)
+    snapshots.set_defaults(func=bench_snapshots)
+
+    imports = subparsers.add_parser("imports", help=bench_imports.__doc__)
+    imports.add_argument("--repeat", type=int, default=5)
+    imports.add_argument("--top", type=int, default=5, help="Show the N slowest imports per module.")
+    imports.add_argument("--budget-ms", type=float, default=None, help="Fail if a module takes longer.")
+    imports.set_defaults(func=bench_imports)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
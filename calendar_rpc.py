@@ -0,0 +1,134 @@
+from __future__ import annotations
+import re
+import json
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Google Flights fetches the calendar prices through these batchexecute RPCs
+CALENDAR_RPC_MARKERS = ("GetCalendarPicker", "GetCalendarGraph")
+
+# Anti-JSON-hijacking prefix in front of every batchexecute response
+XSSI_PREFIX = ")]}'"
+
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def is_calendar_rpc_url(url: str) -> bool:
+    return any(marker in url for marker in CALENDAR_RPC_MARKERS)
+
+
+def _iter_json_chunks(body: str) -> Iterable[Any]:
+    """
+    Yields every top-level JSON value of a batchexecute response.
+
+    The body is the XSSI prefix followed by length-prefixed JSON chunks.
+    The lengths are not reliable (UTF-16 units), so the chunks are decoded
+    one after another and the numeric length markers in between are skipped.
+    """
+    if body.startswith(XSSI_PREFIX):
+        body = body[len(XSSI_PREFIX):]
+
+    decoder = json.JSONDecoder()
+    idx = 0
+    end = len(body)
+    while idx < end:
+        char = body[idx]
+        if char != "[" and char != "{":
+            idx += 1
+            continue
+        try:
+            value, idx = decoder.raw_decode(body, idx)
+        except json.JSONDecodeError:
+            idx += 1
+            continue
+        yield value
+
+
+def _iter_rpc_payloads(body: str) -> Iterable[Any]:
+    """Yields the decoded inner payload of each "wrb.fr" envelope."""
+    for chunk in _iter_json_chunks(body):
+        if not isinstance(chunk, list):
+            continue
+        for envelope in chunk:
+            if (
+                isinstance(envelope, list)
+                and len(envelope) > 2
+                and envelope[0] == "wrb.fr"
+                and isinstance(envelope[2], str)
+            ):
+                try:
+                    yield json.loads(envelope[2])
+                except json.JSONDecodeError:
+                    continue
+
+
+def _extract_price(entry: list) -> int | None:
+    # Price block looks like [[null, 123], "<booking token>"]
+    if len(entry) < 3 or not isinstance(entry[2], list) or not entry[2]:
+        return None
+    price_block = entry[2][0]
+    if isinstance(price_block, list) and len(price_block) > 1 and isinstance(price_block[1], (int, float)):
+        return int(price_block[1])
+    return None
+
+
+def _walk_calendar_entries(node: Any, found: Dict[str, int | None]) -> None:
+    if not isinstance(node, list):
+        return
+
+    # Calendar entries look like ["2026-05-01", null, [[null, 123], "..."], ...]
+    if len(node) >= 3 and isinstance(node[0], str) and ISO_DATE.match(node[0]):
+        price = _extract_price(node)
+        # Keep a known price if a later, overlapping response has none
+        if price is not None or node[0] not in found:
+            found[node[0]] = price
+        return
+
+    for child in node:
+        _walk_calendar_entries(child, found)
+
+
+def parse_calendar_payload(body: str) -> List[Dict]:
+    """
+    Parses one recorded calendar RPC response body.
+
+    :param body: raw response text of a GetCalendarPicker/GetCalendarGraph call
+    :type body: str
+    :return: list of {"departure_date", "price"} dicts
+    :rtype: List[Dict]
+    """
+    found: Dict[str, int | None] = {}
+    for payload in _iter_rpc_payloads(body):
+        _walk_calendar_entries(payload, found)
+
+    return [{"departure_date": date_iso, "price": price} for date_iso, price in found.items()]
+
+
+def parse_calendar_payloads(bodies: Iterable[str]) -> pd.DataFrame:
+    """
+    Merges several calendar RPC responses into the departure_date/price frame.
+
+    Later responses win for dates that appear more than once, unless they
+    carry no price.
+
+    :param bodies: raw response texts in the order they were received
+    :type bodies: Iterable[str]
+    :return: DataFrame with departure_date and price columns
+    :rtype: pd.DataFrame
+    """
+    import pandas as pd
+
+    merged: Dict[str, int | None] = {}
+    for body in bodies:
+        for row in parse_calendar_payload(body):
+            if row["price"] is not None or row["departure_date"] not in merged:
+                merged[row["departure_date"]] = row["price"]
+
+    df = pd.DataFrame(
+        [{"departure_date": date_iso, "price": price} for date_iso, price in merged.items()],
+        columns=['departure_date', 'price'],
+    )
+    return df.sort_values('departure_date').reset_index(drop=True)
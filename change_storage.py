@@ -0,0 +1,221 @@
+from __future__ import annotations
+import time
+import logging
+from datetime import date
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+
+def record_scrape_runs(conn: Connection, rows: List[Dict]) -> None:
+    """Marks every (search_id, scraped_at) of the rows as scraped."""
+    runs = {(row["search_id"], row["scraped_at"].isoformat()) for row in rows}
+    conn.execute(
+        text("INSERT OR IGNORE INTO scrape_runs (search_id, scraped_at) VALUES (:s, :d)"),
+        [{"s": search_id, "d": day} for search_id, day in sorted(runs)],
+    )
+
+
+def write_price_changes(
+        conn: Connection,
+        search_id: int,
+        scraped_at: date,
+        rows: List[Dict],
+        replace: bool = True,
+        ) -> None:
+    """
+    Applies one scrape of a route to the change-only price_intervals table.
+
+    Open intervals whose price is unchanged are extended to this scrape,
+    every other price starts a new interval. An interval is only extended
+    if it ended at the route's previous scrape, so days a departure date was
+    missing from the calendar stay missing in the reconstruction.
+
+    Scrapes of a route must arrive in chronological order. A repeated scrape
+    of the latest day either replaces that day (`replace=True`) or only adds
+    departure dates not seen that day yet.
+
+    :param rows: dicts with departure_date (date) and price
+    """
+    day = scraped_at.isoformat()
+    params = {"s": search_id, "day": day}
+
+    latest = conn.execute(
+        text("SELECT MAX(scraped_at) FROM scrape_runs WHERE search_id = :s"), params
+    ).scalar()
+    if latest is not None and latest > day:
+        raise ValueError(
+            f"Change-only storage needs chronological scrapes, search {search_id} "
+            f"already has {latest}, got {day}"
+        )
+
+    params["prev"] = conn.execute(
+        text("SELECT MAX(scraped_at) FROM scrape_runs WHERE search_id = :s AND scraped_at < :day"), params
+    ).scalar()
+
+    if latest == day and replace:
+        # Take this day's observations back out before applying the new ones
+        conn.execute(text("DELETE FROM price_intervals WHERE search_id = :s AND valid_from = :day"), params)
+        conn.execute(
+            text("UPDATE price_intervals SET valid_to = :prev WHERE search_id = :s AND valid_to = :day"), params
+        )
+
+    conn.execute(text("INSERT OR IGNORE INTO scrape_runs (search_id, scraped_at) VALUES (:s, :day)"), params)
+
+    conn.execute(text("CREATE TEMP TABLE IF NOT EXISTS incoming_prices (departure_date DATE PRIMARY KEY, price INTEGER)"))
+    conn.execute(text("DELETE FROM incoming_prices"))
+    conn.execute(
+        text("INSERT OR REPLACE INTO incoming_prices (departure_date, price) VALUES (:d, :p)"),
+        [{"d": row["departure_date"].isoformat(), "p": row["price"]} for row in rows],
+    )
+
+    if params["prev"] is not None:
+        # Departure dates a kept repeated scrape of the day already has an
+        # interval for are left alone, they would end up with two prices
+        conn.execute(
+            text(
+                "UPDATE price_intervals SET valid_to = :day "
+                "WHERE search_id = :s AND valid_to = :prev AND EXISTS ("
+                "  SELECT 1 FROM incoming_prices i "
+                "  WHERE i.departure_date = price_intervals.departure_date AND i.price IS price_intervals.price"
+                ") AND NOT EXISTS ("
+                "  SELECT 1 FROM price_intervals p "
+                "  WHERE p.search_id = :s AND p.departure_date = price_intervals.departure_date AND p.valid_to = :day)"
+            ),
+            params,
+        )
+
+    conn.execute(
+        text(
+            "INSERT INTO price_intervals (search_id, departure_date, price, valid_from, valid_to) "
+            "SELECT :s, i.departure_date, i.price, :day, :day FROM incoming_prices i "
+            "WHERE NOT EXISTS ("
+            "  SELECT 1 FROM price_intervals p "
+            "  WHERE p.search_id = :s AND p.departure_date = i.departure_date AND p.valid_to = :day)"
+        ),
+        params,
+    )
+
+
+def load_daily_prices(
+        engine: Engine,
+        search_id: Optional[int] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        ) -> pd.DataFrame:
+    """
+    Rebuilds the full daily series from the change-only storage.
+
+    :param search_id: restrict to one route, defaults to all
+    :param start: first scrape day to include, defaults to the first one
+    :param end: last scrape day to include, defaults to the last one
+    :return: DataFrame with search_id, departure_date, price, scraped_at,
+        exactly like price_time_series would hold them
+    """
+    import pandas as pd
+
+    where = []
+    params = {}
+    if search_id is not None:
+        where.append("search_id = :s")
+        params["s"] = search_id
+    if start is not None:
+        where.append("scraped_at >= :start")
+        params["start"] = start.isoformat()
+    if end is not None:
+        where.append("scraped_at <= :end")
+        params["end"] = end.isoformat()
+
+    sql = "SELECT search_id, departure_date, price, scraped_at FROM price_history_daily"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY search_id, scraped_at, departure_date"
+
+    with engine.connect() as conn:
+        return pd.read_sql(text(sql), conn, params=params)
+
+
+def migrate_to_change_only(engine: Engine) -> int:
+    """
+    Builds price_intervals from the append-only price_time_series.
+
+    Runs one route per transaction and can be repeated, each run rebuilds
+    the intervals of every route from scratch. price_time_series is left
+    untouched, check the result with verify_change_only before dropping it.
+
+    :return: number of intervals written
+    :rtype: int
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT OR IGNORE INTO scrape_runs (search_id, scraped_at) "
+            "SELECT DISTINCT search_id, scraped_at FROM price_time_series"
+        ))
+        search_ids = [row[0] for row in conn.execute(text("SELECT DISTINCT search_id FROM price_time_series"))]
+
+    total = 0
+    for search_id in search_ids:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM price_intervals WHERE search_id = :s"), {"s": search_id})
+            # Gaps and islands: consecutive scrapes with the same price share one island
+            result = conn.execute(
+                text(
+                    "WITH runs AS ("
+                    "  SELECT scraped_at, ROW_NUMBER() OVER (ORDER BY scraped_at) AS run_no "
+                    "  FROM scrape_runs WHERE search_id = :s"
+                    "), observations AS ("
+                    "  SELECT p.departure_date, p.price, p.scraped_at, "
+                    "         r.run_no - ROW_NUMBER() OVER ("
+                    "           PARTITION BY p.departure_date, p.price ORDER BY r.run_no) AS island "
+                    "  FROM price_time_series p JOIN runs r ON r.scraped_at = p.scraped_at "
+                    "  WHERE p.search_id = :s"
+                    ") "
+                    "INSERT INTO price_intervals (search_id, departure_date, price, valid_from, valid_to) "
+                    "SELECT :s, departure_date, price, MIN(scraped_at), MAX(scraped_at) "
+                    "FROM observations GROUP BY departure_date, price, island"
+                ),
+                {"s": search_id},
+            )
+        total += result.rowcount
+        logger.info(f"Search {search_id}: {result.rowcount} intervals in {time.perf_counter() - start:.1f}s.")
+
+    return total
+
+
+def verify_change_only(engine: Engine) -> Dict[str, int]:
+    """
+    Proves that price_history_daily and price_time_series hold the same rows.
+
+    :return: row counts of both layouts and the number of rows only found
+        in one of them ("missing" from / "extra" in the reconstruction)
+    :rtype: Dict[str, int]
+    """
+    columns = "search_id, departure_date, price, scraped_at"
+    with engine.connect() as conn:
+        report = {
+            "raw_rows": conn.execute(text("SELECT COUNT(*) FROM price_time_series")).scalar(),
+            "interval_rows": conn.execute(text("SELECT COUNT(*) FROM price_intervals")).scalar(),
+            "missing": conn.execute(text(
+                f"SELECT COUNT(*) FROM (SELECT {columns} FROM price_time_series "
+                f"EXCEPT SELECT {columns} FROM price_history_daily)"
+            )).scalar(),
+            "extra": conn.execute(text(
+                f"SELECT COUNT(*) FROM (SELECT {columns} FROM price_history_daily "
+                f"EXCEPT SELECT {columns} FROM price_time_series)"
+            )).scalar(),
+        }
+
+    ratio = report["raw_rows"] / report["interval_rows"] if report["interval_rows"] else 0
+    logger.info(
+        f"{report['raw_rows']} daily rows vs. {report['interval_rows']} intervals ({ratio:.1f}x smaller), "
+        f"{report['missing']} missing, {report['extra']} extra."
+    )
+    return report
@@ -0,0 +1,321 @@
+"""
+HTTP coordinator of a scraping fleet: several nodes (e.g. Raspberry Pis)
+split the route jobs of a run instead of each of them scraping everything.
+
+The coordinator is the only process that opens the database. It hands out
+the jobs of the durable job queue (job_queue.py) and stores the prices the
+workers (fleet_worker.py) push back. All endpoints take and return JSON:
+
+    POST /claim      {"worker", "limit"}       -> {"jobs": [...], "pending": n}
+    POST /steal      {"worker", "limit"}       -> {"jobs": [...]}
+    POST /start      {"worker", "job_id"}      -> {"ok": bool}
+    POST /heartbeat  {"worker", "job_ids"}     -> {"lost": [...]}
+    POST /results    {"worker", "results"}     -> {"accepted": n}
+    POST /release    {"worker", "job_ids"}     -> {"released": n}
+    GET  /status                               -> job counts and last seen workers
+
+A worker announces every job with /start right before scraping it. Jobs a
+worker claimed but did not start yet can be stolen by idle workers, started
+jobs never are. Leases are kept alive by heartbeats, the jobs of a node that
+stops sending them are re-queued once their lease expires.
+
+The server listens on localhost unless another host is given. With a token,
+every request needs an "Authorization: Bearer <token>" header.
+"""
+from __future__ import annotations
+import hmac
+import json
+import logging
+import threading
+from datetime import datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Mapping, Optional, Set
+
+from sqlalchemy.engine import Engine
+
+from db import RegisteredSearch, get_engine
+from ingestion import PriceWriter
+from job_queue import (
+    ClaimedJob,
+    claim_jobs,
+    complete_job,
+    extend_lease,
+    fail_job,
+    leased_search_id,
+    queue_counts,
+    release_jobs,
+    running_job_ids,
+    steal_jobs,
+)
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Workers heartbeat every fleet_worker.HEARTBEAT_INTERVAL seconds,
+# a lease survives a few missed heartbeats
+DEFAULT_FLEET_LEASE_SECONDS = 300
+MAX_REQUEST_BYTES = 10 * 1024 * 1024
+
+
+class Coordinator:
+    """
+    Job handling of the coordinator, independent of HTTP.
+
+    :param searches: returns the configured searches, e.g. SearchRegistry.searches
+    :param writer: started PriceWriter the pushed prices are stored with
+    :param kind_limits: most running jobs per kind, see job_queue.claim_jobs
+    """
+
+    def __init__(
+            self,
+            searches: Callable[[], List[RegisteredSearch]],
+            writer: PriceWriter,
+            engine: Optional[Engine] = None,
+            lease_seconds: float = DEFAULT_FLEET_LEASE_SECONDS,
+            kind_limits: Optional[Mapping[str, int]] = None,
+            ):
+        self.searches = searches
+        self.writer = writer
+        self.engine = engine or get_engine()
+        self.lease_seconds = lease_seconds
+        self.kind_limits = kind_limits
+        self._lock = threading.Lock()
+        # Jobs a worker started scraping, they can no longer be stolen.
+        # After a restart every leased job counts as started.
+        self._started: Set[int] = set(running_job_ids(self.engine))
+        self._last_seen: Dict[str, datetime] = {}
+
+    def _seen(self, worker: str) -> None:
+        self._last_seen[worker] = datetime.now()
+
+    def _describe(self, worker: str, jobs: List[ClaimedJob]) -> List[Dict]:
+        by_id = {s.id: s for s in self.searches()}
+        described = []
+        for job in jobs:
+            search = by_id.get(job.search_id)
+            if search is None:
+                fail_job(job.id, worker, "search is no longer configured", retry=False, engine=self.engine)
+                continue
+            described.append({
+                "id": job.id,
+                "search_id": job.search_id,
+                "origin": search.origin,
+                "destination": search.destination,
+                "run_date": job.run_date.isoformat(),
+                "attempts": job.attempts,
+                "kind": job.kind,
+            })
+        return described
+
+    def claim(self, worker: str, limit: int = 1) -> Dict:
+        """
+        :return: the claimed jobs and the number of jobs still queued or running
+        :rtype: Dict
+        """
+        self._seen(worker)
+        jobs = claim_jobs(
+            worker, limit=limit, lease_seconds=self.lease_seconds, engine=self.engine, kind_limits=self.kind_limits,
+            )
+        counts = queue_counts(engine=self.engine)
+        if jobs:
+            logger.info(f"{worker} claimed {len(jobs)} route jobs.")
+        return {"jobs": self._describe(worker, jobs), "pending": counts["queued"] + counts["running"]}
+
+    def steal(self, worker: str, limit: int = 1) -> Dict:
+        """Hands jobs other workers claimed but did not start yet to an idle worker."""
+        self._seen(worker)
+        with self._lock:
+            jobs = steal_jobs(worker, self._started, limit=limit, lease_seconds=self.lease_seconds, engine=self.engine)
+        if jobs:
+            logger.info(f"{worker} stole {len(jobs)} route jobs.")
+        return {"jobs": self._describe(worker, jobs)}
+
+    def start(self, worker: str, job_id: int) -> Dict:
+        """
+        Marks a job as being scraped.
+
+        :return: "ok" False if the job was stolen or re-queued in the meantime
+        :rtype: Dict
+        """
+        self._seen(worker)
+        with self._lock:
+            ok = extend_lease(job_id, worker, self.lease_seconds, engine=self.engine)
+            if ok:
+                self._started.add(job_id)
+        return {"ok": ok}
+
+    def heartbeat(self, worker: str, job_ids: List[int]) -> Dict:
+        """
+        Extends the leases of all jobs a worker holds.
+
+        :return: the jobs the worker no longer holds
+        :rtype: Dict
+        """
+        self._seen(worker)
+        lost = [
+            job_id for job_id in job_ids
+            if not extend_lease(job_id, worker, self.lease_seconds, engine=self.engine)
+        ]
+        if lost:
+            logger.warning(f"{worker} lost the lease of jobs {lost}.")
+        return {"lost": lost}
+
+    def _finished(self, job_id: int) -> None:
+        with self._lock:
+            self._started.discard(job_id)
+
+    def _completed(self, job_id: int, worker: str) -> None:
+        complete_job(job_id, worker, engine=self.engine)
+        self._finished(job_id)
+
+    def results(self, worker: str, results: List[Dict]) -> Dict:
+        """
+        Stores a batch of scrape results.
+
+        Every result has "job_id" and "search_id" plus either "prices" (rows
+        with departure_date, price, scraped_at) or "error". Jobs with prices
+        are completed once the writer committed them. Results for jobs not
+        leased by `worker`, or for another route than the job's, are rejected.
+
+        :return: number of accepted results
+        :rtype: Dict
+        """
+        import pandas as pd
+
+        self._seen(worker)
+        accepted = 0
+        for result in results:
+            job_id = result["job_id"]
+            search_id = leased_search_id(job_id, worker, engine=self.engine)
+            if search_id is None:
+                logger.warning(f"Rejected result of {worker} for job {job_id}, the job is not leased by it.")
+                continue
+            if search_id != result.get("search_id"):
+                logger.warning(
+                    f"Rejected result of {worker} for job {job_id}: search {result.get('search_id')} "
+                    f"instead of {search_id}."
+                    )
+                continue
+
+            prices = result.get("prices")
+            if prices:
+                self.writer.submit(
+                    pd.DataFrame.from_records(prices), search_id,
+                    on_written=partial(self._completed, job_id, worker),
+                    )
+            else:
+                fail_job(job_id, worker, result.get("error") or "no prices scraped", engine=self.engine)
+                self._finished(job_id)
+            accepted += 1
+        return {"accepted": accepted}
+
+    def release(self, worker: str, job_ids: List[int]) -> Dict:
+        """Re-queues jobs a stopping worker did not start."""
+        self._seen(worker)
+        released = release_jobs(job_ids, worker, engine=self.engine)
+        if released:
+            logger.info(f"{worker} released {released} route jobs.")
+        return {"released": released}
+
+    def status(self) -> Dict:
+        return {
+            "jobs": queue_counts(engine=self.engine),
+            "workers": {worker: seen.isoformat(timespec="seconds") for worker, seen in self._last_seen.items()},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: CoordinatorServer
+
+    # path -> (Coordinator method, its JSON arguments)
+    POST_ROUTES = {
+        "/claim": ("claim", ("worker", "limit")),
+        "/steal": ("steal", ("worker", "limit")),
+        "/start": ("start", ("worker", "job_id")),
+        "/heartbeat": ("heartbeat", ("worker", "job_ids")),
+        "/results": ("results", ("worker", "results")),
+        "/release": ("release", ("worker", "job_ids")),
+    }
+
+    def _reply(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        token = self.server.token
+        if token is None:
+            return True
+        header = self.headers.get("Authorization", "")
+        if hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+            return True
+        logger.warning(f"Rejected a request to {self.path} from {self.address_string()} without a valid token.")
+        self._reply(401, {"error": "missing or invalid token"})
+        return False
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        if self.path != "/status":
+            self._reply(404, {"error": f"unknown path {self.path}"})
+            return
+        self._reply(200, self.server.coordinator.status())
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        route = self.POST_ROUTES.get(self.path)
+        if route is None:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+            return
+
+        method, names = route
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_REQUEST_BYTES:
+                self._reply(413, {"error": "request too large"})
+                return
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            args = {name: payload[name] for name in names if name in payload}
+        except (ValueError, TypeError) as e:
+            self._reply(400, {"error": f"invalid request: {e}"})
+            return
+
+        try:
+            self._reply(200, getattr(self.server.coordinator, method)(**args))
+        except TypeError as e:
+            logger.warning(f"Invalid coordinator request {self.path}: {e}")
+            self._reply(400, {"error": f"invalid request: {e}"})
+        except Exception as e:
+            logger.error(f"Coordinator request {self.path} failed: {e}")
+            self._reply(500, {"error": str(e)})
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class CoordinatorServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server around a Coordinator.
+
+    :param token: shared secret of the fleet, None accepts every request
+
+    Usage:
+        with PriceWriter() as writer:
+            server = CoordinatorServer(("0.0.0.0", 8765), Coordinator(registry.searches, writer), token="...")
+            server.serve_forever()
+    """
+    daemon_threads = True
+
+    def __init__(self, address, coordinator: Coordinator, token: Optional[str] = None):
+        super().__init__(address, _Handler)
+        self.coordinator = coordinator
+        self.token = token or None
+        if self.token is None and address[0] not in ("127.0.0.1", "localhost", "::1"):
+            logger.warning(f"Coordinator listens on {address[0]} without a token, anyone who can reach it can claim jobs and write prices.")
@@ -1,9 +1,18 @@
 from __future__ import annotations
-from datetime import datetime
-from typing import List, Optional
+import time
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-from sqlalchemy import String, Integer, Date, ForeignKey, UniqueConstraint, create_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, sessionmaker
+from sqlalchemy import String, Integer, Float, Date, DateTime, LargeBinary, ForeignKey, Index, UniqueConstraint, create_engine, event, inspect, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import DeclarativeBase, Mapped, WriteOnlyMapped, mapped_column, relationship, sessionmaker
+from sqlalchemy.orm import Session as SessionType
+
+logger = logging.getLogger("FlightPriceTracker")
 
 # 1. Modern Declarative Base
 class Base(DeclarativeBase):
@@ -22,9 +31,11 @@ class Search(Base):
     # Note: datetime.now is passed as a function (no parentheses)
     created_at: Mapped[Date] = mapped_column(Date, default=datetime.now)
 
-    # Link to the results (List of PriceHistory objects)
-    prices: Mapped[List["PriceTimeSeries"]] = relationship(
-        "PriceTimeSeries", back_populates="search", cascade="all, delete-orphan", lazy="selectin"
+    # Link to the results. Write-only, so loading a Search never loads its
+    # (ever growing) price history; read it with price_history() instead.
+    # Deleting a Search leaves its prices to the ON DELETE CASCADE below.
+    prices: WriteOnlyMapped["PriceTimeSeries"] = relationship(
+        "PriceTimeSeries", back_populates="search", cascade="all, delete-orphan", passive_deletes=True
     )
 
     __table_args__ = (
@@ -34,11 +45,40 @@ class Search(Base):
         ),
     )
 
+    def price_history(
+            self,
+            session: SessionType,
+            departure_from: Optional[date] = None,
+            departure_to: Optional[date] = None,
+            scraped_from: Optional[date] = None,
+            scraped_to: Optional[date] = None,
+            limit: int = 1000,
+            offset: int = 0,
+            ) -> List["PriceTimeSeries"]:
+        """
+        Loads one page of this route's prices, oldest scrape first.
+
+        All date filters are inclusive. Use offset += limit to page through
+        the history until fewer than `limit` rows come back.
+        """
+        stmt = self.prices.select()
+        if departure_from is not None:
+            stmt = stmt.where(PriceTimeSeries.departure_date >= departure_from)
+        if departure_to is not None:
+            stmt = stmt.where(PriceTimeSeries.departure_date <= departure_to)
+        if scraped_from is not None:
+            stmt = stmt.where(PriceTimeSeries.scraped_at >= scraped_from)
+        if scraped_to is not None:
+            stmt = stmt.where(PriceTimeSeries.scraped_at <= scraped_to)
+
+        stmt = stmt.order_by(PriceTimeSeries.scraped_at, PriceTimeSeries.departure_date)
+        return list(session.scalars(stmt.limit(limit).offset(offset)))
+
 class PriceTimeSeries(Base):
     __tablename__ = 'price_time_series'
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'))
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id', ondelete='CASCADE'))
     
     # Specifics of the actual flight found
     departure_date: Mapped[Date] = mapped_column(Date, nullable=False)
@@ -48,13 +88,380 @@ class PriceTimeSeries(Base):
     # Relationship back to the parent search
     search: Mapped["Search"] = relationship("Search", back_populates="prices")
 
+    __table_args__ = (
+        # Natural key, also serves "price history of route X for departure date Y"
+        Index(
+            'uq_price_time_series_natural_key',
+            'search_id', 'departure_date', 'scraped_at',
+            unique=True,
+        ),
+        # Covers "latest scrape per route" and whole-scrape reads without touching the table
+        Index(
+            'ix_price_time_series_scrape',
+            'search_id', 'scraped_at', 'departure_date', 'price',
+        ),
+    )
+
+
+class ScrapeRun(Base):
+    """One row per route and day the route was scraped."""
+    __tablename__ = 'scrape_runs'
+
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), primary_key=True)
+    scraped_at: Mapped[Date] = mapped_column(Date, primary_key=True)
+
+
+class PriceInterval(Base):
+    """
+    Change-only price storage: one row per run of identical prices.
+
+    The price of a departure date was observed unchanged in every scrape of
+    the route from valid_from to valid_to (both inclusive).
+    """
+    __tablename__ = 'price_intervals'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'))
+    departure_date: Mapped[Date] = mapped_column(Date, nullable=False)
+    price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    valid_from: Mapped[Date] = mapped_column(Date, nullable=False)
+    valid_to: Mapped[Date] = mapped_column(Date, nullable=False)
+
+    __table_args__ = (
+        Index(
+            'uq_price_intervals_start',
+            'search_id', 'departure_date', 'valid_from',
+            unique=True,
+        ),
+        # Finds the open intervals of a route when the next scrape arrives
+        Index(
+            'ix_price_intervals_open',
+            'search_id', 'valid_to', 'departure_date', 'price',
+        ),
+    )
+
+
+class PriceSnapshot(Base):
+    """
+    Array-packed storage: one row per route and scrape.
+
+    `prices` holds one little-endian int32 per departure date, starting at
+    start_date (see snapshot_storage for the encoding).
+    """
+    __tablename__ = 'price_snapshots'
+
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), primary_key=True)
+    scraped_at: Mapped[Date] = mapped_column(Date, primary_key=True)
+    start_date: Mapped[Date] = mapped_column(Date, nullable=False)
+    prices: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class LatestPrice(Base):
+    """Summary table: the most recent scraped price of every route and departure date."""
+    __tablename__ = 'latest_price'
+
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), primary_key=True)
+    departure_date: Mapped[Date] = mapped_column(Date, primary_key=True)
+    price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    scraped_at: Mapped[Date] = mapped_column(Date, nullable=False)
+
+
+class DailyRouteMin(Base):
+    """Summary table: the cheapest departure of every route and scrape day."""
+    __tablename__ = 'daily_route_min'
+
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), primary_key=True)
+    scraped_at: Mapped[Date] = mapped_column(Date, primary_key=True)
+    departure_date: Mapped[Date] = mapped_column(Date, nullable=False)
+    price: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class RouteSchedule(Base):
+    """Next planned scrape of every route, kept across restarts (see route_scheduler.py)."""
+    __tablename__ = 'route_schedule'
+
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), primary_key=True)
+    cadence_seconds: Mapped[int] = mapped_column(Integer, nullable=False)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    last_run_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class ScrapeJob(Base):
+    """
+    Durable queue of route scrapes (see job_queue.py).
+
+    A job is claimed by setting it to "running" with a lease; if the lease
+    expires before the job is completed, the job goes back to "queued".
+    `kind` is "run" for the routes of a regular run and "backfill" for
+    catch-up scrapes after a downtime (see backfill.py).
+    """
+    __tablename__ = 'scrape_jobs'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), nullable=False)
+    run_date: Mapped[date] = mapped_column(Date, nullable=False)
+    status: Mapped[str] = mapped_column(String(10), nullable=False, default="queued")
+    kind: Mapped[str] = mapped_column(String(10), nullable=False, default="run", server_default="run")
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    lease_expires: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # One job per route and run, enqueueing a run twice is a no-op
+        UniqueConstraint('search_id', 'run_date', name='uq_scrape_jobs_run'),
+        # Claim order
+        Index('ix_scrape_jobs_claim', 'status', 'priority', 'id'),
+    )
+
+
+class ArchiveState(Base):
+    """Watermark of the Parquet archive: last scrape day exported per route."""
+    __tablename__ = 'archive_state'
+
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), primary_key=True)
+    exported_through: Mapped[Date] = mapped_column(Date, nullable=False)
+
+
+class PriceRollup(Base):
+    """
+    Downsampled price history older than the retention window (see retention.py).
+
+    One row per route, departure date and week/month of scrapes. `samples` is
+    the number of non-empty prices the aggregates were computed from.
+    """
+    __tablename__ = 'price_rollups'
+
+    search_id: Mapped[int] = mapped_column(ForeignKey('searches.id'), primary_key=True)
+    departure_date: Mapped[Date] = mapped_column(Date, primary_key=True)
+    period: Mapped[str] = mapped_column(String(5), primary_key=True)  # "week" or "month"
+    period_start: Mapped[Date] = mapped_column(Date, primary_key=True)
+    min_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    max_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    mean_price: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    last_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_scraped_at: Mapped[Date] = mapped_column(Date, nullable=False)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+# Rebuilds the full daily series of the change-only storage, same columns as price_time_series
+PRICE_HISTORY_DAILY_VIEW = """
+CREATE VIEW IF NOT EXISTS price_history_daily AS
+SELECT p.search_id, p.departure_date, p.price, r.scraped_at
+FROM price_intervals p
+JOIN scrape_runs r
+  ON r.search_id = p.search_id
+ AND r.scraped_at BETWEEN p.valid_from AND p.valid_to
+"""
+
 
 # --- Database Setup ---
 DATABASE = "flight_price_database.db"
-engine = create_engine(f'sqlite:///{DATABASE}', echo=False)
 
-# This creates the tables if they don't exist
-Base.metadata.create_all(engine)
+# SQLite storage profile, applied to every new connection. WAL lets readers
+# (notebooks, dashboards) work while the tracker writes.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",    # safe with WAL, only the last commits can be lost on power failure
+    "cache_size": -32000,       # negative means KiB, i.e. ~32 MB page cache
+    "mmap_size": 134217728,     # 128 MB memory mapped I/O
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,       # ms to wait for a lock instead of failing right away
+    "foreign_keys": "ON",       # SQLite ignores REFERENCES and ON DELETE without it
+}
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(database: str = DATABASE, pragmas: Optional[dict] = None, **kwargs) -> Engine:
+    """
+    Creates a SQLite engine with the given storage profile.
+
+    :param database: path of the SQLite file
+    :param pragmas: PRAGMAs run on every new connection, defaults to SQLITE_PRAGMAS.
+        Pass {} for SQLite's defaults.
+    :param kwargs: passed on to create_engine
+    """
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    db_engine = create_engine(f'sqlite:///{database}', echo=False, **kwargs)
+
+    @event.listens_for(db_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return db_engine
+
+
+class RegisteredSearch(NamedTuple):
+    """Lightweight, session-free view of a searches row."""
+    id: int
+    origin: str
+    destination: str
+    distance: int
+
+
+def register_searches(db_engine: Engine, configs: List[dict]) -> Dict[Tuple[str, str, int], RegisteredSearch]:
+    """
+    Makes sure all search configs exist in the searches table.
+
+    Inserts the missing ones with a single INSERT ... ON CONFLICT DO NOTHING
+    and then loads every search in one query.
+
+    :param configs: dicts with origin, destination and distance
+    :return: (origin, destination, distance) -> RegisteredSearch
+    """
+    keys = {(c['origin'], c['destination'], c['distance']) for c in configs}
+    table = Search.__table__
+
+    with db_engine.begin() as conn:
+        if keys:
+            values = [{"origin": o, "destination": d, "distance": km} for o, d, km in sorted(keys)]
+            conn.execute(sqlite_insert(table).values(values).on_conflict_do_nothing())
+        rows = conn.execute(select(table.c.id, table.c.origin, table.c.destination, table.c.distance))
+
+        return {
+            (row.origin, row.destination, row.distance): RegisteredSearch(*row)
+            for row in rows
+            if (row.origin, row.destination, row.distance) in keys
+        }
+
+
+def deduplicate_price_rows(db_engine: Engine) -> int:
+    """
+    Removes duplicate price_time_series rows in place.
+
+    For every (search_id, departure_date, scraped_at) only the most recently
+    written row is kept. Works one route per transaction so the tracker is
+    never blocked for long.
+
+    :return: number of deleted rows
+    :rtype: int
+    """
+    with db_engine.connect() as conn:
+        search_ids = conn.exec_driver_sql("SELECT DISTINCT search_id FROM price_time_series").scalars().all()
+
+    deleted = 0
+    for search_id in search_ids:
+        with db_engine.begin() as conn:
+            result = conn.exec_driver_sql(
+                "DELETE FROM price_time_series WHERE search_id = ? AND id NOT IN ("
+                "SELECT MAX(id) FROM price_time_series WHERE search_id = ? "
+                "GROUP BY departure_date, scraped_at)",
+                (search_id, search_id),
+            )
+        if result.rowcount:
+            logger.info(f"Search {search_id}: removed {result.rowcount} duplicate rows.")
+        deleted += result.rowcount
+    return deleted
+
+
+def migrate(db_engine: Engine) -> None:
+    """
+    Brings an existing database up to the current schema without downtime.
+
+    Missing indexes are created one by one; with WAL, readers keep working
+    while an index is built. The writer's upsert needs the natural key, so
+    duplicate rows of older versions are removed before it is created.
+    Scrape days already in price_time_series are recorded in scrape_runs.
+    """
+    for index in PriceTimeSeries.__table__.indexes:
+        with db_engine.connect() as conn:
+            if index.name in {i["name"] for i in inspect(conn).get_indexes(PriceTimeSeries.__tablename__)}:
+                continue
+
+        start = time.perf_counter()
+        try:
+            with db_engine.begin() as conn:
+                index.create(conn)
+        except IntegrityError:
+            logger.warning(f"price_time_series contains duplicate rows, removing them to create {index.name}...")
+            deleted = deduplicate_price_rows(db_engine)
+            logger.info(f"Removed {deleted} duplicate price rows.")
+            with db_engine.begin() as conn:
+                index.create(conn)
+        logger.info(f"Created index {index.name} in {time.perf_counter() - start:.1f}s.")
+
+    with db_engine.begin() as conn:
+        # Columns added after the table was first created
+        inspector = inspect(conn)
+        if (
+            inspector.has_table(ScrapeJob.__tablename__)
+            and "kind" not in {c["name"] for c in inspector.get_columns(ScrapeJob.__tablename__)}
+        ):
+            conn.exec_driver_sql("ALTER TABLE scrape_jobs ADD COLUMN kind VARCHAR(10) NOT NULL DEFAULT 'run'")
+            logger.info("Added the kind column to scrape_jobs.")
+
+        # Scrape days of databases older than scrape_runs, so backfill and the
+        # route priority know them. Read from ix_price_time_series_scrape alone
+        if inspector.has_table(ScrapeRun.__tablename__) and inspector.has_table(PriceTimeSeries.__tablename__):
+            seeded = conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO scrape_runs (search_id, scraped_at) "
+                "SELECT DISTINCT search_id, scraped_at FROM price_time_series"
+            ).rowcount
+            if seeded:
+                logger.info(f"Recorded {seeded} scrape days from price_time_series in scrape_runs.")
+
+        conn.exec_driver_sql(PRICE_HISTORY_DAILY_VIEW)
+        # Refresh the query planner statistics if they are outdated
+        conn.exec_driver_sql("PRAGMA optimize")
+
+
+# The default engine and schema are set up on first use, not at import time
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_init_lock = threading.Lock()
+
+
+def init_schema(db_engine: Engine) -> None:
+    """Creates missing tables and brings existing ones up to date (see migrate)."""
+    Base.metadata.create_all(db_engine)
+    migrate(db_engine)
+
+
+def get_engine() -> Engine:
+    """
+    Returns the engine of DATABASE.
+
+    Created on the first call, which also creates and migrates the schema.
+    Importing this module therefore never touches the database file.
+    """
+    global _engine
+    if _engine is None:
+        with _init_lock:
+            if _engine is None:
+                db_engine = create_db_engine()
+                init_schema(db_engine)
+                _engine = db_engine
+    return _engine
+
+
+def _get_session_factory() -> sessionmaker:
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(bind=get_engine())
+    return _session_factory
+
+
+def get_session() -> SessionType:
+    """Opens a new ORM session on the default engine."""
+    return _get_session_factory()()
+
 
-# Session factory for use in your scraper
-Session = sessionmaker(bind=engine)
\ No newline at end of file
+def __getattr__(name: str):
+    # `db.engine` and `db.Session` used to be created at import, keep them
+    # working for existing scripts and notebooks, but only on first access
+    if name == "engine":
+        return get_engine()
+    if name == "Session":
+        return _get_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
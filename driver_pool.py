@@ -0,0 +1,232 @@
+from __future__ import annotations
+import os
+import queue
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from selenium import webdriver
+
+from web_scraper import create_chrome_driver
+
+
+logger = logging.getLogger("FlightScraper")
+
+# Defaults sized for a Raspberry Pi with 4 GB RAM
+DEFAULT_POOL_SIZE = 1
+DEFAULT_MAX_PAGES = 25       # recycle a browser after this many scrapes
+DEFAULT_MAX_RSS_MB = 700     # recycle a browser once its process tree exceeds this
+
+
+def _process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """
+    Sums the resident memory of a process and all its descendants.
+
+    Reads /proc directly so no extra dependency is needed. Returns None
+    on platforms without /proc (the RSS limit is then simply not enforced).
+    """
+    if not os.path.isdir("/proc"):
+        return None
+
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total_kb = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+
+    return total_kb / 1024
+
+
+class _PooledDriver:
+    """A driver together with its usage bookkeeping."""
+
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.pages = 0
+        self.idle_since = time.monotonic()
+
+
+class DriverPool:
+    """
+    Pool of long-lived Chrome drivers shared across routes.
+
+    Drivers are created lazily up to `size`, health checked when they are
+    returned and recycled after `max_pages` scrapes or once the browser
+    process tree uses more than `max_rss_mb` of memory. With
+    `max_idle_seconds`, `reap_idle` quits browsers nobody borrowed for that
+    long, so a long-lived pool does not hold memory between sparse routes.
+
+    Usage:
+        with DriverPool(size=1) as pool:
+            with pool.driver() as driver:
+                driver.get(url)
+    """
+
+    def __init__(
+            self,
+            size: int = DEFAULT_POOL_SIZE,
+            max_pages: int = DEFAULT_MAX_PAGES,
+            max_rss_mb: float | None = DEFAULT_MAX_RSS_MB,
+            factory: Callable[[], webdriver.Chrome] = create_chrome_driver,
+            max_idle_seconds: float | None = None,
+            ):
+        if size < 1:
+            raise ValueError("DriverPool size must be at least 1")
+
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.max_idle_seconds = max_idle_seconds
+        self._factory = factory
+        self._idle: "queue.LifoQueue[_PooledDriver]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self) -> "DriverPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _acquire(self, timeout: float | None) -> _PooledDriver:
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                logger.info("Starting new pooled browser...")
+                return _PooledDriver(self._factory())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Pool exhausted, wait for another route to hand its driver back
+        return self._idle.get(timeout=timeout)
+
+    def _is_healthy(self, pooled: _PooledDriver) -> bool:
+        try:
+            # Any cheap command proves the session and browser are still alive
+            pooled.driver.execute_script("return 1;")
+        except Exception as e:
+            logger.warning(f"Pooled browser failed health check: {e}")
+            return False
+        return True
+
+    def _needs_recycling(self, pooled: _PooledDriver) -> bool:
+        if self.max_pages and pooled.pages >= self.max_pages:
+            logger.info(f"Recycling browser after {pooled.pages} pages.")
+            return True
+
+        if self.max_rss_mb:
+            service = getattr(pooled.driver, "service", None)
+            process = getattr(service, "process", None)
+            if process is not None:
+                rss = _process_tree_rss_mb(process.pid)
+                if rss is not None and rss > self.max_rss_mb:
+                    logger.info(f"Recycling browser using {rss:.0f} MB RSS.")
+                    return True
+
+        return False
+
+    def _discard(self, pooled: _PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error while quitting pooled browser: {e}")
+        with self._lock:
+            self._created -= 1
+
+    def _release(self, pooled: _PooledDriver) -> None:
+        pooled.pages += 1
+
+        if self._closed or not self._is_healthy(pooled) or self._needs_recycling(pooled):
+            self._discard(pooled)
+            return
+
+        pooled.idle_since = time.monotonic()
+        self._idle.put(pooled)
+
+    def reap_idle(self) -> int:
+        """
+        Quits the browsers that were idle for more than max_idle_seconds.
+
+        :return: number of browsers quit
+        :rtype: int
+        """
+        if not self.max_idle_seconds:
+            return 0
+
+        keep, expired = [], []
+        cutoff = time.monotonic() - self.max_idle_seconds
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            (expired if pooled.idle_since < cutoff else keep).append(pooled)
+
+        # Back in the same order, the most recently used browser stays on top
+        for pooled in reversed(keep):
+            self._idle.put(pooled)
+        for pooled in expired:
+            logger.info(f"Quitting browser idle for more than {self.max_idle_seconds:.0f}s.")
+            self._discard(pooled)
+        return len(expired)
+
+    @contextmanager
+    def driver(self, timeout: float | None = None) -> Iterator[webdriver.Chrome]:
+        """
+        Borrows a driver from the pool for the duration of the with-block.
+
+        :param timeout: seconds to wait for a free driver, defaults to None (wait forever)
+        :type timeout: float | None
+        """
+        pooled = self._acquire(timeout)
+        try:
+            yield pooled.driver
+        finally:
+            self._release(pooled)
+
+    def close(self) -> None:
+        """Quits all idle drivers. Borrowed drivers are quit when returned."""
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
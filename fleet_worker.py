@@ -0,0 +1,294 @@
+"""
+Worker node of a scraping fleet, pulls route jobs from the coordinator
+(coordinator.py) over HTTP and never opens the database itself.
+
+A node scrapes up to `concurrency` routes at a time and keeps `prefetch`
+claimed jobs in a local backlog. When the queue is empty it steals jobs
+other nodes claimed but did not start. A heartbeat thread keeps the leases
+of all held jobs alive, an upload thread pushes the results back in batches.
+"""
+from __future__ import annotations
+import json
+import queue
+import logging
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+DEFAULT_CONCURRENCY = 1
+HEARTBEAT_INTERVAL = 60     # seconds, well below the coordinator's lease
+RESULT_BATCH_SIZE = 10      # results per upload
+RESULT_INTERVAL = 30.0      # seconds a result may wait before it is uploaded
+POLL_INTERVAL = 30.0        # seconds to wait when there is nothing to do
+REQUEST_TIMEOUT = 30
+
+
+class CoordinatorClient:
+    """
+    JSON client of the coordinator endpoints for one worker.
+
+    :param token: shared secret of the fleet, see coordinator.CoordinatorServer
+    """
+
+    def __init__(self, url: str, worker: str, timeout: float = REQUEST_TIMEOUT, token: Optional[str] = None):
+        self.url = url.rstrip("/")
+        self.worker = worker
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+
+    def _request(self, path: str, payload: Optional[Dict] = None) -> Dict:
+        data = None
+        if payload is not None:
+            data = json.dumps({"worker": self.worker, **payload}).encode()
+        request = urllib.request.Request(
+            self.url + path, data=data, headers=self.headers,
+            )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def claim(self, limit: int) -> Dict:
+        return self._request("/claim", {"limit": limit})
+
+    def steal(self, limit: int) -> List[Dict]:
+        return self._request("/steal", {"limit": limit})["jobs"]
+
+    def start(self, job_id: int) -> bool:
+        return self._request("/start", {"job_id": job_id})["ok"]
+
+    def heartbeat(self, job_ids: List[int]) -> List[int]:
+        return self._request("/heartbeat", {"job_ids": job_ids})["lost"]
+
+    def push_results(self, results: List[Dict]) -> int:
+        return self._request("/results", {"results": results})["accepted"]
+
+    def release(self, job_ids: List[int]) -> int:
+        return self._request("/release", {"job_ids": job_ids})["released"]
+
+    def status(self) -> Dict:
+        return self._request("/status")
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict]:
+    """
+    :return: JSON-ready rows with departure_date, price, scraped_at
+    :rtype: List[Dict]
+    """
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+class FleetWorker:
+    """
+    Runs `scrape(job)` for the jobs the coordinator hands out.
+
+    `scrape` gets a job dict with id, search_id, origin, destination,
+    run_date, attempts and kind and returns the scraped frame (or None).
+
+    :param exit_when_idle: stop once the coordinator has no queued or
+        running jobs left, instead of waiting for the next run
+
+    Usage:
+        worker = FleetWorker(CoordinatorClient("http://pi-1:8765", "pi-2"), scrape, concurrency=2)
+        worker.run()
+    """
+
+    def __init__(
+            self,
+            client: CoordinatorClient,
+            scrape: Callable[[Dict], Optional[pd.DataFrame]],
+            concurrency: int = DEFAULT_CONCURRENCY,
+            prefetch: Optional[int] = None,
+            heartbeat_interval: float = HEARTBEAT_INTERVAL,
+            result_batch_size: int = RESULT_BATCH_SIZE,
+            result_interval: float = RESULT_INTERVAL,
+            poll_interval: float = POLL_INTERVAL,
+            exit_when_idle: bool = False,
+            ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.client = client
+        self.scrape = scrape
+        self.concurrency = concurrency
+        self.prefetch = concurrency if prefetch is None else prefetch
+        self.heartbeat_interval = heartbeat_interval
+        self.result_batch_size = result_batch_size
+        self.result_interval = result_interval
+        self.poll_interval = poll_interval
+        self.exit_when_idle = exit_when_idle
+
+        self._lock = threading.Lock()
+        # Every job leased by this node: waiting in the backlog, scraping or not uploaded yet
+        self._held: Dict[int, Dict] = {}
+        self._backlog: Deque[Dict] = deque()
+        self._results: "queue.Queue[Dict]" = queue.Queue()
+        self._slots = threading.Semaphore(concurrency)
+        self._stop = threading.Event()
+        # Set once no scrape is running any more, the last results are uploaded then
+        self._scraped = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _take(self, jobs: List[Dict]) -> None:
+        with self._lock:
+            for job in jobs:
+                self._held[job["id"]] = job
+                self._backlog.append(job)
+
+    def _drop(self, job_id: int) -> None:
+        with self._lock:
+            self._held.pop(job_id, None)
+
+    def _next_job(self) -> tuple:
+        """
+        :return: the next job to scrape (or None) and the coordinator's number of pending jobs
+        :rtype: tuple
+        """
+        pending = None
+        while not self._stop.is_set():
+            with self._lock:
+                job = self._backlog.popleft() if self._backlog else None
+                if job is not None and job["id"] not in self._held:
+                    continue
+
+            if job is None:
+                claimed = self.client.claim(self.prefetch)
+                pending = claimed["pending"]
+                jobs = claimed["jobs"] or self.client.steal(1)
+                if not jobs:
+                    return None, pending
+                self._take(jobs)
+                continue
+
+            # Another node may have stolen it while it waited in the backlog
+            if self.client.start(job["id"]):
+                return job, pending
+            logger.info(f"Job {job['id']} was taken over by another worker.")
+            self._drop(job["id"])
+        return None, pending
+
+    def _scrape(self, job: Dict) -> None:
+        route = f"{job['origin']} -> {job['destination']}"
+        result = {"job_id": job["id"], "search_id": job["search_id"]}
+        try:
+            logger.info(f"Start {'catch-up ' if job.get('kind') == 'backfill' else ''}search for {route}...")
+            df = self.scrape(job)
+            if df is None or df.empty:
+                logger.warning(f"No prices found for {route}.")
+                result["error"] = "no prices scraped"
+            else:
+                result["prices"] = frame_to_records(df)
+                logger.info(f"Completed search for {route}.")
+        except Exception as e:
+            logger.error(f"Scraping {route} failed: {e}")
+            result["error"] = str(e)
+        finally:
+            self._results.put(result)
+            self._slots.release()
+
+    def _heartbeats(self) -> None:
+        # Until the last scrape finished, a stopping node still holds its leases
+        while not self._scraped.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._held)
+            if not job_ids:
+                continue
+            try:
+                for job_id in self.client.heartbeat(job_ids):
+                    self._drop(job_id)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Heartbeat failed: {e}")
+
+    def _upload(self, batch: List[Dict]) -> bool:
+        try:
+            self.client.push_results(batch)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Uploading {len(batch)} results failed, retrying: {e}")
+            return False
+        for result in batch:
+            self._drop(result["job_id"])
+        return True
+
+    def _uploads(self) -> None:
+        batch: List[Dict] = []
+        deadline = None
+        while True:
+            timeout = self.result_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                result = self._results.get(timeout=timeout)
+            except queue.Empty:
+                result = None
+
+            if result is not None:
+                batch.append(result)
+                if deadline is None:
+                    deadline = time.monotonic() + self.result_interval
+
+            stopping = self._scraped.is_set() and self._results.empty()
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (len(batch) >= self.result_batch_size or due or stopping):
+                if self._upload(batch):
+                    batch, deadline = [], None
+                else:
+                    deadline = time.monotonic() + self.result_interval
+                    if stopping:
+                        logger.error(f"Giving up on {len(batch)} results, their jobs are re-queued once the lease expires.")
+                        return
+            if stopping and not batch:
+                return
+
+    def run(self) -> None:
+        """Works on jobs until `stop` is called (or the queue is drained with exit_when_idle)."""
+        logger.info(f"Fleet worker {self.client.worker} started, scraping {self.concurrency} routes at a time.")
+        heartbeats = threading.Thread(target=self._heartbeats, name="fleet-heartbeat", daemon=True)
+        uploads = threading.Thread(target=self._uploads, name="fleet-upload", daemon=True)
+        heartbeats.start()
+        uploads.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fleet-route") as executor:
+                while not self._stop.is_set():
+                    # Only claim or start a job once a scrape slot is free
+                    if not self._slots.acquire(timeout=self.poll_interval):
+                        continue
+                    try:
+                        job, pending = self._next_job()
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Coordinator not reachable: {e}")
+                        job, pending = None, None
+
+                    if job is not None:
+                        executor.submit(self._scrape, job)
+                        continue
+
+                    self._slots.release()
+                    with self._lock:
+                        idle = not self._held
+                    if self.exit_when_idle and idle and pending == 0:
+                        logger.info("No route jobs left, stopping.")
+                        break
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self._stop.set()
+            self._scraped.set()
+            with self._lock:
+                unstarted = [job["id"] for job in self._backlog if job["id"] in self._held]
+                self._backlog.clear()
+            if unstarted:
+                try:
+                    self.client.release(unstarted)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Releasing {len(unstarted)} jobs failed, they are re-queued once the lease expires: {e}")
+            uploads.join()
+            logger.info(f"Fleet worker {self.client.worker} stopped.")
@@ -0,0 +1,222 @@
+from __future__ import annotations
+import re
+import json
+import time
+import random
+import logging
+import itertools
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from calendar_rpc import parse_calendar_payloads
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightScraper")
+
+DEFAULT_BASE_URL = "https://www.google.com"
+CALENDAR_RPC_PATH = (
+    "/_/FlightsFrontendUi/data/travel.frontend.flights.FlightsFrontendService/GetCalendarPicker"
+)
+# Page the session parameters of the RPCs are read from
+SESSION_PATH = "/travel/flights?hl=en"
+CALENDAR_DAYS = 365
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_TIMEOUT = 20
+
+HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded;charset=UTF-8",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Connection": "keep-alive",
+}
+
+# WIZ_global_data key of the flights page -> parameter of the RPC requests
+# (session id and frontend build as query parameters, XSRF token in the body)
+SESSION_PARAMS = {"FdrFJe": "f.sid", "cfb2h": "bl", "SNlM0e": "at"}
+
+
+def parse_session_params(html: str) -> Dict[str, str]:
+    """
+    Reads the RPC session parameters from the flights page.
+
+    :return: parameter name -> value, only the ones found in the page
+    :rtype: Dict[str, str]
+    """
+    params = {}
+    for key, param in SESSION_PARAMS.items():
+        match = re.search(rf'"{key}":"((?:[^"\\]|\\.)*)"', html)
+        if match:
+            params[param] = json.loads(f'"{match.group(1)}"')
+    return params
+
+
+def build_calendar_request(
+        origin: str,
+        dest: str,
+        depature_date: str,
+        days: int = CALENDAR_DAYS,
+        at: Optional[str] = None,
+        ) -> str:
+    """
+    Builds the form body of the calendar RPC the Google Flights page sends.
+
+    Mirrors the one way, non-stop search of generate_google_flights_url with
+    origin and destination given as free text, covering `days` days from the
+    departure date.
+
+    :param at: XSRF token of the session, see parse_session_params
+    :return: url encoded form body
+    :rtype: str
+    """
+    start = datetime.strptime(depature_date, '%Y-%m-%d')
+    end = (start + timedelta(days=days)).strftime('%Y-%m-%d')
+
+    leg = [[[[origin, 4]]], [[[dest, 4]]], None, 1, None, None, depature_date]
+    inner = [None, [None, None, 2, None, [], 1, [1, 0, 0, 0], None, None, None, None, None, None, [leg]], [depature_date, end]]
+    form = {"f.req": json.dumps([None, json.dumps(inner)])}
+    if at:
+        form["at"] = at
+    return urlencode(form)
+
+
+class HttpCalendarClient:
+    """
+    Browser-free backend fetching the calendar prices with plain HTTP.
+
+    Every worker thread keeps its own keep-alive connection, so concurrent
+    routes reuse a small, fixed set of TCP/TLS sessions. The session
+    parameters of the RPC are read from the flights page once per client.
+
+    Usage:
+        with HttpCalendarClient() as client:
+            df = client.fetch_calendar("Vienna", "Agadir", "2026-01-01")
+    """
+
+    def __init__(
+            self,
+            base_url: str = DEFAULT_BASE_URL,
+            timeout: float = DEFAULT_TIMEOUT,
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            ):
+        parts = urlsplit(base_url)
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._connections: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._session: Dict[str, str] | None = None
+        self._session_lock = threading.Lock()
+        # Request counter like the page's, it starts at a random 4 digit number
+        self._reqids = itertools.count(random.randint(1000, 9999), 100000)
+        # Long-lived worker threads keep their connections across fetch_many calls
+        self._executor: ThreadPoolExecutor | None = None
+
+    def __enter__(self) -> "HttpCalendarClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            conn = conn_class(self._netloc, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _request(self, method: str, path: str, body: str | None = None) -> str:
+        headers = HEADERS if body is not None else {k: v for k, v in HEADERS.items() if k != "Content-Type"}
+        # A keep-alive connection may have been closed by the server, retry once on a fresh one
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, self._prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                text = response.read().decode("utf-8", errors="replace")
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+
+            if response.status != 200:
+                raise http.client.HTTPException(f"{method} {path.split('?')[0]} failed with status {response.status}")
+            return text
+
+    def _session_params(self) -> Dict[str, str]:
+        with self._session_lock:
+            if self._session is None:
+                try:
+                    self._session = parse_session_params(self._request("GET", SESSION_PATH))
+                except (http.client.HTTPException, OSError) as e:
+                    logger.warning(f"Loading the flights page failed: {e}")
+                    self._session = {}
+                if "f.sid" not in self._session:
+                    logger.warning("No session parameters found, sending the calendar requests without them.")
+            return self._session
+
+    def _calendar_path(self, session: Dict[str, str]) -> str:
+        query = {name: session[name] for name in ("f.sid", "bl") if name in session}
+        query.update({"hl": "en", "_reqid": next(self._reqids), "rt": "c"})
+        return f"{CALENDAR_RPC_PATH}?{urlencode(query)}"
+
+    def fetch_calendar(self, origin: str, dest: str, depature_date: str) -> pd.DataFrame:
+        """
+        Fetches the calendar prices of one route.
+
+        :return: DataFrame with departure_date and price columns
+        :rtype: pd.DataFrame
+        """
+        start = time.perf_counter()
+        session = self._session_params()
+        body = self._request(
+            "POST", self._calendar_path(session),
+            build_calendar_request(origin, dest, depature_date, at=session.get("at")),
+            )
+        df = parse_calendar_payloads([body])
+        logger.info(f"HTTP calendar for {origin} -> {dest}: {len(df)} dates in {time.perf_counter() - start:.2f}s")
+        return df
+
+    def fetch_many(self, routes: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], pd.DataFrame | None]:
+        """
+        Fetches several routes concurrently.
+
+        :param routes: (origin, dest, depature_date) tuples
+        :return: DataFrame per route, None for routes that failed
+        """
+        routes = list(routes)
+
+        def fetch(route):
+            try:
+                return self.fetch_calendar(*route)
+            except Exception as e:
+                logger.warning(f"HTTP calendar for {route[0]} -> {route[1]} failed: {e}")
+                return None
+
+        # Callers may share the client between threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            executor = self._executor
+        return dict(zip(routes, executor.map(fetch, routes)))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
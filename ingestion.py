@@ -0,0 +1,266 @@
+from __future__ import annotations
+import math
+import queue
+import logging
+import threading
+import time
+from datetime import date
+from itertools import groupby
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from db import get_engine, PriceTimeSeries
+from change_storage import record_scrape_runs, write_price_changes
+from snapshot_storage import write_snapshot
+from summary_tables import SUMMARY_SOURCES, refresh_summaries
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+DEFAULT_FLUSH_ROWS = 5000       # rows per transaction
+DEFAULT_FLUSH_INTERVAL = 5.0    # seconds a row may wait before it is written
+FLUSH_RETRIES = 3
+FLUSH_BACKOFF = 30.0            # seconds before a failed batch is tried again
+
+# What a re-run on the same day does with rows that already exist:
+# "update" keeps the newest price, "ignore" keeps the first one
+CONFLICT_POLICIES = ("update", "ignore")
+DEFAULT_ON_CONFLICT = "update"
+
+# "append" stores every daily row in price_time_series, "change_only" only the
+# price changes in price_intervals, "both" writes both (e.g. while verifying),
+# "snapshot" one packed price array per route and scrape in price_snapshots
+STORAGE_MODES = ("append", "change_only", "both", "snapshot")
+DEFAULT_STORAGE_MODE = "append"
+
+_STOP = object()
+
+
+def _to_date(value) -> date | None:
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def upsert_statement(on_conflict: str = DEFAULT_ON_CONFLICT):
+    """
+    Builds the INSERT ... ON CONFLICT statement over the natural key
+    (search_id, departure_date, scraped_at) of price_time_series.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy '{on_conflict}', use one of {CONFLICT_POLICIES}")
+
+    table = PriceTimeSeries.__table__
+    stmt = sqlite_insert(table)
+    natural_key = [table.c.search_id, table.c.departure_date, table.c.scraped_at]
+    if on_conflict == "ignore":
+        return stmt.on_conflict_do_nothing(index_elements=natural_key)
+    return stmt.on_conflict_do_update(index_elements=natural_key, set_={"price": stmt.excluded.price})
+
+
+def frame_to_rows(df: pd.DataFrame, search_id: int) -> List[Dict]:
+    """
+    Converts a scraped frame into price_time_series insert parameters.
+
+    :return: one dict per row with search_id, departure_date, price, scraped_at
+    :rtype: List[Dict]
+    """
+    rows = []
+    for record in df.to_dict("records"):
+        price = record.get("price")
+        if price is not None and isinstance(price, float) and math.isnan(price):
+            price = None
+        rows.append({
+            "search_id": search_id,
+            "departure_date": _to_date(record["departure_date"]),
+            "price": int(price) if price is not None else None,
+            "scraped_at": _to_date(record.get("scraped_at")) or date.today(),
+        })
+    return rows
+
+
+class PriceWriter:
+    """
+    Background thread that is the single writer of price_time_series.
+
+    Scrapes hand their frames to `submit` and continue immediately. The
+    writer batches the rows of many routes into one executemany transaction
+    per `flush_rows` rows or `flush_interval` seconds, whichever comes first.
+    Rows are upserted over the natural key, so re-runs never duplicate them;
+    with on_conflict="update" a repeated scrape of a route and day replaces it.
+    With storage_mode="change_only" only price changes are stored (see
+    change_storage.write_price_changes), with "snapshot" one packed array
+    per scrape (see snapshot_storage.write_snapshot). The summary tables
+    latest_price and daily_route_min are refreshed in the same transaction.
+    `close` (or leaving the with-block) drains everything still queued.
+    An `on_written` callback passed to `submit` runs once the rows are
+    committed, e.g. to complete the route's job in the job queue.
+    A batch that cannot be written is kept and tried again with the next
+    flush; rows still unwritten when the writer closes make `close` raise.
+
+    Usage:
+        with PriceWriter() as writer:
+            writer.submit(df, search_id)
+    """
+
+    def __init__(
+            self,
+            engine: Optional[Engine] = None,
+            flush_rows: int = DEFAULT_FLUSH_ROWS,
+            flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+            on_conflict: str = DEFAULT_ON_CONFLICT,
+            storage_mode: str = DEFAULT_STORAGE_MODE,
+            ):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage_mode}', use one of {STORAGE_MODES}")
+
+        self.engine = engine or get_engine()
+        self.on_conflict = on_conflict
+        self.storage_mode = storage_mode
+        self._statement = upsert_statement(on_conflict)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        # Rows the final flush could not write, see close()
+        self.unwritten: List[Dict] = []
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="price-writer", daemon=True)
+        self._started = False
+
+    def __enter__(self) -> "PriceWriter":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if not self._started:
+            self._started = True
+            self._thread.start()
+
+    def submit(self, df: pd.DataFrame, search_id: int, on_written: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queues the rows of one scraped route for writing.
+
+        :param on_written: called from the writer thread after the rows are committed
+        """
+        if not self._started:
+            raise RuntimeError("PriceWriter is not running")
+        self._queue.put((frame_to_rows(df, search_id), on_written))
+
+    def close(self) -> None:
+        """
+        Writes all queued rows and stops the writer thread.
+
+        :raises RuntimeError: if rows could not be written, they are kept in `unwritten`
+        """
+        if self._started and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self.unwritten:
+            raise RuntimeError(f"{len(self.unwritten)} price rows could not be written to the database")
+
+    def _write(self, rows: List[Dict]) -> None:
+        with self.engine.begin() as conn:
+            if self.storage_mode in ("append", "both"):
+                if self.on_conflict == "update":
+                    # A repeated scrape replaces the day, like the interval and snapshot
+                    # storage do, departure dates it no longer has are not kept
+                    days = {(row["search_id"], row["scraped_at"].isoformat()) for row in rows}
+                    conn.execute(
+                        text("DELETE FROM price_time_series WHERE search_id = :s AND scraped_at = :d"),
+                        [{"s": search_id, "d": day} for search_id, day in sorted(days)],
+                    )
+                conn.execute(self._statement, rows)
+
+            if self.storage_mode in ("append", "snapshot"):
+                record_scrape_runs(conn, rows)
+
+            # One scrape (route and day) at a time, oldest first
+            replace = self.on_conflict == "update"
+            summary_source = SUMMARY_SOURCES.get(self.storage_mode)
+            key = lambda row: (row["search_id"], row["scraped_at"])
+            for (search_id, scraped_at), scrape in groupby(sorted(rows, key=key), key=key):
+                if self.storage_mode == "snapshot":
+                    write_snapshot(conn, search_id, scraped_at, list(scrape), replace=replace)
+                elif self.storage_mode in ("change_only", "both"):
+                    write_price_changes(conn, search_id, scraped_at, list(scrape), replace=replace)
+
+                if summary_source is not None:
+                    refresh_summaries(conn, summary_source, search_id, scraped_at)
+
+    def _flush(self, rows: List[Dict], callbacks: List[Callable[[], None]]) -> bool:
+        """
+        :return: False if the rows could not be written, the caller keeps them
+        :rtype: bool
+        """
+        if not rows:
+            # Empty scrapes have nothing to write but still count as written
+            self._run_callbacks(callbacks)
+            return True
+
+        for attempt in range(FLUSH_RETRIES):
+            try:
+                start = time.perf_counter()
+                self._write(rows)
+                self.rows_written += len(rows)
+                logger.info(f"Wrote {len(rows)} price rows in {time.perf_counter() - start:.2f}s.")
+                self._run_callbacks(callbacks)
+                return True
+            except Exception as e:
+                logger.warning(f"Writing {len(rows)} price rows failed (attempt {attempt + 1}): {e}")
+                time.sleep(attempt + 1)
+
+        logger.error(f"Writing {len(rows)} price rows failed {FLUSH_RETRIES} times, keeping them for the next flush.")
+        return False
+
+    def _run_callbacks(self, callbacks: List[Callable[[], None]]) -> None:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"on_written callback failed: {e}")
+
+    def _run(self) -> None:
+        buffer: List[Dict] = []
+        callbacks: List[Callable[[], None]] = []
+        deadline = None
+        retry_at = 0.0
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                if not self._flush(buffer, callbacks):
+                    self.unwritten = buffer
+                return
+
+            if item:
+                rows, on_written = item
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                buffer.extend(rows)
+                if on_written is not None:
+                    callbacks.append(on_written)
+
+            due = len(buffer) >= self.flush_rows or (deadline is not None and time.monotonic() >= deadline)
+            if due and time.monotonic() >= retry_at:
+                if self._flush(buffer, callbacks):
+                    buffer = []
+                    callbacks = []
+                    deadline = None
+                else:
+                    # Keep the batch, new rows are added to it until the next try
+                    retry_at = time.monotonic() + FLUSH_BACKOFF
+                    deadline = retry_at
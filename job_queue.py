@@ -0,0 +1,392 @@
+"""
+Durable, lease-based queue of route scrapes on top of the scrape_jobs table.
+
+A run enqueues one job per route. Workers claim jobs with a single atomic
+UPDATE ... RETURNING, scrape them and complete them once their prices are
+written. Jobs of a worker that died are re-queued when their lease expires,
+so a restarted run continues with exactly the routes that are not done yet.
+
+Jobs claimed but not started yet can be stolen by idle workers of a fleet
+(see coordinator.py). Catch-up jobs after a downtime (kind "backfill", see
+backfill.py) are capped by KIND_LIMITS, so they never crowd out a run.
+
+Job states: queued -> running -> done, or back to queued on failure until
+MAX_ATTEMPTS is reached, then failed. Jobs still queued when a run used up
+its time budget are deferred (see route_priority.py).
+"""
+from __future__ import annotations
+import logging
+from datetime import date, datetime, timedelta
+from typing import Collection, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set
+
+from sqlalchemy import case, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+
+from db import ScrapeJob, get_engine
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+JOB_STATES = ("queued", "running", "done", "failed", "deferred")
+MAX_ATTEMPTS = 3
+DEFAULT_LEASE_SECONDS = 900
+
+JOB_KINDS = ("run", "backfill")
+# Most jobs of a kind running at the same time, across all workers
+KIND_LIMITS = {"backfill": 1}
+
+_jobs = ScrapeJob.__table__
+
+
+class ClaimedJob(NamedTuple):
+    id: int
+    search_id: int
+    run_date: date
+    attempts: int
+    priority: int = 0
+    kind: str = "run"
+
+
+def enqueue_jobs(
+        search_ids: Iterable[int],
+        run_date: date,
+        priority: int = 0,
+        engine: Optional[Engine] = None,
+        priorities: Optional[Mapping[int, int]] = None,
+        kind: str = "run",
+        ) -> int:
+    """
+    Adds one queued job per route for the run of `run_date`.
+
+    Routes that already have a job for that run are left alone, so calling
+    this again after a restart does not redo finished routes. Unfinished jobs
+    of older runs are marked failed, a newer run scrapes those routes anyway.
+
+    :param priority: priority of all jobs, higher ones are claimed first
+    :param priorities: priority per search_id, overrides `priority`
+    :param kind: one of JOB_KINDS
+    :return: number of new jobs
+    :rtype: int
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}', use one of {JOB_KINDS}")
+
+    engine = engine or get_engine()
+    priorities = priorities or {}
+    values = [
+        {"search_id": search_id, "run_date": run_date, "priority": priorities.get(search_id, priority), "kind": kind}
+        for search_id in search_ids
+    ]
+
+    with engine.begin() as conn:
+        conn.execute(
+            _jobs.update()
+            .where(_jobs.c.run_date < run_date, _jobs.c.status.in_(("queued", "running")))
+            .values(status="failed", lease_owner=None, lease_expires=None,
+                    last_error="superseded by a newer run", finished_at=datetime.now())
+        )
+        if not values:
+            return 0
+        result = conn.execute(sqlite_insert(_jobs).on_conflict_do_nothing(), values)
+
+    logger.info(f"Enqueued {result.rowcount} of {len(values)} {kind} jobs for {run_date}.")
+    return result.rowcount
+
+
+def requeue_expired(conn: Connection, now: Optional[datetime] = None) -> int:
+    """
+    Puts running jobs whose lease expired back in the queue (or fails them
+    after MAX_ATTEMPTS).
+
+    :return: number of re-queued or failed jobs
+    :rtype: int
+    """
+    now = now or datetime.now()
+    result = conn.execute(
+        _jobs.update()
+        .where(_jobs.c.status == "running", _jobs.c.lease_expires < now)
+        .values(
+            status=case((_jobs.c.attempts >= MAX_ATTEMPTS, "failed"), else_="queued"),
+            lease_owner=None,
+            lease_expires=None,
+            last_error="lease expired",
+        )
+    )
+    if result.rowcount:
+        logger.warning(f"Re-queued {result.rowcount} route jobs with an expired lease.")
+    return result.rowcount
+
+
+def claim_jobs(
+        owner: str,
+        limit: int = 1,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        engine: Optional[Engine] = None,
+        kind_limits: Optional[Mapping[str, int]] = None,
+        ) -> List[ClaimedJob]:
+    """
+    Atomically claims up to `limit` queued jobs, highest priority first.
+
+    Expired leases are re-queued first. The claim itself is one
+    UPDATE ... RETURNING, so two workers can never get the same job.
+
+    :param owner: unique name of the claiming worker
+    :param lease_seconds: time the worker has to complete the jobs
+    :param kind_limits: most running jobs per kind, KIND_LIMITS by default
+    :return: the claimed jobs
+    :rtype: List[ClaimedJob]
+    """
+    engine = engine or get_engine()
+    kind_limits = KIND_LIMITS if kind_limits is None else kind_limits
+    now = datetime.now()
+
+    with engine.begin() as conn:
+        # Takes the write lock, the running counts below cannot change before the claim
+        requeue_expired(conn, now)
+        claimable = _jobs.c.status == "queued"
+        if kind_limits:
+            running = dict(conn.execute(
+                select(_jobs.c.kind, func.count())
+                .where(_jobs.c.status == "running", _jobs.c.kind.in_(list(kind_limits)))
+                .group_by(_jobs.c.kind)
+            ).all())
+            for kind, kind_limit in kind_limits.items():
+                free = max(kind_limit - running.get(kind, 0), 0)
+                # Only the first `free` queued jobs of the kind may be claimed
+                allowed = (
+                    select(_jobs.c.id)
+                    .where(_jobs.c.status == "queued", _jobs.c.kind == kind)
+                    .order_by(_jobs.c.priority.desc(), _jobs.c.id)
+                    .limit(free)
+                )
+                claimable = claimable & ((_jobs.c.kind != kind) | _jobs.c.id.in_(allowed))
+
+        candidates = (
+            select(_jobs.c.id)
+            .where(claimable)
+            .order_by(_jobs.c.priority.desc(), _jobs.c.id)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        rows = conn.execute(
+            _jobs.update()
+            .where(_jobs.c.id.in_(candidates))
+            .values(
+                status="running",
+                attempts=_jobs.c.attempts + 1,
+                lease_owner=owner,
+                lease_expires=now + timedelta(seconds=lease_seconds),
+            )
+            .returning(_jobs.c.id, _jobs.c.search_id, _jobs.c.run_date, _jobs.c.attempts, _jobs.c.priority, _jobs.c.kind)
+        ).all()
+
+    return sorted((ClaimedJob(*row) for row in rows), key=lambda job: (-job.priority, job.id))
+
+
+def steal_jobs(
+        owner: str,
+        started: Collection[int],
+        limit: int = 1,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        engine: Optional[Engine] = None,
+        ) -> List[ClaimedJob]:
+    """
+    Takes over jobs that other workers claimed but did not start yet, so an
+    idle worker does not wait for the prefetched jobs of a busy one.
+
+    The caller has to make sure no job is started while it steals, e.g. by
+    holding the lock that guards `started`.
+
+    :param owner: unique name of the stealing worker
+    :param started: IDs of the running jobs that are already being scraped
+    :return: the stolen jobs, their attempts are not counted again
+    :rtype: List[ClaimedJob]
+    """
+    engine = engine or get_engine()
+    now = datetime.now()
+
+    with engine.begin() as conn:
+        requeue_expired(conn, now)
+        candidates = (
+            select(_jobs.c.id)
+            .where(_jobs.c.status == "running", _jobs.c.lease_owner != owner, _jobs.c.id.not_in(list(started)))
+            .order_by(_jobs.c.priority.desc(), _jobs.c.id)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        rows = conn.execute(
+            _jobs.update()
+            .where(_jobs.c.id.in_(candidates))
+            .values(lease_owner=owner, lease_expires=now + timedelta(seconds=lease_seconds))
+            .returning(_jobs.c.id, _jobs.c.search_id, _jobs.c.run_date, _jobs.c.attempts, _jobs.c.priority, _jobs.c.kind)
+        ).all()
+
+    return sorted((ClaimedJob(*row) for row in rows), key=lambda job: (-job.priority, job.id))
+
+
+def release_jobs(job_ids: Iterable[int], owner: str, engine: Optional[Engine] = None) -> int:
+    """
+    Puts claimed jobs that were never started back in the queue, e.g. when
+    a worker shuts down. Their claim does not count as an attempt.
+
+    :return: number of re-queued jobs
+    :rtype: int
+    """
+    job_ids = list(job_ids)
+    if not job_ids:
+        return 0
+
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        result = conn.execute(
+            _jobs.update()
+            .where(_jobs.c.id.in_(job_ids), _jobs.c.lease_owner == owner, _jobs.c.status == "running")
+            .values(status="queued", attempts=_jobs.c.attempts - 1, lease_owner=None, lease_expires=None)
+        )
+    return result.rowcount
+
+
+def running_job_ids(engine: Optional[Engine] = None) -> List[int]:
+    """
+    :return: IDs of all leased jobs
+    :rtype: List[int]
+    """
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        return conn.execute(select(_jobs.c.id).where(_jobs.c.status == "running")).scalars().all()
+
+
+def leased_search_id(job_id: int, owner: str, engine: Optional[Engine] = None) -> Optional[int]:
+    """
+    :return: search ID of a job currently leased by `owner`, None if the job
+        does not exist or is not running under this lease
+    :rtype: Optional[int]
+    """
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        return conn.execute(
+            select(_jobs.c.search_id)
+            .where(_jobs.c.id == job_id, _jobs.c.lease_owner == owner, _jobs.c.status == "running")
+        ).scalar()
+
+
+def extend_lease(job_id: int, owner: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, engine: Optional[Engine] = None) -> bool:
+    """
+    Heartbeat of a long running job.
+
+    :return: False if the worker lost the lease in the meantime
+    :rtype: bool
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        result = conn.execute(
+            _jobs.update()
+            .where(_jobs.c.id == job_id, _jobs.c.lease_owner == owner, _jobs.c.status == "running")
+            .values(lease_expires=datetime.now() + timedelta(seconds=lease_seconds))
+        )
+    return result.rowcount == 1
+
+
+def complete_job(job_id: int, owner: str, engine: Optional[Engine] = None) -> bool:
+    """
+    Marks a claimed job as done.
+
+    :return: False if the lease was lost, e.g. the job was re-queued and
+        claimed by another worker in the meantime
+    :rtype: bool
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        result = conn.execute(
+            _jobs.update()
+            .where(_jobs.c.id == job_id, _jobs.c.lease_owner == owner, _jobs.c.status == "running")
+            .values(status="done", lease_owner=None, lease_expires=None, last_error=None, finished_at=datetime.now())
+        )
+    if result.rowcount != 1:
+        logger.warning(f"Job {job_id} was no longer leased by {owner} when it completed.")
+    return result.rowcount == 1
+
+
+def fail_job(
+        job_id: int,
+        owner: str,
+        error: str,
+        retry: bool = True,
+        engine: Optional[Engine] = None,
+        ) -> Optional[str]:
+    """
+    Gives a claimed job back after a failed scrape.
+
+    :param retry: re-queue the job unless it reached MAX_ATTEMPTS
+    :return: the new state ("queued" or "failed"), None if the lease was lost
+    :rtype: Optional[str]
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        status = conn.execute(
+            _jobs.update()
+            .where(_jobs.c.id == job_id, _jobs.c.lease_owner == owner, _jobs.c.status == "running")
+            .values(
+                status=case((_jobs.c.attempts < MAX_ATTEMPTS, "queued"), else_="failed") if retry else "failed",
+                lease_owner=None,
+                lease_expires=None,
+                last_error=error[:500],
+                finished_at=datetime.now(),
+            )
+            .returning(_jobs.c.status)
+        ).scalar()
+    return status
+
+
+def defer_jobs(run_date: date, reason: str = "time budget exhausted", engine: Optional[Engine] = None) -> List[int]:
+    """
+    Defers the jobs of a run that are still queued, e.g. once the run used
+    up its time budget. Running jobs are left to finish.
+
+    :return: search IDs of the deferred jobs, highest priority first
+    :rtype: List[int]
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        rows = conn.execute(
+            _jobs.update()
+            .where(_jobs.c.run_date == run_date, _jobs.c.status == "queued")
+            .values(status="deferred", last_error=reason, finished_at=datetime.now())
+            .returning(_jobs.c.search_id, _jobs.c.priority)
+        ).all()
+
+    if rows:
+        logger.warning(f"Deferred {len(rows)} route jobs of {run_date}: {reason}.")
+    return [search_id for search_id, _ in sorted(rows, key=lambda row: (-row[1], row[0]))]
+
+
+def deferred_search_ids(before: date, engine: Optional[Engine] = None) -> Set[int]:
+    """
+    :return: routes whose job in the latest run before `before` was deferred
+    :rtype: Set[int]
+    """
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        return set(conn.execute(
+            text(
+                "SELECT search_id FROM scrape_jobs j WHERE status = 'deferred' AND run_date = ("
+                "  SELECT MAX(run_date) FROM scrape_jobs WHERE search_id = j.search_id AND run_date < :d)"
+            ),
+            {"d": before.isoformat()},
+        ).scalars())
+
+
+def queue_counts(run_date: Optional[date] = None, engine: Optional[Engine] = None) -> Dict[str, int]:
+    """
+    :return: number of jobs per state, optionally for one run
+    :rtype: Dict[str, int]
+    """
+    engine = engine or get_engine()
+    stmt = select(_jobs.c.status, func.count()).group_by(_jobs.c.status)
+    if run_date is not None:
+        stmt = stmt.where(_jobs.c.run_date == run_date)
+
+    with engine.connect() as conn:
+        counts = dict(conn.execute(stmt).all())
+    return {state: counts.get(state, 0) for state in JOB_STATES}
@@ -1,13 +1,35 @@
+from __future__ import annotations
 import os
 import json
+import signal
+import socket
 import logging
+import argparse
 import schedule
+import threading
 import time
+from contextlib import contextmanager, nullcontext
 from logging.handlers import RotatingFileHandler
-from datetime import datetime
+from datetime import date, datetime
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
 
-from web_scraper import get_flight_route_data
-from db import Session, engine, Search
+# The Selenium scraper (web_scraper, driver_pool) is imported where a browser
+# is needed, maintenance tools importing this module never load it
+from http_scraper import DEFAULT_MAX_WORKERS, HttpCalendarClient
+from route_executor import DEFAULT_ROUTE_TIMEOUT
+from ingestion import PriceWriter, DEFAULT_FLUSH_ROWS, DEFAULT_FLUSH_INTERVAL, DEFAULT_STORAGE_MODE
+from retention import apply_retention, DEFAULT_ROLLUP_PERIOD
+from route_scheduler import RouteScheduler, parse_cadence, DEFAULT_CADENCE, DEFAULT_MAX_CONCURRENCY
+from job_queue import enqueue_jobs, claim_jobs, complete_job, fail_job, queue_counts, defer_jobs
+from route_priority import RouteScore, score_routes, parse_weight, DEFAULT_WEIGHT
+from backfill import plan_backfill
+from coordinator import Coordinator, CoordinatorServer, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_FLEET_LEASE_SECONDS
+from fleet_worker import CoordinatorClient, FleetWorker
+from db import RegisteredSearch, get_engine, register_searches
+
+if TYPE_CHECKING:
+    from driver_pool import DriverPool
 
 
 # --- 1. LOGGING SETUP ---
@@ -29,27 +51,80 @@ stream_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 logger.addHandler(stream_handler)
 
+# Number of browsers kept alive during a run (one is plenty on a Raspberry Pi)
+DRIVER_POOL_SIZE = 1
 
-def get_or_create_search(session, **kwargs) -> Search:
-    """
-    Checks if a search with specific parameters exists, 
-    otherwise creates a new one.
-    """
-    # 1. Attempt to find the existing record
-    instance = session.query(Search).filter_by(**kwargs).first()
+# Calendar extraction strategy: "js", "elements" or "network"
+EXTRACTION = "js"
+
+# Scraper backend: "selenium" or "http" (browser-free, falls back to Selenium)
+SCRAPER_BACKEND = "selenium"
+HTTP_MAX_WORKERS = DEFAULT_MAX_WORKERS
+
+# Routes scraped in parallel tabs of one browser (1 = one route after another)
+TABS_PER_BROWSER = 1
+
+# Worker processes scraping routes concurrently (1 = scrape in this process)
+ROUTE_WORKERS = 1
+ROUTE_TIMEOUT = DEFAULT_ROUTE_TIMEOUT
+
+# Batching of the background DB writer
+WRITER_FLUSH_ROWS = DEFAULT_FLUSH_ROWS
+WRITER_FLUSH_INTERVAL = DEFAULT_FLUSH_INTERVAL
+
+# Price storage: "append", "change_only" or "both" (see ingestion.STORAGE_MODES)
+STORAGE_MODE = DEFAULT_STORAGE_MODE
 
-    if instance:
-        logger.info(f"Search found in DB (ID: {instance.id}).")
-        return instance
-    
-    # 2. If not found, create it using the same dictionary
-    instance = Search(**kwargs)
-    session.add(instance)
-    session.commit()
-    session.refresh(instance)
-    logger.info(f"New search created (ID: {instance.id}).")
+# Export finished days to the Parquet archive after every run (needs `uv sync --extra archive`)
+ARCHIVE_ENABLED = False
 
-    return instance
+# Scrape days kept at full resolution, older ones are rolled up into
+# weekly/monthly aggregates (see retention.py). None keeps everything.
+RETENTION_DAYS = None
+ROLLUP_PERIOD = DEFAULT_ROLLUP_PERIOD
+
+# "per_route": every route on its own cadence ("cadence" in searches.json,
+# daily by default), spread evenly over the day (see route_scheduler.py).
+# "daily": all routes at once at DAILY_RUN_TIME.
+SCHEDULER_MODE = "per_route"
+DAILY_RUN_TIME = "06:00"
+MAX_CONCURRENT_ROUTES = DEFAULT_MAX_CONCURRENCY
+SCHEDULER_TICK = 30  # seconds
+# Per-route mode keeps one writer and browser pool for all routes; a browser
+# unused for this long is quit until the next route needs one
+DRIVER_IDLE_TIMEOUT = 600  # seconds
+
+# Archive and retention run once a day in per-route mode
+MAINTENANCE_TIME = "03:00"
+
+# Daily mode works through a durable job queue (see job_queue.py): routes
+# claimed per batch, each lease lasting JOB_LEASE_PER_ROUTE seconds per route
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+JOB_BATCH_SIZE = max(TABS_PER_BROWSER, ROUTE_WORKERS)
+JOB_LEASE_PER_ROUTE = 2 * ROUTE_TIMEOUT
+JOB_POLL_INTERVAL = 30  # seconds to wait for jobs leased by other workers
+
+# Time budget of a daily run in seconds (None = no limit). Routes are scraped
+# most valuable first ("weight" in searches.json, staleness, volatility, see
+# route_priority.py), no new route is started once the budget is used up and
+# the remaining ones go first in the next run.
+RUN_TIME_BUDGET = 4 * 3600
+
+# Routes overdue after a downtime get one catch-up scrape at startup, at most
+# BACKFILL_CONCURRENCY at a time and after all regular jobs (see backfill.py).
+# In per-route mode the scheduler catches up by itself, gaps are only reported.
+BACKFILL_CONCURRENCY = 1
+
+# Fleet mode: several nodes split the routes. The node with the database runs
+# `main.py coordinator`, every scraping node `main.py worker --coordinator URL`
+# (see coordinator.py and fleet_worker.py). The coordinator only listens on
+# localhost unless started with --host; set the same FLEET_TOKEN environment
+# variable on all nodes before exposing it to the network.
+COORDINATOR_HOST = DEFAULT_HOST
+FLEET_TOKEN = os.environ.get("FLEET_TOKEN")
+COORDINATOR_PORT = DEFAULT_PORT
+FLEET_LEASE_SECONDS = DEFAULT_FLEET_LEASE_SECONDS
+FLEET_CONCURRENCY = DRIVER_POOL_SIZE  # routes a worker node scrapes at the same time
 
 
 def load_searches(filepath="searches.json"):
@@ -74,43 +149,555 @@ def load_searches(filepath="searches.json"):
         return []
 
 
-def run_tracker():
-    logger.info("=== Starting flight price data accumulation ===")
+class SearchRegistry:
+    """
+    Search IDs of searches.json, cached for the life of the scheduler process.
+
+    The file is only re-read and registered in the DB (one bulk upsert plus
+    one query) when its modification time or size changes.
+    """
+
+    def __init__(self, filepath: str = "searches.json"):
+        self.filepath = filepath
+        self._signature = None
+        self._searches: List[RegisteredSearch] = []
+        self._schedule: List[Tuple[RegisteredSearch, int]] = []
+        self._weights: Dict[int, float] = {}
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.filepath)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def searches(self) -> List[RegisteredSearch]:
+        """All configured searches with their IDs, in file order."""
+        signature = self._file_signature()
+        if signature is not None and signature == self._signature:
+            return self._searches
+
+        search_configs = load_searches(self.filepath)
+        by_key = register_searches(get_engine(), search_configs)
+        self._searches = [
+            by_key[(c['origin'], c['destination'], c['distance'])] for c in search_configs
+        ]
+        self._schedule = [
+            (search, self._cadence(config)) for search, config in zip(self._searches, search_configs)
+        ]
+        self._weights = {
+            search.id: self._weight(config) for search, config in zip(self._searches, search_configs)
+        }
+        self._signature = signature
+        logger.info(f"Registered {len(self._searches)} searches from {self.filepath}.")
+        return self._searches
+
+    def _cadence(self, config: dict) -> int:
+        try:
+            return parse_cadence(config.get('cadence', DEFAULT_CADENCE))
+        except ValueError as e:
+            logger.warning(f"{config['origin']} -> {config['destination']}: {e}, using {DEFAULT_CADENCE}.")
+            return parse_cadence(DEFAULT_CADENCE)
+
+    def _weight(self, config: dict) -> float:
+        try:
+            return parse_weight(config.get('weight'))
+        except ValueError as e:
+            logger.warning(f"{config['origin']} -> {config['destination']}: {e}, using {DEFAULT_WEIGHT}.")
+            return DEFAULT_WEIGHT
+
+    def weights(self) -> Dict[int, float]:
+        """User-assigned weight of every configured search (by ID)."""
+        self.searches()
+        return self._weights
+
+    def schedule(self) -> List[Tuple[RegisteredSearch, int]]:
+        """All configured searches with their cadence in seconds, same list object until the file changes."""
+        self.searches()
+        return self._schedule
+
+
+search_registry = SearchRegistry('searches.json')
+
+
+def save_route_data(
+        writer: PriceWriter,
+        search: RegisteredSearch,
+        df,
+        on_written: Optional[Callable[[RegisteredSearch], None]] = None,
+        on_failed: Optional[Callable[[RegisteredSearch], None]] = None,
+        ) -> None:
+    if df is None or df.empty:
+        logger.warning(f"No prices found for {search.origin} -> {search.destination}.")
+        if on_failed is not None:
+            on_failed(search)
+        return
+
+    # Hand the rows to the background writer, scraping continues right away
+    writer.submit(df, search.id, on_written=partial(on_written, search) if on_written is not None else None)
+
+    logger.info(f"Completed search for {search.origin} -> {search.destination}.")
+
+
+def archive_prices() -> bool:
+    """
+    :return: False if the export failed
+    :rtype: bool
+    """
+    from archive import export_prices, compact_archive
 
     try:
-        # Setup DB session
-        SessionLocal = Session()
+        export_prices()
+    except Exception as e:
+        logger.error(f"Archiving failed: {e}")
+        return False
 
-        search_configs = load_searches('searches.json')
+    # Merge last month's daily files once a month
+    if datetime.now().day == 1:
+        try:
+            compact_archive()
+        except Exception as e:
+            logger.error(f"Compacting the archive failed: {e}")
+    return True
 
-        for search_config in search_configs:
-            logger.info(f"Start search for {search_config['origin']} -> {search_config['destination']}...")
-            
-            search = get_or_create_search(SessionLocal, **search_config)
 
-            date_today = datetime.now().strftime('%Y-%m-%d')
+@contextmanager
+def scrape_session(
+        pool_size: int = DRIVER_POOL_SIZE,
+        max_idle_seconds: Optional[float] = None,
+        ) -> Iterator[Tuple[PriceWriter, DriverPool, Optional[HttpCalendarClient]]]:
+    """Writer, browser pool and HTTP client (with the http backend) shared by all routes of a run."""
+    from driver_pool import DriverPool
+    from web_scraper import create_chrome_driver
 
-            df = get_flight_route_data(origin=search.origin, dest=search.destination, depature_date=date_today)
-            df["search_id"] = search.id
-            df.to_sql('price_time_series', con=engine, if_exists='append', index=False)
+    # One browser for the whole run instead of a cold start per route,
+    # only started once the first route needs it
+    driver_factory = partial(create_chrome_driver, network_logging=EXTRACTION == "network")
+    # Likewise one HTTP client, its connections and session parameters are reused
+    http_client = HttpCalendarClient(max_workers=HTTP_MAX_WORKERS) if SCRAPER_BACKEND == "http" else None
 
-            logger.info(f"Completed search for {search.origin} -> {search.destination}.")
-        
+    # Scraping and DB writes overlap, the writer drains when the block ends
+    with PriceWriter(
+            flush_rows=WRITER_FLUSH_ROWS, 
+            flush_interval=WRITER_FLUSH_INTERVAL, 
+            storage_mode=STORAGE_MODE,
+            ) as writer, DriverPool(
+                size=pool_size, factory=driver_factory, max_idle_seconds=max_idle_seconds,
+                ) as driver_pool, http_client or nullcontext():
+        yield writer, driver_pool, http_client
+
+
+def scrape_searches(
+        searches: List[RegisteredSearch],
+        writer: PriceWriter,
+        driver_pool: DriverPool,
+        http_client: Optional[HttpCalendarClient] = None,
+        on_written: Optional[Callable[[RegisteredSearch], None]] = None,
+        on_failed: Optional[Callable[[RegisteredSearch], None]] = None,
+        ) -> None:
+    """
+    Scrapes the given routes with the configured backend and queues their prices.
+
+    :param http_client: client of the http backend, all routes go to Selenium without it
+    :param on_written: called with each route once its prices are committed
+    :param on_failed: called with each route that returned no prices
+    """
+    from route_executor import RouteExecutor
+    from web_scraper import edit_flight_data, get_flight_route_data, get_flight_routes_data_in_tabs
+
+    date_today = datetime.now().strftime('%Y-%m-%d')
+    save = partial(save_route_data, writer, on_written=on_written, on_failed=on_failed)
+
+    # Browser-free backend: fetch all routes concurrently up front,
+    # routes without a result are scraped with Selenium below
+    pending = searches
+    if http_client is not None:
+        routes = [(s.origin, s.destination, date_today) for s in searches]
+        prefetched = http_client.fetch_many(routes)
+
+        pending = []
+        for search, route in zip(searches, routes):
+            data = prefetched.get(route)
+            if data is not None and not data.empty:
+                save(search, edit_flight_data(data))
+            else:
+                logger.warning(f"HTTP backend returned no prices for {search.origin} -> {search.destination}, falling back to Selenium.")
+                pending.append(search)
+
+    if ROUTE_WORKERS > 1:
+        # Routes run in worker processes, results are written here only
+        # By search_id, searches may share origin and destination with different settings
+        by_id = {s.id: s for s in pending}
+        routes = [
+            {"search_id": s.id, "origin": s.origin, "dest": s.destination, "depature_date": date_today}
+            for s in pending
+        ]
+        with RouteExecutor(max_workers=ROUTE_WORKERS, route_timeout=ROUTE_TIMEOUT, extraction=EXTRACTION) as executor:
+            for route, df in executor.map(routes):
+                save(by_id[route["search_id"]], df)
+        pending = []
+
+    # Remaining routes one after another, optionally interleaved in tabs
+    for i in range(0, len(pending), TABS_PER_BROWSER):
+        chunk = pending[i:i + TABS_PER_BROWSER]
+        for search in chunk:
+            logger.info(f"Start search for {search.origin} -> {search.destination}...")
+
+        if len(chunk) == 1:
+            dfs = [get_flight_route_data(
+                origin=chunk[0].origin, 
+                dest=chunk[0].destination, 
+                depature_date=date_today, 
+                driver_pool=driver_pool,
+                extraction=EXTRACTION,
+                )]
+        else:
+            dfs = get_flight_routes_data_in_tabs(
+                [{"origin": s.origin, "dest": s.destination} for s in chunk],
+                depature_date=date_today,
+                driver_pool=driver_pool,
+                extraction=EXTRACTION,
+                )
+
+        for search, df in zip(chunk, dfs):
+            save(search, df)
+
+
+def scrape_route(
+        writer: PriceWriter,
+        driver_pool: DriverPool,
+        http_client: Optional[HttpCalendarClient],
+        search: RegisteredSearch,
+        ) -> None:
+    logger.info(f"=== Scheduled run for {search.origin} -> {search.destination} ===")
+    scrape_searches([search], writer, driver_pool, http_client)
+
+
+def run_jobs(run_date: date, deadline: Optional[float] = None) -> List[int]:
+    """
+    Works through the route jobs of a run until none is left.
+
+    Jobs are claimed in batches, highest priority first, and completed once
+    their prices are committed. Jobs leased by other (or crashed) workers are
+    waited for until they are done or their lease expires and they can be
+    claimed here.
+
+    :param deadline: time.monotonic() after which no new batch is started,
+        the jobs still queued then are deferred
+    :return: search IDs of the deferred routes
+    :rtype: List[int]
+    """
+    by_id = {s.id: s for s in search_registry.searches()}
+
+    with scrape_session() as (writer, driver_pool, http_client):
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                return defer_jobs(run_date)
+
+            jobs = claim_jobs(
+                WORKER_ID, 
+                limit=JOB_BATCH_SIZE, 
+                lease_seconds=JOB_BATCH_SIZE * JOB_LEASE_PER_ROUTE,
+                kind_limits={"backfill": BACKFILL_CONCURRENCY},
+                )
+            if not jobs:
+                counts = queue_counts(run_date)
+                if not counts["queued"] and not counts["running"]:
+                    return []
+                time.sleep(JOB_POLL_INTERVAL)
+                continue
+
+            job_by_search = {}
+            for job in jobs:
+                if job.search_id in by_id:
+                    job_by_search[job.search_id] = job
+                else:
+                    fail_job(job.id, WORKER_ID, "search is no longer configured", retry=False)
+
+            batch = [by_id[search_id] for search_id in job_by_search]
+            try:
+                scrape_searches(
+                    batch, writer, driver_pool, http_client,
+                    on_written=lambda s, jobs=job_by_search: complete_job(jobs[s.id].id, WORKER_ID),
+                    on_failed=lambda s, jobs=job_by_search: fail_job(jobs[s.id].id, WORKER_ID, "no prices scraped"),
+                    )
+            except Exception as e:
+                logger.error(f"Scraping batch failed: {e}")
+                # Only affects jobs still leased here, completed ones stay done
+                for job in job_by_search.values():
+                    fail_job(job.id, WORKER_ID, str(e))
+
+
+def run_maintenance() -> None:
+    try:
+        if ARCHIVE_ENABLED and not archive_prices():
+            logger.warning("Skipping retention, the archive is not up to date.")
+            return
+
+        # After archiving, so the archive still gets the full resolution rows;
+        # rows past a route's archive watermark are kept in any case
+        if RETENTION_DAYS is not None:
+            apply_retention(keep_days=RETENTION_DAYS, period=ROLLUP_PERIOD, archived_only=ARCHIVE_ENABLED)
+    except Exception as e:
+        logger.error(f"Maintenance failed: {e}")
+
+
+def plan_run(run_date: date) -> List[RouteScore]:
+    """
+    Enqueues the jobs of a run with the priority of their route.
+
+    A no-op for routes that already have a job, a restarted run only does what is left.
+
+    :return: the scored routes, most valuable first
+    :rtype: List[RouteScore]
+    """
+    scores = score_routes(search_registry.searches(), search_registry.weights(), run_date)
+    enqueue_jobs([s.search.id for s in scores], run_date, priorities={s.search.id: s.priority for s in scores})
+    for s in scores:
+        logger.debug(
+            f"{s.search.origin} -> {s.search.destination}: score {s.score:.1f} "
+            f"({s.staleness:.0f} days stale, volatility {s.volatility:.2f}, weight {s.weight:g}"
+            f"{', deferred last run' if s.deferred else ''})."
+        )
+    return scores
+
+
+def run_tracker():
+    logger.info("=== Starting flight price data accumulation ===")
+
+    try:
+        run_date = date.today()
+        deadline = time.monotonic() + RUN_TIME_BUDGET if RUN_TIME_BUDGET is not None else None
+        by_id = {s.search.id: s.search for s in plan_run(run_date)}
+        deferred = run_jobs(run_date, deadline)
+
+        counts = queue_counts(run_date)
+        logger.info(
+            f"Route jobs of {run_date}: {counts['done']} done, {counts['failed']} failed, "
+            f"{counts['deferred']} deferred."
+        )
+        if deferred:
+            routes = ", ".join(f"{by_id[i].origin} -> {by_id[i].destination}" for i in deferred if i in by_id)
+            logger.warning(
+                f"Time budget of {RUN_TIME_BUDGET / 60:.0f} min used up, deferred to the next run: {routes}."
+            )
+        run_maintenance()
         logger.info("Flight price accumulation run completed.")
         
     except Exception as e:
         logger.error(f"Scheduled task failed: {e}")
         
 
-# Schedule the task
-schedule.every().day.at("06:00").do(run_tracker)
+def run_scheduler() -> None:
+    """Per-route mode: runs each route when it is due, maintenance once a day."""
+    schedule.every().day.at(MAINTENANCE_TIME).do(run_maintenance)
 
-if __name__ == "__main__":
-    logger.info("Scheduler active. Waiting...")
+    # Overdue routes are due right away below, one catch-up run each
+    try:
+        plan_backfill(search_registry.schedule(), enqueue=False)
+    except Exception as e:
+        logger.error(f"Checking for missed scrape days failed: {e}")
+
+    # One writer, browser pool and HTTP client for all routes instead of a browser start per route
+    with scrape_session(
+            pool_size=max(DRIVER_POOL_SIZE, MAX_CONCURRENT_ROUTES), 
+            max_idle_seconds=DRIVER_IDLE_TIMEOUT,
+            ) as (writer, driver_pool, http_client), RouteScheduler(
+            partial(scrape_route, writer, driver_pool, http_client), 
+            max_concurrency=MAX_CONCURRENT_ROUTES,
+            ) as scheduler:
+        routes = None
+        while True:
+            try:
+                # The registry returns the same list until searches.json changes
+                current = search_registry.schedule()
+                if current is not routes:
+                    scheduler.sync(current)
+                    routes = current
+                scheduler.run_pending()
+                driver_pool.reap_idle()
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}")
+
+            schedule.run_pending()
+            time.sleep(SCHEDULER_TICK)
+
+
+def scrape_job(driver_pool: DriverPool, http_client: Optional[HttpCalendarClient], job: dict):
+    """Scrapes the route of a fleet job."""
+    from web_scraper import get_flight_route_data
+
+    return get_flight_route_data(
+        origin=job["origin"],
+        dest=job["destination"],
+        depature_date=datetime.now().strftime('%Y-%m-%d'),
+        driver_pool=driver_pool,
+        extraction=EXTRACTION,
+        backend=SCRAPER_BACKEND,
+        http_client=http_client,
+        )
+
+
+def run_worker(
+        coordinator_url: str,
+        concurrency: int = FLEET_CONCURRENCY,
+        worker_id: str = WORKER_ID,
+        exit_when_idle: bool = False,
+        token: Optional[str] = FLEET_TOKEN,
+        ) -> None:
+    """Fleet mode: scrapes the route jobs handed out by the coordinator, no database needed."""
+    from driver_pool import DriverPool
+    from web_scraper import create_chrome_driver
+
+    driver_factory = partial(create_chrome_driver, network_logging=EXTRACTION == "network")
+    http_client = HttpCalendarClient(max_workers=HTTP_MAX_WORKERS) if SCRAPER_BACKEND == "http" else None
+    with DriverPool(size=concurrency, factory=driver_factory) as driver_pool, http_client or nullcontext():
+        worker = FleetWorker(
+            CoordinatorClient(coordinator_url, worker_id, token=token),
+            partial(scrape_job, driver_pool, http_client),
+            concurrency=concurrency,
+            exit_when_idle=exit_when_idle,
+            )
+        # `podman stop`: finish the running routes and give the others back
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
+
+
+def defer_fleet_run(run_date: date) -> None:
+    try:
+        defer_jobs(run_date)
+    except Exception as e:
+        logger.error(f"Deferring the rest of the run of {run_date} failed: {e}")
+
+
+def start_fleet_run() -> None:
+    run_date = date.today()
+    try:
+        plan_run(run_date)
+        logger.info(f"Route jobs of {run_date} are ready for the fleet.")
+    except Exception as e:
+        logger.error(f"Starting the run of {run_date} failed: {e}")
+        return
+
+    if RUN_TIME_BUDGET is not None:
+        timer = threading.Timer(RUN_TIME_BUDGET, defer_fleet_run, args=(run_date,))
+        timer.daemon = True
+        timer.start()
+
+
+def run_coordinator(
+        host: str = COORDINATOR_HOST,
+        port: int = COORDINATOR_PORT,
+        run_now: bool = False,
+        token: Optional[str] = FLEET_TOKEN,
+        ) -> None:
+    """Fleet mode: serves the route jobs to the workers and stores their prices."""
+    schedule.every().day.at(DAILY_RUN_TIME).do(start_fleet_run)
+    schedule.every().day.at(MAINTENANCE_TIME).do(run_maintenance)
+    if run_now:
+        start_fleet_run()
+    try:
+        plan_backfill(search_registry.schedule())
+    except Exception as e:
+        logger.error(f"Backfill failed: {e}")
+
+    with PriceWriter(
+            flush_rows=WRITER_FLUSH_ROWS, 
+            flush_interval=WRITER_FLUSH_INTERVAL, 
+            storage_mode=STORAGE_MODE,
+            ) as writer:
+        coordinator = Coordinator(
+            search_registry.searches, 
+            writer, 
+            lease_seconds=FLEET_LEASE_SECONDS, 
+            kind_limits={"backfill": BACKFILL_CONCURRENCY},
+            )
+        server = CoordinatorServer((host, port), coordinator, token=token)
+        threading.Thread(target=server.serve_forever, name="coordinator", daemon=True).start()
+        logger.info(f"Coordinator listening on {host}:{port}.")
+
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+        try:
+            while not stopped.wait(1):
+                schedule.run_pending()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Stop handing out jobs before the writer drains
+            server.shutdown()
+            server.server_close()
+
+
+def run_backfill(dry_run: bool = False) -> None:
+    """Catches up on the routes that are overdue, e.g. after the container was down."""
+    try:
+        run_date = date.today()
+        plan = plan_backfill(search_registry.schedule(), run_date, enqueue=not dry_run)
+        if plan.enqueued:
+            logger.info(f"=== Catching up on {plan.enqueued} overdue routes ===")
+            deadline = time.monotonic() + RUN_TIME_BUDGET if RUN_TIME_BUDGET is not None else None
+            run_jobs(run_date, deadline)
+    except Exception as e:
+        logger.error(f"Backfill failed: {e}")
+
+
+def run_daily_scheduler() -> None:
+    # Resume a run that was interrupted by a crash or restart
+    counts = queue_counts(date.today())
+    if counts["queued"] or counts["running"]:
+        logger.info("Resuming today's unfinished run...")
+        run_tracker()
+
+    run_backfill()
+
+    # Schedule the task
+    schedule.every().day.at(DAILY_RUN_TIME).do(run_tracker)
     while True:
         schedule.run_pending()
         time.sleep(60) # Check every minute
 
-    # testing
-    # logger.info("Run price tracker once...")
-    # run_tracker()
\ No newline at end of file
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Flight price tracker.")
+    parser.add_argument("--now", action="store_true", help="Run all routes once right away and exit.")
+    subparsers = parser.add_subparsers(dest="mode")
+
+    coordinator = subparsers.add_parser("coordinator", help="Hand out route jobs to fleet workers and store their prices.")
+    coordinator.add_argument("--host", default=COORDINATOR_HOST, help="Address to listen on, 0.0.0.0 for all interfaces.")
+    coordinator.add_argument("--port", type=int, default=COORDINATOR_PORT)
+    coordinator.add_argument("--run-now", action="store_true", help="Start a run right away instead of at DAILY_RUN_TIME.")
+
+    worker = subparsers.add_parser("worker", help="Scrape route jobs of a fleet coordinator.")
+    worker.add_argument("--coordinator", required=True, help="URL of the coordinator, e.g. http://pi-1:8765")
+    worker.add_argument("--concurrency", type=int, default=FLEET_CONCURRENCY, help="Routes scraped at the same time.")
+    worker.add_argument("--name", default=WORKER_ID, help="Unique name of this worker.")
+    worker.add_argument("--exit-when-idle", action="store_true", help="Stop once all jobs are done.")
+
+    backfill = subparsers.add_parser("backfill", help="Report missed scrape days and catch up on overdue routes.")
+    backfill.add_argument("--dry-run", action="store_true", help="Only report the gaps.")
+
+    args = parser.parse_args()
+
+    if args.mode == "coordinator":
+        run_coordinator(args.host, args.port, run_now=args.run_now)
+    elif args.mode == "worker":
+        run_worker(args.coordinator, args.concurrency, args.name, exit_when_idle=args.exit_when_idle)
+    elif args.mode == "backfill":
+        run_backfill(dry_run=args.dry_run)
+    elif args.now:
+        logger.info("Run price tracker once...")
+        run_tracker()
+    else:
+        logger.info("Scheduler active. Waiting...")
+        if SCHEDULER_MODE == "per_route":
+            run_scheduler()
+        else:
+            run_daily_scheduler()
+
+
+if __name__ == "__main__":
+    main()
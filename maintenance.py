@@ -0,0 +1,153 @@
+"""
+One-off maintenance tools for the price database.
+
+Usage:
+    uv run maintenance.py dedup [--vacuum]
+    uv run maintenance.py to-change-only
+    uv run maintenance.py verify-change-only
+    uv run maintenance.py archive [--compact]
+    uv run maintenance.py retention [--keep-days 180] [--period month] [--archived-only] [--vacuum]
+    uv run maintenance.py check-summaries [--storage-mode append] [--rebuild]
+"""
+import time
+import logging
+import argparse
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+
+from db import deduplicate_price_rows, get_engine, migrate
+from change_storage import migrate_to_change_only, verify_change_only
+from summary_tables import SUMMARY_SOURCES, rebuild_summaries, verify_summaries
+from retention import apply_retention, RETENTION_DAYS, ROLLUP_PERIODS, DEFAULT_ROLLUP_PERIOD
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+
+def vacuum_database(engine: Optional[Engine] = None) -> None:
+    """Rebuilds the database file to give the space of deleted rows back to the OS."""
+    engine = engine or get_engine()
+    start = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    logger.info(f"Database compacted in {time.perf_counter() - start:.1f}s.")
+
+
+def deduplicate_prices(engine: Optional[Engine] = None, vacuum: bool = False) -> int:
+    """
+    Removes duplicate price_time_series rows in place and makes sure the
+    natural key that prevents new duplicates exists.
+
+    Opening a database without the key already does this (see db.migrate),
+    run it explicitly to compact the file afterwards.
+
+    :param vacuum: rebuild the file afterwards to give the space back to the OS
+    :return: number of deleted rows
+    :rtype: int
+    """
+    engine = engine or get_engine()
+    deleted = deduplicate_price_rows(engine)
+    migrate(engine)
+
+    if vacuum:
+        vacuum_database(engine)
+
+    logger.info(f"Deduplication finished, {deleted} rows removed.")
+    return deleted
+
+
+def convert_to_change_only(engine: Optional[Engine] = None) -> bool:
+    """
+    Builds the change-only price_intervals from price_time_series and verifies them.
+
+    :return: True if both layouts hold exactly the same daily rows
+    :rtype: bool
+    """
+    engine = engine or get_engine()
+    migrate_to_change_only(engine)
+    return check_change_only(engine)
+
+
+def check_change_only(engine: Optional[Engine] = None) -> bool:
+    engine = engine or get_engine()
+    report = verify_change_only(engine)
+    equivalent = report["missing"] == 0 and report["extra"] == 0
+    if not equivalent:
+        logger.error("Change-only storage does NOT match price_time_series.")
+    return equivalent
+
+
+def run_archive(args: argparse.Namespace) -> None:
+    # pyarrow is optional, only import the archive when it is used
+    from archive import export_prices, compact_archive
+
+    export_prices()
+    if args.compact:
+        compact_archive()
+
+
+def run_retention(args: argparse.Namespace) -> None:
+    apply_retention(keep_days=args.keep_days, period=args.period, archived_only=args.archived_only)
+    if args.vacuum:
+        vacuum_database()
+
+
+def check_summaries(args: argparse.Namespace) -> bool:
+    """
+    Compares latest_price and daily_route_min with a recomputation from scratch.
+
+    :return: True if they match (after rebuilding them with --rebuild)
+    :rtype: bool
+    """
+    source = SUMMARY_SOURCES[args.storage_mode]
+    if args.rebuild:
+        rebuild_summaries(source=source)
+
+    report = verify_summaries(source=source)
+    consistent = not any(report.values())
+    if not consistent:
+        logger.error("Summary tables do NOT match the price history, fix them with --rebuild.")
+    return consistent
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    dedup = subparsers.add_parser("dedup", help="Remove duplicate price rows and add the natural key.")
+    dedup.add_argument("--vacuum", action="store_true", help="Compact the database file afterwards.")
+    dedup.set_defaults(func=lambda args: deduplicate_prices(vacuum=args.vacuum))
+
+    to_change_only = subparsers.add_parser("to-change-only", help="Build price_intervals from price_time_series.")
+    to_change_only.set_defaults(func=lambda args: convert_to_change_only())
+
+    verify = subparsers.add_parser("verify-change-only", help="Compare price_intervals with price_time_series.")
+    verify.set_defaults(func=lambda args: check_change_only())
+
+    archive = subparsers.add_parser("archive", help="Export new price rows to the Parquet archive.")
+    archive.add_argument("--compact", action="store_true", help="Merge the daily files into monthly ones.")
+    archive.set_defaults(func=run_archive)
+
+    retention = subparsers.add_parser("retention", help="Roll up and delete price rows older than the retention window.")
+    retention.add_argument("--keep-days", type=int, default=RETENTION_DAYS, help="Scrape days kept at full resolution.")
+    retention.add_argument("--period", choices=ROLLUP_PERIODS, default=DEFAULT_ROLLUP_PERIOD)
+    retention.add_argument("--archived-only", action="store_true", help="Keep the rows not in the Parquet archive yet.")
+    retention.add_argument("--vacuum", action="store_true", help="Compact the database file afterwards.")
+    retention.set_defaults(func=run_retention)
+
+    summaries = subparsers.add_parser("check-summaries", help="Verify latest_price and daily_route_min.")
+    summaries.add_argument("--storage-mode", choices=list(SUMMARY_SOURCES), default="append",
+                           help="Storage mode of the tracker, decides which table the summaries come from.")
+    summaries.add_argument("--rebuild", action="store_true", help="Recompute both tables first.")
+    summaries.set_defaults(func=check_summaries)
+
+    args = parser.parse_args()
+    if args.func(args) is False:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
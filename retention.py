@@ -0,0 +1,171 @@
+"""
+Retention for price_time_series: keeps the recent scrapes at full resolution
+and downsamples everything older into price_rollups.
+
+Only whole weeks/months older than the retention window are rolled up, each
+route and period in its own short transaction that writes the aggregates and
+deletes the raw rows together. The writer is never blocked for long and an
+interrupted run can simply be started again. With the Parquet archive
+enabled, rows not exported yet (archive_state) are never deleted.
+"""
+from __future__ import annotations
+import time
+import logging
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from db import get_engine
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+RETENTION_DAYS = 180    # scrape days kept at full resolution
+ROLLUP_PERIODS = ("week", "month")
+DEFAULT_ROLLUP_PERIOD = "month"
+
+# Late rows of an already rolled-up period are merged into the existing aggregates
+ROLLUP_SQL = """
+WITH scrapes AS (
+    SELECT departure_date, price, scraped_at,
+           ROW_NUMBER() OVER (PARTITION BY departure_date ORDER BY scraped_at DESC) AS recency
+    FROM price_time_series
+    WHERE search_id = :s AND scraped_at >= :start AND scraped_at < :end
+)
+INSERT INTO price_rollups (
+    search_id, departure_date, period, period_start,
+    min_price, max_price, mean_price, last_price, last_scraped_at, samples
+)
+SELECT :s, departure_date, :period, :start,
+       MIN(price), MAX(price), AVG(price),
+       MAX(CASE WHEN recency = 1 THEN price END), MAX(scraped_at), COUNT(price)
+FROM scrapes
+WHERE true
+GROUP BY departure_date
+ON CONFLICT (search_id, departure_date, period, period_start) DO UPDATE SET
+    min_price = MIN(COALESCE(min_price, excluded.min_price), COALESCE(excluded.min_price, min_price)),
+    max_price = MAX(COALESCE(max_price, excluded.max_price), COALESCE(excluded.max_price, max_price)),
+    mean_price = CASE WHEN samples + excluded.samples = 0 THEN NULL ELSE
+        (COALESCE(mean_price, 0) * samples + COALESCE(excluded.mean_price, 0) * excluded.samples)
+        / (samples + excluded.samples) END,
+    last_price = CASE WHEN excluded.last_scraped_at >= last_scraped_at
+        THEN excluded.last_price ELSE last_price END,
+    last_scraped_at = MAX(last_scraped_at, excluded.last_scraped_at),
+    samples = samples + excluded.samples
+"""
+
+
+def period_bounds(day: date, period: str = DEFAULT_ROLLUP_PERIOD) -> tuple:
+    """
+    :return: first day of the week (Monday) or month containing `day` and the first day of the next one
+    :rtype: tuple
+    """
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown rollup period '{period}', use one of {ROLLUP_PERIODS}")
+
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+
+    start = day.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def apply_retention(
+        engine: Optional[Engine] = None,
+        keep_days: int = RETENTION_DAYS,
+        period: str = DEFAULT_ROLLUP_PERIOD,
+        today: Optional[date] = None,
+        archived_only: bool = False,
+        ) -> int:
+    """
+    Rolls up and deletes the price_time_series rows older than the retention window.
+
+    The window is extended back to the start of its period, so a week or
+    month is only ever rolled up once it lies completely outside of it.
+
+    :param keep_days: number of recent scrape days kept at full resolution
+    :param period: "week" or "month" aggregates
+    :param archived_only: only roll up rows up to each route's archive
+        watermark, routes never archived are left alone
+    :return: number of raw rows rolled up and deleted
+    :rtype: int
+    """
+    engine = engine or get_engine()
+    today = today or date.today()
+    cutoff, _ = period_bounds(today - timedelta(days=keep_days), period)
+
+    with engine.connect() as conn:
+        # Served by the (search_id, scraped_at, ...) covering index
+        scrapes = conn.execute(
+            text("SELECT DISTINCT search_id, scraped_at FROM price_time_series WHERE scraped_at < :cutoff"),
+            {"cutoff": cutoff.isoformat()},
+        ).all()
+        watermarks = dict(conn.execute(text("SELECT search_id, exported_through FROM archive_state")).all())
+
+    periods = sorted({
+        (search_id, period_bounds(date.fromisoformat(str(scraped_at)[:10]), period))
+        for search_id, scraped_at in scrapes
+    })
+
+    deleted = 0
+    for search_id, (start, end) in periods:
+        if archived_only:
+            if search_id not in watermarks:
+                continue
+            # A partly archived period is rolled up up to the watermark, the
+            # rest is merged into its aggregates once it is archived as well
+            end = min(end, date.fromisoformat(str(watermarks[search_id])[:10]) + timedelta(days=1))
+            if end <= start:
+                continue
+        params = {"s": search_id, "period": period, "start": start.isoformat(), "end": end.isoformat()}
+        begin = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text(ROLLUP_SQL), params)
+            result = conn.execute(
+                text("DELETE FROM price_time_series WHERE search_id = :s AND scraped_at >= :start AND scraped_at < :end"),
+                params,
+            )
+        deleted += result.rowcount
+        logger.info(
+            f"Search {search_id}: rolled up {result.rowcount} rows of the {period} from {start} "
+            f"in {time.perf_counter() - begin:.2f}s."
+        )
+
+    logger.info(f"Retention finished, {deleted} rows older than {cutoff} rolled up.")
+    return deleted
+
+
+def load_rollups(
+        engine: Optional[Engine] = None,
+        search_id: Optional[int] = None,
+        period: Optional[str] = None,
+        ) -> pd.DataFrame:
+    """
+    :return: DataFrame of price_rollups, optionally for one route and/or period
+    """
+    import pandas as pd
+
+    engine = engine or get_engine()
+    where = []
+    params = {}
+    if search_id is not None:
+        where.append("search_id = :s")
+        params["s"] = search_id
+    if period is not None:
+        where.append("period = :period")
+        params["period"] = period
+
+    sql = "SELECT * FROM price_rollups"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY search_id, period_start, departure_date"
+
+    with engine.connect() as conn:
+        return pd.read_sql(text(sql), conn, params=params)
@@ -0,0 +1,205 @@
+from __future__ import annotations
+import os
+import queue
+import signal
+import logging
+import itertools
+import multiprocessing
+import time
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+# Two browsers at a time fit comfortably into a 4 GB Raspberry Pi
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_ROUTE_TIMEOUT = 300   # seconds before a route's worker is considered hung
+RESULT_POLL_INTERVAL = 0.5
+
+
+def _worker_main(worker_id: int, tasks, results, extraction: str) -> None:
+    """
+    Entry point of a worker process: scrapes routes until it receives None.
+
+    The worker keeps one browser alive for all its routes and runs in its own
+    process group, so killing the group also takes down chromedriver/Chromium.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    from driver_pool import DriverPool
+    from web_scraper import create_chrome_driver, get_flight_route_data
+
+    driver_factory = partial(create_chrome_driver, network_logging=extraction == "network")
+    with DriverPool(size=1, factory=driver_factory) as driver_pool:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            task_id, route = task
+            kwargs = {key: value for key, value in route.items() if key != "search_id"}
+            try:
+                df = get_flight_route_data(driver_pool=driver_pool, extraction=extraction, **kwargs)
+                results.put((worker_id, task_id, df, None))
+            except Exception as e:
+                results.put((worker_id, task_id, None, str(e)))
+
+
+class _Worker:
+    """A worker process with its private task queue and the task it is running."""
+
+    def __init__(self, ctx, worker_id: int, results, extraction: str):
+        self.id = worker_id
+        self.tasks = ctx.Queue()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.tasks, results, extraction),
+            name=f"route-worker-{worker_id}",
+            daemon=True,
+        )
+        self.process.start()
+        self.task_id: Optional[int] = None
+        self.started_at = 0.0
+
+    def assign(self, task_id: int, route: Dict) -> None:
+        self.task_id = task_id
+        self.started_at = time.monotonic()
+        self.tasks.put((task_id, route))
+
+    def kill(self) -> None:
+        # Kill the whole process group so the browser does not outlive its worker
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            self.process.kill()
+        self.process.join(timeout=5)
+
+    def stop(self) -> None:
+        self.tasks.put(None)
+
+
+class RouteExecutor:
+    """
+    Runs get_flight_route_data for many routes in long-lived worker processes.
+
+    At most `max_workers` routes run at the same time. A route that takes
+    longer than `route_timeout` gets its worker (and browser) killed and
+    replaced. Results are streamed back to the parent, which stays the only
+    process writing to the database.
+
+    Usage:
+        with RouteExecutor(max_workers=2) as executor:
+            for route, df in executor.map(routes):
+                ...
+    """
+
+    def __init__(
+            self,
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            route_timeout: float = DEFAULT_ROUTE_TIMEOUT,
+            extraction: str = "js",
+            ):
+        if max_workers < 1:
+            raise ValueError("RouteExecutor needs at least one worker")
+
+        self.max_workers = max_workers
+        self.route_timeout = route_timeout
+        self.extraction = extraction
+        # spawn keeps the workers free of the parent's threads and DB connections
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._worker_ids = itertools.count()
+        self._workers: list[_Worker] = []
+
+    def __enter__(self) -> "RouteExecutor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.shutdown()
+
+    def _spawn_worker(self) -> _Worker:
+        worker = _Worker(self._ctx, next(self._worker_ids), self._results, self.extraction)
+        self._workers.append(worker)
+        return worker
+
+    def _replace_worker(self, worker: _Worker) -> None:
+        worker.kill()
+        self._workers.remove(worker)
+        self._spawn_worker()
+
+    def map(self, routes: Iterable[Dict]) -> Iterator[Tuple[Dict, pd.DataFrame | None]]:
+        """
+        Scrapes all routes and yields (route, DataFrame) as they complete.
+
+        :param routes: keyword arguments for get_flight_route_data
+            (origin, dest, depature_date, ...), optionally with the route's
+            "search_id", which only comes back with the result
+        :return: iterator of (route, DataFrame), DataFrame is None if the
+            route failed or timed out
+        """
+        todo = list(enumerate(routes))
+        todo.reverse()
+        in_flight: Dict[int, Dict] = {}
+
+        while len(self._workers) < min(self.max_workers, len(todo)):
+            self._spawn_worker()
+
+        while todo or in_flight:
+            for worker in list(self._workers):
+                if worker.task_id is None and todo:
+                    if not worker.process.is_alive():
+                        self._replace_worker(worker)
+                        continue
+                    task_id, route = todo.pop()
+                    in_flight[task_id] = route
+                    worker.assign(task_id, route)
+
+            try:
+                worker_id, task_id, df, error = self._results.get(timeout=RESULT_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            else:
+                for worker in self._workers:
+                    if worker.id == worker_id and worker.task_id == task_id:
+                        worker.task_id = None
+                # Late results of killed workers were already reported as failed
+                route = in_flight.pop(task_id, None)
+                if route is not None:
+                    if error is not None:
+                        logger.error(f"Route {route.get('origin')} -> {route.get('dest')} failed: {error}")
+                    yield route, df
+
+            now = time.monotonic()
+            for worker in list(self._workers):
+                if worker.task_id is None:
+                    continue
+
+                if now - worker.started_at > self.route_timeout:
+                    reason = f"timed out after {self.route_timeout}s"
+                elif not worker.process.is_alive():
+                    reason = f"worker died (exit code {worker.process.exitcode})"
+                else:
+                    continue
+
+                route = in_flight.pop(worker.task_id)
+                logger.error(f"Route {route.get('origin')} -> {route.get('dest')} {reason}, replacing worker.")
+                self._replace_worker(worker)
+                yield route, None
+
+    def shutdown(self) -> None:
+        """Stops all workers, killing those that do not exit in time."""
+        for worker in self._workers:
+            worker.stop()
+        for worker in self._workers:
+            worker.process.join(timeout=30)
+            if worker.process.is_alive():
+                worker.kill()
+        self._workers.clear()
@@ -0,0 +1,128 @@
+"""
+Priority of the routes within a run, so a run that runs out of time drops
+the least valuable routes instead of whatever is last in searches.json.
+
+    score = weight * (staleness + VOLATILITY_WEIGHT * volatility)
+
+staleness   days since the route's last successful scrape (scrape_runs),
+            capped at MAX_STALENESS_DAYS, never scraped routes get the cap
+volatility  coefficient of variation of the route's cheapest price over the
+            last VOLATILITY_WINDOW_DAYS scrape days (daily_route_min)
+weight      "weight" of the search in searches.json, 1 by default
+
+Routes deferred by the previous run go first, whatever their score.
+"""
+from __future__ import annotations
+import math
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from db import RegisteredSearch, get_engine
+from job_queue import deferred_search_ids
+
+
+MAX_STALENESS_DAYS = 30
+VOLATILITY_WINDOW_DAYS = 14
+# A route whose cheapest price moves by 10% counts like one more day stale
+VOLATILITY_WEIGHT = 10.0
+DEFAULT_WEIGHT = 1.0
+
+# Scores are stored as integer job priorities with three decimals,
+# deferred routes are lifted above every regular score
+PRIORITY_SCALE = 1000
+DEFERRED_PRIORITY = 10 ** 9
+
+
+class RouteScore(NamedTuple):
+    search: RegisteredSearch
+    score: float
+    staleness: float
+    volatility: float
+    weight: float
+    deferred: bool
+
+    @property
+    def priority(self) -> int:
+        """Priority of the route's job, see job_queue.claim_jobs."""
+        return round(self.score * PRIORITY_SCALE) + (DEFERRED_PRIORITY if self.deferred else 0)
+
+
+def parse_weight(value) -> float:
+    """
+    :param value: "weight" of a search in searches.json, None for the default
+    :rtype: float
+    """
+    if value is None:
+        return DEFAULT_WEIGHT
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid weight '{value}', use a positive number")
+    if not weight > 0 or math.isinf(weight):
+        raise ValueError(f"Weight must be a positive number, got {value}")
+    return weight
+
+
+def score_routes(
+        searches: Iterable[RegisteredSearch],
+        weights: Optional[Dict[int, float]] = None,
+        run_date: Optional[date] = None,
+        engine: Optional[Engine] = None,
+        ) -> List[RouteScore]:
+    """
+    Scores the routes of a run.
+
+    :param weights: weight per search_id, DEFAULT_WEIGHT for missing ones
+    :param run_date: day of the run, staleness is counted up to it
+    :return: the routes, most valuable first
+    :rtype: List[RouteScore]
+    """
+    engine = engine or get_engine()
+    run_date = run_date or date.today()
+    weights = weights or {}
+    window_start = run_date - timedelta(days=VOLATILITY_WINDOW_DAYS)
+
+    with engine.connect() as conn:
+        last_scraped = dict(conn.execute(
+            text("SELECT search_id, MAX(scraped_at) FROM scrape_runs WHERE scraped_at < :d GROUP BY search_id"),
+            {"d": run_date.isoformat()},
+        ).all())
+        # Variance as E[x^2] - E[x]^2, SQLite has no STDDEV
+        moments = {
+            row.search_id: row for row in conn.execute(
+                text(
+                    "SELECT search_id, AVG(price) AS mean, AVG(price * price) AS mean_sq "
+                    "FROM daily_route_min WHERE scraped_at >= :start AND scraped_at < :d "
+                    "GROUP BY search_id"
+                ),
+                {"start": window_start.isoformat(), "d": run_date.isoformat()},
+            )
+        }
+    deferred = deferred_search_ids(run_date, engine=engine)
+
+    scores = []
+    for search in searches:
+        staleness = float(MAX_STALENESS_DAYS)
+        if search.id in last_scraped:
+            days = (run_date - date.fromisoformat(str(last_scraped[search.id])[:10])).days
+            staleness = float(min(days, MAX_STALENESS_DAYS))
+
+        volatility = 0.0
+        row = moments.get(search.id)
+        if row is not None and row.mean:
+            volatility = math.sqrt(max(row.mean_sq - row.mean ** 2, 0.0)) / row.mean
+
+        weight = weights.get(search.id, DEFAULT_WEIGHT)
+        scores.append(RouteScore(
+            search=search,
+            score=weight * (staleness + VOLATILITY_WEIGHT * volatility),
+            staleness=staleness,
+            volatility=volatility,
+            weight=weight,
+            deferred=search.id in deferred,
+        ))
+
+    return sorted(scores, key=lambda s: (-s.priority, s.search.id))
@@ -0,0 +1,237 @@
+"""
+Per-route scheduling: every search runs on its own cadence instead of all
+routes firing in one burst.
+
+Routes with the same cadence get evenly spaced slots (31 daily routes run
+every ~46 minutes around the clock), each run is shifted by a little random
+jitter, and at most `max_concurrency` routes are scraped at the same time.
+The next run of every route is kept in the route_schedule table, so a
+restart continues the plan instead of starting every route at once, and a
+long downtime causes a single catch-up run per route, not one per missed slot.
+"""
+import time
+import random
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from db import RegisteredSearch, RouteSchedule, get_engine
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+# Named cadences of searches.json, numbers are read as hours
+CADENCES = {
+    "hourly": 3600,
+    "daily": 86400,
+    "weekly": 604800,
+}
+DEFAULT_CADENCE = "daily"
+
+DEFAULT_MAX_CONCURRENCY = 1
+# Random shift of each run, as a fraction of the spacing between two routes
+# of the same cadence and capped in seconds
+JITTER_FRACTION = 0.1
+MAX_JITTER = 600
+
+# Slots are counted from a Monday midnight (local time), so daily slots
+# repeat at the same time of day and weekly ones on the same weekday
+SLOT_ANCHOR = datetime(2024, 1, 1)
+
+
+def parse_cadence(value) -> int:
+    """
+    :param value: "hourly", "daily", "weekly" or a number of hours
+    :return: cadence in seconds
+    :rtype: int
+    """
+    if value is None:
+        value = DEFAULT_CADENCE
+    if isinstance(value, str) and value in CADENCES:
+        return CADENCES[value]
+
+    try:
+        hours = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Unknown cadence '{value}', use one of {list(CADENCES)} or a number of hours")
+    if hours <= 0:
+        raise ValueError(f"Cadence must be positive, got {value}")
+    return int(hours * 3600)
+
+
+def next_slot(after: datetime, cadence: int, offset: float) -> datetime:
+    """First slot of a route strictly after `after`."""
+    elapsed = (after - SLOT_ANCHOR).total_seconds() - offset
+    k = int(elapsed // cadence) + 1
+    return SLOT_ANCHOR + timedelta(seconds=k * cadence + offset)
+
+
+class RouteScheduler:
+    """
+    Runs `run_route(search)` for every route whenever it is due.
+
+    Call `sync` with the configured routes and their cadences (again whenever
+    searches.json changes) and `run_pending` regularly, e.g. every 30 seconds.
+    Routes run in a thread pool of `max_concurrency` threads.
+
+    Usage:
+        with RouteScheduler(scrape_route, max_concurrency=1) as scheduler:
+            scheduler.sync(search_registry.schedule())
+            while True:
+                scheduler.run_pending()
+                time.sleep(30)
+    """
+
+    def __init__(
+            self,
+            run_route: Callable[[RegisteredSearch], None],
+            engine: Optional[Engine] = None,
+            max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+            jitter_fraction: float = JITTER_FRACTION,
+            max_jitter: float = MAX_JITTER,
+            rng: Optional[random.Random] = None,
+            ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.run_route = run_route
+        self.engine = engine or get_engine()
+        self.max_concurrency = max_concurrency
+        self.jitter_fraction = jitter_fraction
+        self.max_jitter = max_jitter
+        self._rng = rng or random.Random()
+        # search_id -> (search, cadence in seconds, slot offset, max jitter)
+        self._routes: Dict[int, Tuple[RegisteredSearch, int, float, float]] = {}
+        self._running: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="route")
+
+    def __enter__(self) -> "RouteScheduler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _planned(self, search_id: int, after: datetime) -> datetime:
+        _, cadence, offset, jitter = self._routes[search_id]
+        # Past `after + jitter`, so a negative shift never lands before `after`
+        slot = next_slot(after + timedelta(seconds=jitter), cadence, offset)
+        return slot + timedelta(seconds=self._rng.uniform(-jitter, jitter))
+
+    def sync(self, routes: List[Tuple[RegisteredSearch, int]], now: Optional[datetime] = None) -> None:
+        """
+        Takes over the configured routes and plans the ones without a schedule.
+
+        Routes with the same cadence are spread evenly over it. Routes that are
+        new or whose cadence changed get their next slot; all others keep the
+        next run stored in the database.
+
+        :param routes: (search, cadence in seconds) per configured route
+        """
+        now = now or datetime.now()
+
+        by_cadence: Dict[int, List[RegisteredSearch]] = {}
+        for search, cadence in routes:
+            by_cadence.setdefault(cadence, []).append(search)
+
+        planned: Dict[int, Tuple[RegisteredSearch, int, float, float]] = {}
+        for cadence, searches in by_cadence.items():
+            spacing = cadence / len(searches)
+            jitter = min(self.max_jitter, self.jitter_fraction * spacing)
+            for i, search in enumerate(sorted(searches, key=lambda s: s.id)):
+                planned[search.id] = (search, cadence, i * spacing, jitter)
+
+        table = RouteSchedule.__table__
+        with self.engine.begin() as conn:
+            stored = {
+                row.search_id: row.cadence_seconds
+                for row in conn.execute(select(table.c.search_id, table.c.cadence_seconds))
+            }
+            with self._lock:
+                self._routes = planned
+
+            changed = [search_id for search_id, route in planned.items() if stored.get(search_id) != route[1]]
+            for search_id in changed:
+                stmt = sqlite_insert(table).values(
+                    search_id=search_id, cadence_seconds=planned[search_id][1], next_run_at=self._planned(search_id, now),
+                )
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=[table.c.search_id],
+                    set_={"cadence_seconds": stmt.excluded.cadence_seconds, "next_run_at": stmt.excluded.next_run_at},
+                ))
+
+        if changed:
+            logger.info(f"Scheduled {len(changed)} new or changed routes, {len(planned)} routes in total.")
+
+    def run_pending(self, now: Optional[datetime] = None) -> int:
+        """
+        Starts the due routes, as many as the concurrency cap allows.
+
+        :return: number of routes started
+        :rtype: int
+        """
+        now = now or datetime.now()
+
+        with self._lock:
+            for search_id, future in list(self._running.items()):
+                if future.done():
+                    del self._running[search_id]
+            free = self.max_concurrency - len(self._running)
+            if free <= 0:
+                return 0
+
+            table = RouteSchedule.__table__
+            with self.engine.connect() as conn:
+                due = conn.execute(
+                    select(table.c.search_id)
+                    .where(table.c.next_run_at <= now)
+                    .order_by(table.c.next_run_at)
+                ).scalars().all()
+
+            started = 0
+            for search_id in due:
+                if started >= free:
+                    break
+                if search_id not in self._routes or search_id in self._running:
+                    continue
+                search = self._routes[search_id][0]
+                self._running[search_id] = self._executor.submit(self._run, search)
+                started += 1
+
+        return started
+
+    def _run(self, search: RegisteredSearch) -> None:
+        started = datetime.now()
+        begin = time.perf_counter()
+        try:
+            self.run_route(search)
+            logger.info(f"Scheduled run of {search.origin} -> {search.destination} took {time.perf_counter() - begin:.0f}s.")
+        except Exception as e:
+            logger.error(f"Scheduled run of {search.origin} -> {search.destination} failed: {e}")
+        finally:
+            self._reschedule(search.id, started)
+
+    def _reschedule(self, search_id: int, started: datetime) -> None:
+        with self._lock:
+            if search_id not in self._routes:
+                return
+            # Counted from the end of the run: one catch-up after a downtime, never a backlog
+            next_run = self._planned(search_id, datetime.now())
+
+        table = RouteSchedule.__table__
+        with self.engine.begin() as conn:
+            conn.execute(
+                table.update()
+                .where(table.c.search_id == search_id)
+                .values(last_run_at=started, next_run_at=next_run)
+            )
+
+    def close(self, wait: bool = True) -> None:
+        """Stops scheduling, by default after the running routes finished."""
+        self._executor.shutdown(wait=wait)
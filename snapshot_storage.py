@@ -0,0 +1,127 @@
+from __future__ import annotations
+import logging
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# numpy and pandas are imported where they are used, so the writer
+# (ingestion.py) does not load them in the other storage modes
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+# Little-endian int32
+PRICE_DTYPE = "<i4"
+# Calendar cell without a price
+NULL_PRICE = -1
+# Departure date that was not in the scraped calendar at all (the int32 minimum)
+MISSING_PRICE = -2 ** 31
+
+
+def pack_prices(rows: List[Dict]) -> Tuple[date, bytes]:
+    """
+    Packs the rows of one scrape into a start date and an int32 price array.
+
+    :param rows: dicts with departure_date (date) and price (int or None)
+    :return: (first departure date, array bytes)
+    """
+    import numpy as np
+
+    start = min(row["departure_date"] for row in rows)
+    end = max(row["departure_date"] for row in rows)
+    prices = np.full((end - start).days + 1, MISSING_PRICE, dtype=PRICE_DTYPE)
+    for row in rows:
+        price = row["price"]
+        prices[(row["departure_date"] - start).days] = NULL_PRICE if price is None else price
+    return start, prices.tobytes()
+
+
+def unpack_prices(blob: bytes) -> np.ndarray:
+    """Zero-copy, read-only int32 view of a packed price array."""
+    import numpy as np
+
+    return np.frombuffer(blob, dtype=PRICE_DTYPE)
+
+
+def write_snapshot(
+        conn: Connection,
+        search_id: int,
+        scraped_at: date,
+        rows: List[Dict],
+        replace: bool = True,
+        ) -> None:
+    """Stores one scrape of a route as a single price_snapshots row."""
+    start, blob = pack_prices(rows)
+    conflict = "DO UPDATE SET start_date = excluded.start_date, prices = excluded.prices" if replace else "DO NOTHING"
+    conn.execute(
+        text(
+            "INSERT INTO price_snapshots (search_id, scraped_at, start_date, prices) "
+            f"VALUES (:s, :day, :start, :prices) ON CONFLICT (search_id, scraped_at) {conflict}"
+        ),
+        {"s": search_id, "day": scraped_at.isoformat(), "start": start.isoformat(), "prices": blob},
+    )
+
+
+def load_snapshot(engine: Engine, search_id: int, scraped_at: date) -> Optional[Tuple[date, np.ndarray]]:
+    """
+    Reads the prices of one scrape.
+
+    :return: (start date, int32 array) or None if the route was not scraped
+        that day. Index i is the price for start date + i days, NULL_PRICE
+        for cells without price and MISSING_PRICE for dates not scraped.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT start_date, prices FROM price_snapshots WHERE search_id = :s AND scraped_at = :day"),
+            {"s": search_id, "day": scraped_at.isoformat()},
+        ).first()
+    if row is None:
+        return None
+    return date.fromisoformat(row[0]), unpack_prices(row[1])
+
+
+def load_snapshots(
+        engine: Engine,
+        search_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        ) -> List[Tuple[date, date, np.ndarray]]:
+    """
+    Reads all scrapes of a route, optionally limited to a scrape day range.
+
+    :return: list of (scraped_at, start date, int32 array), oldest first
+    """
+    sql = "SELECT scraped_at, start_date, prices FROM price_snapshots WHERE search_id = :s"
+    params = {"s": search_id}
+    if start is not None:
+        sql += " AND scraped_at >= :start"
+        params["start"] = start.isoformat()
+    if end is not None:
+        sql += " AND scraped_at <= :end"
+        params["end"] = end.isoformat()
+    sql += " ORDER BY scraped_at"
+
+    with engine.connect() as conn:
+        return [
+            (date.fromisoformat(scraped_at), date.fromisoformat(start_date), unpack_prices(blob))
+            for scraped_at, start_date, blob in conn.execute(text(sql), params)
+        ]
+
+
+def snapshot_to_frame(start: date, prices: np.ndarray) -> pd.DataFrame:
+    """Turns a packed snapshot back into the departure_date/price frame of the scraper."""
+    import numpy as np
+    import pandas as pd
+
+    offsets = np.flatnonzero(prices != MISSING_PRICE)
+    values = prices[offsets].astype("float64")
+    values[values == NULL_PRICE] = np.nan
+    return pd.DataFrame({
+        "departure_date": [(start + timedelta(days=int(i))).isoformat() for i in offsets],
+        "price": values,
+    })
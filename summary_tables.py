@@ -0,0 +1,192 @@
+"""
+Summary tables kept up to date by the ingestion code:
+
+    latest_price      current price of every route and departure date
+    daily_route_min   cheapest departure of every route and scrape day
+
+Both are refreshed per scrape in the writer's transaction, so dashboards
+and alerts read O(routes x dates) rows instead of scanning the history.
+"""
+from __future__ import annotations
+import logging
+from datetime import date
+from typing import TYPE_CHECKING, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from db import get_engine
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger("FlightPriceTracker")
+
+# Daily rows the summaries are computed from, per ingestion storage mode.
+# Packed snapshots have no SQL representation and are not summarised.
+SUMMARY_SOURCES = {
+    "append": "price_time_series",
+    "both": "price_time_series",
+    "change_only": "price_history_daily",
+}
+
+
+def refresh_summaries(conn: Connection, source: str, search_id: int, scraped_at: date) -> None:
+    """
+    Updates latest_price and daily_route_min after one scrape of a route was stored.
+
+    Must run in the transaction that stored the scrape. Works for re-runs of
+    the same day and for scrapes arriving out of order.
+
+    :param source: table or view with the daily rows, see SUMMARY_SOURCES
+    """
+    params = {"s": search_id, "day": scraped_at.isoformat()}
+
+    conn.execute(text("DELETE FROM daily_route_min WHERE search_id = :s AND scraped_at = :day"), params)
+    conn.execute(
+        text(
+            "INSERT INTO daily_route_min (search_id, scraped_at, departure_date, price) "
+            f"SELECT search_id, scraped_at, departure_date, price FROM {source} "
+            "WHERE search_id = :s AND scraped_at = :day AND price IS NOT NULL "
+            "ORDER BY price, departure_date LIMIT 1"
+        ),
+        params,
+    )
+
+    # A re-run of the day may no longer contain some departure dates
+    dropped = conn.execute(
+        text(
+            "DELETE FROM latest_price WHERE search_id = :s AND scraped_at = :day AND departure_date NOT IN ("
+            f"  SELECT departure_date FROM {source} WHERE search_id = :s AND scraped_at = :day) "
+            "RETURNING departure_date"
+        ),
+        params,
+    ).scalars().all()
+
+    conn.execute(
+        text(
+            "INSERT INTO latest_price (search_id, departure_date, price, scraped_at) "
+            f"SELECT search_id, departure_date, price, scraped_at FROM {source} "
+            "WHERE search_id = :s AND scraped_at = :day "
+            "ON CONFLICT (search_id, departure_date) DO UPDATE SET "
+            "price = excluded.price, scraped_at = excluded.scraped_at "
+            "WHERE excluded.scraped_at >= latest_price.scraped_at"
+        ),
+        params,
+    )
+
+    if dropped:
+        # Fall back to their newest earlier scrape (SQLite takes price from the MAX row)
+        conn.execute(
+            text(
+                "INSERT INTO latest_price (search_id, departure_date, price, scraped_at) "
+                f"SELECT search_id, departure_date, price, MAX(scraped_at) FROM {source} "
+                "WHERE search_id = :s AND departure_date = :d GROUP BY search_id, departure_date"
+            ),
+            [{"s": search_id, "d": departure_date} for departure_date in dropped],
+        )
+
+
+# Summary table -> key columns, value columns
+SUMMARY_TABLES = {
+    "latest_price": ("search_id, departure_date", "price, scraped_at"),
+    "daily_route_min": ("search_id, scraped_at", "departure_date, price"),
+}
+
+
+def _recomputed(table: str, source: str) -> str:
+    if table == "latest_price":
+        # SQLite takes the price from the row with the MAX(scraped_at)
+        return (
+            "SELECT search_id, departure_date, price, MAX(scraped_at) AS scraped_at "
+            f"FROM {source} GROUP BY search_id, departure_date"
+        )
+    return (
+        "SELECT search_id, scraped_at, departure_date, price FROM ("
+        "  SELECT search_id, scraped_at, departure_date, price, ROW_NUMBER() OVER ("
+        "    PARTITION BY search_id, scraped_at ORDER BY price, departure_date) AS cheapest "
+        f"  FROM {source} WHERE price IS NOT NULL"
+        ") WHERE cheapest = 1"
+    )
+
+
+def _covered(table: str, source: str) -> str:
+    # Only scrape days still in the source can be recomputed,
+    # retention may have removed the older raw rows
+    return (
+        f"{table}.scraped_at >= (SELECT MIN(scraped_at) FROM {source} src WHERE src.search_id = {table}.search_id)"
+    )
+
+
+def verify_summaries(engine: Optional[Engine] = None, source: str = "price_time_series") -> Dict[str, int]:
+    """
+    Recomputes both summary tables from scratch and compares them with the stored ones.
+
+    :return: number of rows missing from / extra in each summary table
+        ("<table>_missing", "<table>_extra")
+    :rtype: Dict[str, int]
+    """
+    engine = engine or get_engine()
+    report = {}
+    with engine.connect() as conn:
+        for table, (keys, values) in SUMMARY_TABLES.items():
+            expected = _recomputed(table, source)
+            stored = f"SELECT {keys}, {values} FROM {table} WHERE {_covered(table, source)}"
+            report[f"{table}_missing"] = conn.execute(
+                text(f"SELECT COUNT(*) FROM ({expected} EXCEPT {stored})")
+            ).scalar()
+            report[f"{table}_extra"] = conn.execute(
+                text(f"SELECT COUNT(*) FROM ({stored} EXCEPT {expected})")
+            ).scalar()
+
+    logger.info(", ".join(f"{count} {name.replace('_', ' ')}" for name, count in report.items()) + ".")
+    return report
+
+
+def rebuild_summaries(engine: Optional[Engine] = None, source: str = "price_time_series") -> None:
+    """Recomputes both summary tables from `source`, e.g. after upgrading an existing database."""
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        for table, (keys, values) in SUMMARY_TABLES.items():
+            conn.execute(text(f"DELETE FROM {table} WHERE {_covered(table, source)}"))
+            conn.execute(text(f"INSERT OR REPLACE INTO {table} ({keys}, {values}) {_recomputed(table, source)}"))
+            logger.info(f"Rebuilt {table}.")
+
+
+def load_latest_prices(engine: Optional[Engine] = None, search_id: Optional[int] = None) -> pd.DataFrame:
+    """
+    :return: DataFrame with search_id, departure_date, price, scraped_at of
+        the current price per route and departure date
+    """
+    import pandas as pd
+
+    engine = engine or get_engine()
+    sql = "SELECT search_id, departure_date, price, scraped_at FROM latest_price"
+    params = {}
+    if search_id is not None:
+        sql += " WHERE search_id = :s"
+        params["s"] = search_id
+    sql += " ORDER BY search_id, departure_date"
+
+    with engine.connect() as conn:
+        return pd.read_sql(text(sql), conn, params=params)
+
+
+def load_daily_route_min(engine: Optional[Engine] = None, search_id: Optional[int] = None) -> pd.DataFrame:
+    """
+    :return: DataFrame with search_id, scraped_at, departure_date, price of
+        the cheapest departure per route and scrape day
+    """
+    import pandas as pd
+
+    engine = engine or get_engine()
+    sql = "SELECT search_id, scraped_at, departure_date, price FROM daily_route_min"
+    params = {}
+    if search_id is not None:
+        sql += " WHERE search_id = :s"
+        params["s"] = search_id
+    sql += " ORDER BY search_id, scraped_at"
+
+    with engine.connect() as conn:
+        return pd.read_sql(text(sql), conn, params=params)
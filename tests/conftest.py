@@ -0,0 +1,21 @@
+import pytest
+
+from db import create_db_engine, init_schema
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Engine of an empty database with the current schema in a temporary file."""
+    db_engine = create_db_engine(str(tmp_path / "prices.db"))
+    init_schema(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def search_id(engine):
+    """ID of one registered search."""
+    from db import register_searches
+
+    searches = register_searches(engine, [{"origin": "Vienna", "destination": "Agadir", "distance": 2960}])
+    return next(iter(searches.values())).id
@@ -0,0 +1,78 @@
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+pytest.importorskip("pyarrow")
+
+from archive import COMPACTED_FILE, compact_archive, export_prices, read_archive
+from ingestion import PriceWriter
+
+
+def scrape(prices, scraped_at):
+    return pd.DataFrame({
+        "departure_date": [f"2026-11-{day:02d}" for day in range(1, len(prices) + 1)],
+        "price": prices,
+        "scraped_at": scraped_at,
+    })
+
+
+def write(engine, search_id, *scrapes):
+    with PriceWriter(engine, flush_interval=0.05) as writer:
+        for prices, scraped_at in scrapes:
+            writer.submit(scrape(prices, scraped_at), search_id)
+
+
+def watermark(engine, search_id):
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT exported_through FROM archive_state WHERE search_id = :s"), {"s": search_id}
+        ).scalar()
+
+
+def partition_files(archive_dir, month, search_id):
+    return sorted(os.listdir(archive_dir / f"month={month}" / f"search_id={search_id}"))
+
+
+def test_export_moves_the_watermark_and_skips_today(engine, search_id, tmp_path):
+    archive_dir = tmp_path / "archive"
+    write(engine, search_id, ([100, None], "2026-09-30"), ([110, 120], "2026-10-01"), ([130], "2026-10-02"))
+
+    # 2026-10-02 is still being scraped
+    assert export_prices(engine, str(archive_dir), until=date(2026, 10, 2)) == 4
+    assert watermark(engine, search_id) == "2026-10-01"
+    assert export_prices(engine, str(archive_dir), until=date(2026, 10, 2)) == 0
+
+    assert export_prices(engine, str(archive_dir), until=date(2026, 10, 3)) == 1
+    assert watermark(engine, search_id) == "2026-10-02"
+    assert partition_files(archive_dir, "2026-09", search_id) == ["part-2026-09-30-2026-09-30.parquet"]
+    assert len(partition_files(archive_dir, "2026-10", search_id)) == 2
+
+    archived = read_archive(str(archive_dir), search_id).sort_values(["scraped_at", "departure_date"])
+    assert len(archived) == 5
+    assert archived["price"].isna().sum() == 1
+
+
+def test_compaction_merges_the_parts_of_a_partition(engine, search_id, tmp_path):
+    archive_dir = tmp_path / "archive"
+    write(engine, search_id, ([110, 120], "2026-10-01"))
+    export_prices(engine, str(archive_dir), until=date(2026, 10, 2))
+    write(engine, search_id, ([130], "2026-10-02"))
+    export_prices(engine, str(archive_dir), until=date(2026, 10, 3))
+
+    assert compact_archive(str(archive_dir)) == 1
+    assert partition_files(archive_dir, "2026-10", search_id) == [COMPACTED_FILE]
+    assert compact_archive(str(archive_dir)) == 0
+
+    # Later exports are merged into the compacted file
+    write(engine, search_id, ([140], "2026-10-03"))
+    export_prices(engine, str(archive_dir), until=date(2026, 10, 4))
+    assert compact_archive(str(archive_dir)) == 1
+    assert partition_files(archive_dir, "2026-10", search_id) == [COMPACTED_FILE]
+
+    archived = read_archive(str(archive_dir), search_id)
+    assert list(zip(archived["scraped_at"].astype(str), archived["price"])) == [
+        ("2026-10-01", 110), ("2026-10-01", 120), ("2026-10-02", 130), ("2026-10-03", 140),
+    ]
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+from sqlalchemy import insert, text
+
+from backfill import BACKFILL_PRIORITY, find_gaps, plan_backfill
+from db import PriceTimeSeries, RegisteredSearch, migrate
+from job_queue import enqueue_jobs
+
+
+TODAY = date(2026, 10, 18)
+DAILY = 86400
+
+
+def scrape_days(first, last):
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def add_legacy_scrapes(engine, search_id, days):
+    """Prices written by a version without scrape_runs."""
+    with engine.begin() as conn:
+        conn.execute(insert(PriceTimeSeries.__table__), [
+            {"search_id": search_id, "scraped_at": day, "departure_date": date(2026, 12, 1), "price": 100}
+            for day in days
+        ])
+
+
+def routes(engine, search_id, cadence=DAILY):
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT id, origin, destination, distance FROM searches WHERE id = :s"), {"s": search_id}).one()
+    return [(RegisteredSearch(*row), cadence)]
+
+
+def test_gaps_of_an_upgraded_database(engine, search_id):
+    add_legacy_scrapes(engine, search_id, scrape_days(date(2026, 10, 1), date(2026, 10, 5)) + [date(2026, 10, 10)])
+    assert find_gaps(routes(engine, search_id), TODAY, engine=engine) == []
+
+    migrate(engine)
+    migrate(engine)     # seeding scrape_runs again changes nothing
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM scrape_runs")).scalar() == 6
+
+    gaps = [(g.first_missing, g.last_missing, g.ongoing) for g in find_gaps(routes(engine, search_id), TODAY, engine=engine)]
+    assert gaps == [
+        (date(2026, 10, 6), date(2026, 10, 9), False),
+        (date(2026, 10, 11), date(2026, 10, 17), True),
+    ]
+
+
+def test_gaps_follow_the_cadence(engine, search_id):
+    add_legacy_scrapes(engine, search_id, [date(2026, 10, 1), date(2026, 10, 8), date(2026, 10, 15)])
+    migrate(engine)
+
+    assert find_gaps(routes(engine, search_id, cadence=7 * DAILY), TODAY, engine=engine) == []
+    assert len(find_gaps(routes(engine, search_id, cadence=3 * DAILY), TODAY, engine=engine)) == 2
+
+
+def test_catch_up_job_is_todays_run_job(engine, search_id):
+    add_legacy_scrapes(engine, search_id, [date(2026, 10, 10)])
+    migrate(engine)
+
+    assert plan_backfill(routes(engine, search_id), TODAY, engine=engine).enqueued == 1
+    # Neither a second plan nor the regular run of the day add another job for the route
+    assert plan_backfill(routes(engine, search_id), TODAY, engine=engine).enqueued == 0
+    assert enqueue_jobs([search_id], TODAY, engine=engine) == 0
+
+    with engine.connect() as conn:
+        jobs = conn.execute(text("SELECT kind, priority, run_date FROM scrape_jobs")).all()
+    assert [tuple(job) for job in jobs] == [("backfill", BACKFILL_PRIORITY, TODAY.isoformat())]
+
+
+def test_dry_run_only_reports(engine, search_id):
+    add_legacy_scrapes(engine, search_id, [date(2026, 10, 10)])
+    migrate(engine)
+
+    plan = plan_backfill(routes(engine, search_id), TODAY, enqueue=False, engine=engine)
+    assert (len(plan.gaps), plan.enqueued) == (1, 0)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM scrape_jobs")).scalar() == 0
@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+from calendar_rpc import XSSI_PREFIX, is_calendar_rpc_url, parse_calendar_payload, parse_calendar_payloads
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+PICKER = (FIXTURES / "get_calendar_picker.txt").read_text(encoding="utf-8")
+GRAPH = (FIXTURES / "get_calendar_graph.txt").read_text(encoding="utf-8")
+
+
+def prices(rows):
+    return {row["departure_date"]: row["price"] for row in rows}
+
+
+def test_calendar_rpc_urls():
+    assert is_calendar_rpc_url(
+        "https://www.google.com/_/FlightsFrontendUi/data/travel.frontend.flights.FlightsFrontendService/GetCalendarPicker"
+    )
+    assert not is_calendar_rpc_url("https://www.google.com/travel/flights/search")
+
+
+def test_xssi_prefix_is_skipped():
+    assert PICKER.startswith(XSSI_PREFIX)
+    with_prefix = prices(parse_calendar_payload(PICKER))
+    without_prefix = prices(parse_calendar_payload(PICKER[len(XSSI_PREFIX):]))
+    assert with_prefix == without_prefix
+    assert with_prefix["2026-11-01"] == 129
+
+
+def test_all_chunks_are_parsed():
+    # The picker response carries its calendar in two length-prefixed chunks
+    found = prices(parse_calendar_payload(PICKER))
+    assert sorted(found) == [f"2026-11-{day:02d}" for day in range(1, 11)]
+    assert found["2026-11-04"] == 97
+    assert found["2026-11-10"] == 131
+
+
+def test_missing_price_is_none():
+    assert prices(parse_calendar_payload(PICKER))["2026-11-05"] is None
+
+
+def test_chunks_without_calendar_entries_are_ignored():
+    body = XSSI_PREFIX + "\n\n" + json.dumps([["wrb.fr", "M0fBDe", "not json", None], ["di", 12]]) + "\n25\n[[\"e\",4]]"
+    assert parse_calendar_payload(body) == []
+
+
+def test_later_overlapping_response_wins_unless_it_has_no_price():
+    df = parse_calendar_payloads([PICKER, GRAPH])
+    merged = dict(zip(df["departure_date"], df["price"]))
+
+    assert list(df["departure_date"]) == sorted(merged)
+    assert len(df) == 12
+    # Newer price from the graph
+    assert merged["2026-11-08"] == 111
+    # The graph has no price for the 9th, the picker's is kept
+    assert merged["2026-11-09"] == 99
+    # The graph fills in the price the picker was missing
+    assert merged["2026-11-05"] == 121
+    # Dates only in the graph are added
+    assert merged["2026-11-12"] == 92
+
+
+def test_no_responses_give_an_empty_frame():
+    df = parse_calendar_payloads([])
+    assert df.empty
+    assert list(df.columns) == ["departure_date", "price"]
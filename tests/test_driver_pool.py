@@ -0,0 +1,51 @@
+import driver_pool
+from driver_pool import DriverPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+
+    def execute_script(self, script):
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_idle_browsers_are_quit_and_restarted_on_demand(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(driver_pool.time, "monotonic", lambda: clock[0])
+    started = []
+
+    def factory():
+        started.append(FakeDriver())
+        return started[-1]
+
+    with DriverPool(size=2, factory=factory, max_rss_mb=None, max_idle_seconds=600) as pool:
+        with pool.driver() as first, pool.driver():
+            pass
+        clock[0] += 300
+        with pool.driver() as reused:
+            assert reused is first
+        assert pool.reap_idle() == 0
+
+        # Only the browser unused for more than 10 minutes is quit
+        clock[0] += 400
+        assert pool.reap_idle() == 1
+        assert [driver.quit_called for driver in started] == [False, True]
+
+        with pool.driver() as driver:
+            assert driver is first
+        clock[0] += 700
+        assert pool.reap_idle() == 1
+        with pool.driver() as driver:
+            assert driver is started[2]
+    assert len(started) == 3
+
+
+def test_without_idle_timeout_nothing_is_reaped():
+    with DriverPool(factory=FakeDriver, max_rss_mb=None) as pool:
+        with pool.driver():
+            pass
+        assert pool.reap_idle() == 0
@@ -0,0 +1,229 @@
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+from coordinator import Coordinator, CoordinatorServer
+from db import register_searches
+from ingestion import PriceWriter
+from job_queue import MAX_ATTEMPTS, enqueue_jobs, queue_counts
+
+
+REPO = Path(__file__).parent.parent
+TOKEN = "fleet-secret"
+
+# Worker node with a fake scrape: prints the id of every job it starts,
+# raises for "Nowhere" and never returns for the destination in `hang`
+WORKER = """
+import json, sys, time
+import pandas as pd
+from fleet_worker import CoordinatorClient, FleetWorker
+
+url, name, options = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+
+def scrape(job):
+    print(job["id"], flush=True)
+    if job["destination"] == options.get("hang"):
+        time.sleep(3600)
+    if job["destination"] == "Nowhere":
+        raise RuntimeError("no such route")
+    time.sleep(options.get("delay", 0.05))
+    return pd.DataFrame({
+        "departure_date": ["2026-11-01", "2026-11-02"], "price": [100, 110], "scraped_at": "2026-10-18",
+    })
+
+FleetWorker(
+    CoordinatorClient(url, name, token=options.get("token")),
+    scrape,
+    concurrency=options.get("concurrency", 1),
+    prefetch=options.get("prefetch"),
+    heartbeat_interval=0.2,
+    result_interval=0.1,
+    poll_interval=0.1,
+    exit_when_idle=True,
+).run()
+"""
+
+
+class RecordingCoordinator(Coordinator):
+    """Counts the results every job got."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reported = Counter()
+
+    def results(self, worker, results):
+        self.reported.update(result["job_id"] for result in results)
+        return super().results(worker, results)
+
+
+@pytest.fixture
+def fleet(engine):
+    """Starts a coordinator for `destinations` on a free port, returns the coordinator, its URL and the job ids."""
+    servers = []
+
+    def start(destinations, lease_seconds=30):
+        searches = list(register_searches(
+            engine, [{"origin": "Vienna", "destination": d, "distance": 1000} for d in destinations],
+        ).values())
+        enqueue_jobs([s.id for s in searches], date.today(), engine=engine)
+
+        writer = PriceWriter(engine, flush_interval=0.05)
+        writer.start()
+        coordinator = RecordingCoordinator(lambda: searches, writer, engine=engine, lease_seconds=lease_seconds)
+        server = CoordinatorServer(("127.0.0.1", 0), coordinator, token=TOKEN)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, writer))
+
+        with engine.connect() as conn:
+            job_ids = {
+                destination: job_id for destination, job_id in conn.execute(text(
+                    "SELECT s.destination, j.id FROM scrape_jobs j JOIN searches s ON s.id = j.search_id"
+                ))
+            }
+        return coordinator, f"http://127.0.0.1:{server.server_address[1]}", job_ids
+
+    yield start
+
+    for server, writer in servers:
+        server.shutdown()
+        server.server_close()
+        writer.close()
+
+
+def spawn(url, name, **options):
+    options.setdefault("token", TOKEN)
+    return subprocess.Popen(
+        [sys.executable, "-c", WORKER, url, name, json.dumps(options)],
+        cwd=REPO,
+        env=dict(os.environ, PYTHONPATH=str(REPO)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+
+
+def scraped_ids(process, timeout=60):
+    """Waits for a worker to exit and returns the ids of the jobs it started."""
+    out, _ = process.communicate(timeout=timeout)
+    assert process.returncode == 0
+    return [int(line) for line in out.split()]
+
+
+def job_states(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT id, status FROM scrape_jobs")).all())
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_every_job_ends_exactly_once(engine, fleet):
+    destinations = [f"City {i}" for i in range(12)] + ["Nowhere"]
+    coordinator, url, job_ids = fleet(destinations)
+
+    workers = [spawn(url, f"pi-{i}", concurrency=2) for i in range(3)]
+    started = Counter(job_id for worker in workers for job_id in scraped_ids(worker))
+
+    states = job_states(engine)
+    failing = job_ids["Nowhere"]
+    assert states.pop(failing) == "failed"
+    assert set(states.values()) == {"done"}
+
+    # Every route was scraped and reported once, the failing one until it ran out of attempts
+    assert started.pop(failing) == coordinator.reported.pop(failing) == MAX_ATTEMPTS
+    assert set(started.values()) == set(coordinator.reported.values()) == {1}
+    assert set(started) == set(states)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM price_time_series")).scalar() == 2 * 12
+
+
+def test_idle_workers_steal_unstarted_jobs(engine, fleet):
+    coordinator, url, job_ids = fleet([f"City {i}" for i in range(6)])
+
+    # The first worker claims every job but scrapes them one by one
+    slow = spawn(url, "pi-slow", prefetch=6, delay=0.5)
+    wait_for(lambda: queue_counts(engine=engine)["queued"] == 0)
+    fast = spawn(url, "pi-fast")
+
+    slow_ids, fast_ids = scraped_ids(slow), scraped_ids(fast)
+    assert fast_ids
+    assert sorted(slow_ids + fast_ids) == sorted(job_ids.values())
+    assert set(job_states(engine).values()) == {"done"}
+    assert set(coordinator.reported.values()) == {1}
+
+
+def test_jobs_of_a_dead_worker_are_requeued_once_the_lease_expires(engine, fleet):
+    coordinator, url, job_ids = fleet(["Agadir"], lease_seconds=1)
+
+    stuck = spawn(url, "pi-stuck", hang="Agadir")
+    assert int(stuck.stdout.readline()) == job_ids["Agadir"]
+    stuck.send_signal(signal.SIGKILL)
+    stuck.wait()
+
+    assert scraped_ids(spawn(url, "pi-rescue")) == [job_ids["Agadir"]]
+    with engine.connect() as conn:
+        status, attempts = conn.execute(text("SELECT status, attempts FROM scrape_jobs")).one()
+    assert (status, attempts) == ("done", 2)
+    assert coordinator.reported == {job_ids["Agadir"]: 1}
+
+
+def test_requests_without_the_token_are_rejected(fleet):
+    _, url, _ = fleet(["Agadir"])
+
+    with pytest.raises(urllib.error.HTTPError) as rejected:
+        urllib.request.urlopen(url + "/status", timeout=5)
+    assert rejected.value.code == 401
+
+    request = urllib.request.Request(url + "/status", headers={"Authorization": f"Bearer {TOKEN}"})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        assert json.load(response)["jobs"]["queued"] == 1
+
+
+def test_results_are_only_accepted_from_the_lease_owner(engine, fleet):
+    coordinator, _, job_ids = fleet(["Agadir", "Porto"])
+    [job] = coordinator.claim("pi-1")["jobs"]
+    with engine.connect() as conn:
+        other = conn.execute(text("SELECT id FROM searches WHERE id != :s"), {"s": job["search_id"]}).scalar()
+    prices = [{"departure_date": "2026-11-01", "price": 100, "scraped_at": "2026-10-18"}]
+
+    # Another worker, a job that was never claimed and another route's ID are all rejected
+    assert coordinator.results("pi-2", [{"job_id": job["id"], "search_id": job["search_id"], "prices": prices}]) == {"accepted": 0}
+    unclaimed = next(job_id for job_id in job_ids.values() if job_id != job["id"])
+    assert coordinator.results("pi-1", [{"job_id": unclaimed, "search_id": other, "prices": prices}]) == {"accepted": 0}
+    assert coordinator.results("pi-1", [{"job_id": job["id"], "search_id": other, "prices": prices}]) == {"accepted": 0}
+
+    assert coordinator.results("pi-1", [{"job_id": job["id"], "search_id": job["search_id"], "prices": prices}]) == {"accepted": 1}
+    wait_for(lambda: job_states(engine)[job["id"]] == "done")
+    assert job_states(engine)[unclaimed] == "queued"
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT search_id FROM price_time_series")).scalars().all() == [job["search_id"]]
+
+
+def test_malformed_content_length_is_a_bad_request(fleet):
+    _, url, _ = fleet(["Agadir"])
+    host, port = url.removeprefix("http://").split(":")
+
+    connection = http.client.HTTPConnection(host, int(port), timeout=5)
+    connection.putrequest("POST", "/claim")
+    connection.putheader("Authorization", f"Bearer {TOKEN}")
+    connection.putheader("Content-Length", "many")
+    connection.endheaders()
+    assert connection.getresponse().status == 400
+    connection.close()
@@ -0,0 +1,144 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pytest
+
+import web_scraper
+from http_scraper import CALENDAR_RPC_PATH, HttpCalendarClient, parse_session_params
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+PAGE = (FIXTURES / "flights_page.html").read_text(encoding="utf-8")
+PICKER = (FIXTURES / "get_calendar_picker.txt").read_text(encoding="utf-8")
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answers the flights page and the calendar RPC with the recorded bodies."""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _reply(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, None))
+        self._reply(200, PAGE)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        self.server.requests.append(("POST", self.path, body))
+        form = parse_qs(body)
+        origin = json.loads(json.loads(form["f.req"][0])[1])[1][13][0][0][0][0][0]
+        if origin == "Nowhere":
+            self._reply(500, "")
+        elif origin == "Empty":
+            self._reply(200, ")]}'\n")
+        else:
+            self._reply(200, PICKER)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ReplayHandler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.connections = 0
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_session_params_are_read_from_the_page():
+    assert parse_session_params(PAGE) == {
+        "f.sid": "-2907613383398743951",
+        "bl": "boq_travel-frontend-flights-ui_20261012.02_p0",
+        "at": "AKlEn5h2Qx8Vf3=:1760774400000",
+    }
+
+
+def test_fetch_calendar_replays_the_recorded_response(server):
+    with HttpCalendarClient(base_url=base_url(server)) as client:
+        df = client.fetch_calendar("Vienna", "Agadir", "2026-11-01")
+
+    assert len(df) == 10
+    assert df.loc[df["departure_date"] == "2026-11-04", "price"].item() == 97
+
+    (_, page, _), (method, path, body) = server.requests
+    assert page == "/travel/flights?hl=en"
+    assert method == "POST"
+    url = urlsplit(path)
+    query = parse_qs(url.query)
+    assert url.path == CALENDAR_RPC_PATH
+    assert query["f.sid"] == ["-2907613383398743951"]
+    assert query["bl"] == ["boq_travel-frontend-flights-ui_20261012.02_p0"]
+    assert query["rt"] == ["c"] and "_reqid" in query
+
+    form = parse_qs(body)
+    assert form["at"] == ["AKlEn5h2Qx8Vf3=:1760774400000"]
+    inner = json.loads(json.loads(form["f.req"][0])[1])
+    leg = inner[1][13][0]
+    assert leg[0][0][0][0] == "Vienna" and leg[1][0][0][0] == "Agadir"
+    assert inner[2] == ["2026-11-01", "2027-11-01"]
+
+
+def test_fetch_many_reuses_one_connection_per_worker(server):
+    routes = [("Vienna", f"City {i}", "2026-11-01") for i in range(8)] + [("Nowhere", "Agadir", "2026-11-01")]
+    with HttpCalendarClient(base_url=base_url(server), max_workers=2) as client:
+        first = client.fetch_many(routes)
+        second = client.fetch_many(routes[:4])
+
+    assert set(first) == set(routes)
+    assert all(len(first[route]) == 10 for route in routes[:-1])
+    # A failing route does not fail the others
+    assert first[routes[-1]] is None
+    assert all(len(df) == 10 for df in second.values())
+
+    # One page load and 13 calendar requests over keep-alive connections
+    assert len(server.requests) == 14
+    assert [method for method, _, _ in server.requests].count("GET") == 1
+    # The 500 does not close the connection, every worker thread keeps its own
+    assert server.connections <= 2
+
+
+def test_selenium_is_the_fallback_of_the_http_backend(server, monkeypatch):
+    scraped = []
+
+    def scrape_google_flights(url, driver=None, extraction=None, metrics=None):
+        scraped.append(url)
+        return pd.DataFrame({"departure_date": ["2026-11-01"], "price": [150]})
+
+    monkeypatch.setattr(web_scraper, "scrape_google_flights", scrape_google_flights)
+
+    with HttpCalendarClient(base_url=base_url(server)) as client:
+        df = web_scraper.get_flight_route_data("Vienna", "Agadir", "2026-11-01", backend="http", http_client=client)
+        assert len(df) == 10 and "scraped_at" in df
+        assert scraped == []
+
+        # No prices and a failed request both fall back to the browser
+        for origin in ("Empty", "Nowhere"):
+            df = web_scraper.get_flight_route_data(origin, "Agadir", "2026-11-01", backend="http", http_client=client)
+            assert df["price"].tolist() == [150] and "scraped_at" in df
+
+    assert len(scraped) == 2
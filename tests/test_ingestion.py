@@ -0,0 +1,155 @@
+from datetime import date
+from time import sleep
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import ingestion
+
+from db import create_db_engine, init_schema
+from ingestion import PriceWriter
+
+
+def scrape(prices, scraped_at="2026-10-01"):
+    return pd.DataFrame({
+        "departure_date": [f"2026-11-{day:02d}" for day in range(1, len(prices) + 1)],
+        "price": prices,
+        "scraped_at": scraped_at,
+    })
+
+
+def test_upgrade_with_duplicate_rows_keeps_writing(tmp_path):
+    # A database of a version without the natural key, holding one duplicate pair
+    path = str(tmp_path / "old.db")
+    old = create_db_engine(path)
+    with old.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE searches (id INTEGER PRIMARY KEY, origin VARCHAR(100) NOT NULL, "
+            "destination VARCHAR(100) NOT NULL, distance INTEGER NOT NULL, created_at DATE, "
+            "CONSTRAINT _search_params_uc UNIQUE (origin, destination, distance))"
+        )
+        conn.exec_driver_sql(
+            "CREATE TABLE price_time_series (id INTEGER PRIMARY KEY, search_id INTEGER REFERENCES searches(id), "
+            "departure_date DATE NOT NULL, price INTEGER, scraped_at DATE)"
+        )
+        conn.exec_driver_sql("INSERT INTO searches VALUES (1, 'Vienna', 'Agadir', 2960, '2026-01-01')")
+        conn.exec_driver_sql(
+            "INSERT INTO price_time_series (search_id, departure_date, price, scraped_at) VALUES "
+            "(1, '2026-11-01', 100, '2026-10-01'), (1, '2026-11-01', 110, '2026-10-01')"
+        )
+    old.dispose()
+
+    engine = create_db_engine(path)
+    init_schema(engine)
+    with PriceWriter(engine, flush_interval=0.1) as writer:
+        writer.submit(scrape([120, 130], scraped_at="2026-10-02"), 1)
+
+    assert writer.rows_written == 2
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT departure_date, price, scraped_at FROM price_time_series ORDER BY scraped_at, departure_date"
+        )).all()
+    # The most recently written duplicate is kept
+    assert [tuple(map(str, row)) for row in rows] == [
+        ("2026-11-01", "110", "2026-10-01"),
+        ("2026-11-01", "120", "2026-10-02"),
+        ("2026-11-02", "130", "2026-10-02"),
+    ]
+
+
+@pytest.fixture
+def failing_writes(monkeypatch):
+    """Makes the first `n` writes fail, without the retry pauses."""
+    monkeypatch.setattr(ingestion.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(ingestion, "FLUSH_BACKOFF", 0.05)
+    failures = {"left": 0}
+    write = PriceWriter._write
+
+    def flaky_write(self, rows):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise OSError("disk I/O error")
+        write(self, rows)
+
+    monkeypatch.setattr(PriceWriter, "_write", flaky_write)
+    return failures
+
+
+def test_failed_batch_is_written_with_the_next_flush(engine, search_id, failing_writes):
+    failing_writes["left"] = ingestion.FLUSH_RETRIES
+    written = []
+    with PriceWriter(engine, flush_interval=0.01) as writer:
+        writer.submit(scrape([100, 110]), search_id, on_written=lambda: written.append(1))
+        while failing_writes["left"]:
+            sleep(0.01)
+        writer.submit(scrape([120], scraped_at="2026-10-02"), search_id, on_written=lambda: written.append(2))
+
+    assert writer.rows_written == 3
+    assert writer.unwritten == []
+    assert sorted(written) == [1, 2]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM price_time_series")).scalar() == 3
+
+
+def test_close_raises_if_rows_could_not_be_written(engine, search_id, failing_writes):
+    failing_writes["left"] = 100
+    written = []
+    writer = PriceWriter(engine, flush_interval=0.01)
+    writer.start()
+    writer.submit(scrape([100, 110]), search_id, on_written=lambda: written.append(1))
+
+    with pytest.raises(RuntimeError, match="2 price rows"):
+        writer.close()
+    assert len(writer.unwritten) == 2
+    assert written == []
+
+
+@pytest.mark.parametrize("replace, expected", [
+    # The day's second scrape replaces the first: 90 all along
+    (True, [("2026-11-01", 90, "2026-10-01", "2026-10-02")]),
+    # The first scrape of the day is kept
+    (False, [("2026-11-01", 90, "2026-10-01", "2026-10-01"), ("2026-11-01", 100, "2026-10-02", "2026-10-02")]),
+])
+def test_repeated_scrape_of_a_day_keeps_one_price_per_date(engine, search_id, replace, expected):
+    from change_storage import write_price_changes
+
+    def scrape_day(scraped_at, price):
+        with engine.begin() as conn:
+            write_price_changes(
+                conn, search_id, scraped_at, [{"departure_date": date(2026, 11, 1), "price": price}], replace=replace,
+            )
+
+    scrape_day(date(2026, 10, 1), 90)
+    scrape_day(date(2026, 10, 2), 100)
+    scrape_day(date(2026, 10, 2), 90)
+
+    with engine.connect() as conn:
+        intervals = conn.execute(text(
+            "SELECT departure_date, price, valid_from, valid_to FROM price_intervals ORDER BY valid_from"
+        )).all()
+        daily = conn.execute(text(
+            "SELECT scraped_at, COUNT(*) FROM price_history_daily GROUP BY scraped_at ORDER BY scraped_at"
+        )).all()
+    assert [tuple(row) for row in intervals] == expected
+    assert [tuple(row) for row in daily] == [("2026-10-01", 1), ("2026-10-02", 1)]
+
+
+def test_same_day_rerun_in_both_mode_keeps_the_layouts_equal(engine, search_id):
+    from change_storage import verify_change_only
+
+    with PriceWriter(engine, flush_interval=0.01, storage_mode="both") as writer:
+        writer.submit(scrape([100, 110], scraped_at="2026-10-01"), search_id)
+    with PriceWriter(engine, flush_interval=0.01, storage_mode="both") as writer:
+        writer.submit(scrape([120, 130], scraped_at="2026-10-02"), search_id)
+    # The re-run of the day no longer has the second departure date
+    with PriceWriter(engine, flush_interval=0.01, storage_mode="both") as writer:
+        writer.submit(scrape([125], scraped_at="2026-10-02"), search_id)
+
+    report = verify_change_only(engine)
+    assert report["missing"] == report["extra"] == 0
+    assert report["raw_rows"] == 3
+    with engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT departure_date, price FROM price_time_series WHERE scraped_at = '2026-10-02'"
+        )).all() == [("2026-11-01", 125)]
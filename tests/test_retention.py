@@ -0,0 +1,98 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import insert, text
+
+from db import PriceTimeSeries
+from retention import apply_retention, period_bounds
+
+
+TODAY = date(2026, 4, 15)   # 30 kept days reach back into March, January and February roll up
+
+
+def add_prices(engine, search_id, scrapes):
+    """:param scrapes: (scraped_at, departure_date, price) tuples"""
+    with engine.begin() as conn:
+        conn.execute(insert(PriceTimeSeries.__table__), [
+            {"search_id": search_id, "scraped_at": scraped_at, "departure_date": departure, "price": price}
+            for scraped_at, departure, price in scrapes
+        ])
+
+
+def rollups(engine):
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(
+            "SELECT period_start, departure_date, min_price, max_price, mean_price, last_price, samples "
+            "FROM price_rollups ORDER BY period_start, departure_date"
+        ))]
+
+
+def raw_days(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(
+            "SELECT DISTINCT scraped_at FROM price_time_series ORDER BY scraped_at"
+        ))]
+
+
+@pytest.fixture
+def history(engine, search_id):
+    departure = date(2026, 6, 1)
+    add_prices(engine, search_id, [
+        (date(2026, 1, 5), departure, 100),
+        (date(2026, 1, 10), departure, 80),
+        (date(2026, 1, 20), departure, 90),
+        (date(2026, 2, 3), departure, None),
+        (date(2026, 2, 9), departure, 70),
+        (date(2026, 3, 20), departure, 60),
+    ])
+    return departure
+
+
+def test_period_bounds():
+    assert period_bounds(date(2026, 1, 15), "month") == (date(2026, 1, 1), date(2026, 2, 1))
+    assert period_bounds(date(2026, 1, 15), "week") == (date(2026, 1, 12), date(2026, 1, 19))
+    with pytest.raises(ValueError):
+        period_bounds(date(2026, 1, 15), "year")
+
+
+def test_old_months_are_rolled_up_once(engine, history):
+    assert apply_retention(engine, keep_days=30, period="month", today=TODAY) == 5
+
+    expected = [
+        ("2026-01-01", "2026-06-01", 80, 100, 90.0, 90, 3),
+        ("2026-02-01", "2026-06-01", 70, 70, 70.0, 70, 1),
+    ]
+    assert rollups(engine) == expected
+    assert raw_days(engine) == ["2026-03-20"]
+
+    # A second run finds nothing to do and leaves the aggregates alone
+    assert apply_retention(engine, keep_days=30, period="month", today=TODAY) == 0
+    assert rollups(engine) == expected
+
+
+def test_late_rows_are_merged_into_the_rollup(engine, search_id, history):
+    apply_retention(engine, keep_days=30, period="month", today=TODAY)
+    add_prices(engine, search_id, [(date(2026, 1, 25), history, 120)])
+
+    assert apply_retention(engine, keep_days=30, period="month", today=TODAY) == 1
+    assert rollups(engine)[0] == ("2026-01-01", "2026-06-01", 80, 120, 97.5, 120, 4)
+
+
+def test_rows_past_the_archive_watermark_are_kept(engine, search_id, history):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO archive_state (search_id, exported_through) VALUES (:s, '2026-01-10')"),
+                     {"s": search_id})
+
+    assert apply_retention(engine, keep_days=30, period="month", today=TODAY, archived_only=True) == 2
+    assert raw_days(engine) == ["2026-01-20", "2026-02-03", "2026-02-09", "2026-03-20"]
+
+    # Once the rest is archived, it is merged into the same aggregates
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE archive_state SET exported_through = '2026-03-31'"))
+    assert apply_retention(engine, keep_days=30, period="month", today=TODAY, archived_only=True) == 3
+    assert rollups(engine)[0] == ("2026-01-01", "2026-06-01", 80, 100, 90.0, 90, 3)
+
+
+def test_routes_never_archived_are_left_alone(engine, history):
+    assert apply_retention(engine, keep_days=30, period="month", today=TODAY, archived_only=True) == 0
+    assert len(raw_days(engine)) == 6
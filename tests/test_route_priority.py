@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from db import DailyRouteMin, PriceTimeSeries, ScrapeRun, migrate, register_searches
+from job_queue import defer_jobs, enqueue_jobs
+from route_priority import MAX_STALENESS_DAYS, VOLATILITY_WEIGHT, parse_weight, score_routes
+
+
+RUN_DATE = date(2026, 10, 18)
+
+
+@pytest.fixture
+def searches(engine):
+    """Four routes, by destination."""
+    registered = register_searches(engine, [
+        {"origin": "Vienna", "destination": destination, "distance": 1000}
+        for destination in ("Agadir", "Porto", "Tromso", "Malta")
+    ])
+    return {search.destination: search for search in registered.values()}
+
+
+def add_scrape_runs(engine, search, *days_ago):
+    with engine.begin() as conn:
+        conn.execute(insert(ScrapeRun.__table__), [
+            {"search_id": search.id, "scraped_at": RUN_DATE - timedelta(days=d)} for d in days_ago
+        ])
+
+
+def add_daily_min(engine, search, prices):
+    """One cheapest price per day, the last one yesterday."""
+    with engine.begin() as conn:
+        conn.execute(insert(DailyRouteMin.__table__), [
+            {"search_id": search.id, "scraped_at": RUN_DATE - timedelta(days=len(prices) - i),
+             "departure_date": date(2026, 12, 1), "price": price}
+            for i, price in enumerate(prices)
+        ])
+
+
+def ranking(engine, searches, weights=None):
+    return [s.search.destination for s in score_routes(searches.values(), weights, RUN_DATE, engine=engine)]
+
+
+def test_stale_and_volatile_routes_go_first(engine, searches):
+    add_scrape_runs(engine, searches["Agadir"], 1)
+    add_scrape_runs(engine, searches["Porto"], 4)
+    add_scrape_runs(engine, searches["Malta"], 1)
+    add_daily_min(engine, searches["Agadir"], [100, 100, 100])
+    add_daily_min(engine, searches["Malta"], [60, 140, 60, 140])   # moves by 40%
+
+    scores = {s.search.destination: s for s in score_routes(searches.values(), run_date=RUN_DATE, engine=engine)}
+    assert scores["Tromso"].staleness == MAX_STALENESS_DAYS     # never scraped
+    assert (scores["Porto"].staleness, scores["Agadir"].staleness) == (4, 1)
+    assert scores["Agadir"].volatility == 0
+    assert scores["Malta"].score == pytest.approx(1 + VOLATILITY_WEIGHT * 0.4)
+
+    assert ranking(engine, searches) == ["Tromso", "Malta", "Porto", "Agadir"]
+
+
+def test_weight_scales_the_score(engine, searches):
+    for destination, days_ago in (("Agadir", 1), ("Porto", 2), ("Tromso", 3), ("Malta", 4)):
+        add_scrape_runs(engine, searches[destination], days_ago)
+    assert ranking(engine, searches) == ["Malta", "Tromso", "Porto", "Agadir"]
+    assert ranking(engine, searches, weights={searches["Agadir"].id: 5.0}) == ["Agadir", "Malta", "Tromso", "Porto"]
+
+
+def test_deferred_routes_go_first(engine, searches):
+    add_scrape_runs(engine, searches["Porto"], 1)
+    yesterday = RUN_DATE - timedelta(days=1)
+    enqueue_jobs([searches["Porto"].id], yesterday, engine=engine)
+    defer_jobs(yesterday, engine=engine)
+
+    assert ranking(engine, searches)[0] == "Porto"
+
+
+def test_staleness_of_an_upgraded_database(engine, searches):
+    # Prices of a version without scrape_runs count once migrate() recorded them
+    with engine.begin() as conn:
+        conn.execute(insert(PriceTimeSeries.__table__), [
+            {"search_id": searches[destination].id, "scraped_at": RUN_DATE - timedelta(days=days_ago),
+             "departure_date": date(2026, 12, 1), "price": 100}
+            for destination, days_ago in (("Agadir", 1), ("Porto", 2), ("Tromso", 3), ("Malta", 40))
+        ])
+    migrate(engine)
+
+    assert ranking(engine, searches) == ["Malta", "Tromso", "Porto", "Agadir"]
+
+
+@pytest.mark.parametrize("value, expected", [(None, 1.0), ("2.5", 2.5), (3, 3.0)])
+def test_parse_weight(value, expected):
+    assert parse_weight(value) == expected
+
+
+@pytest.mark.parametrize("value", [0, -1, "heavy", float("inf"), float("nan")])
+def test_invalid_weights_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_weight(value)
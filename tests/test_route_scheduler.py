@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from db import register_searches
+from route_scheduler import CADENCES, SLOT_ANCHOR, RouteScheduler, parse_cadence
+
+
+NOW = datetime(2026, 10, 18, 12, 0)
+DAILY = CADENCES["daily"]
+
+
+@pytest.fixture
+def routes(engine):
+    """Four daily routes."""
+    searches = register_searches(engine, [
+        {"origin": "Vienna", "destination": destination, "distance": 1000}
+        for destination in ("Agadir", "Porto", "Tromso", "Malta")
+    ])
+    return [(search, DAILY) for search in sorted(searches.values(), key=lambda s: s.id)]
+
+
+def next_runs(engine):
+    with engine.connect() as conn:
+        return {
+            search_id: datetime.fromisoformat(str(next_run_at))
+            for search_id, next_run_at in conn.execute(text("SELECT search_id, next_run_at FROM route_schedule"))
+        }
+
+
+def seconds_of_day(moment):
+    return (moment - SLOT_ANCHOR).total_seconds() % DAILY
+
+
+def test_routes_of_a_cadence_are_spread_evenly(engine, routes):
+    with RouteScheduler(lambda search: None, engine=engine, max_jitter=0) as scheduler:
+        scheduler.sync(routes, now=NOW)
+
+    planned = next_runs(engine)
+    assert sorted(seconds_of_day(planned[search.id]) for search, _ in routes) == [0, 21600, 43200, 64800]
+    assert all(NOW < run <= NOW + timedelta(seconds=DAILY) for run in planned.values())
+
+
+def test_jitter_stays_within_its_bound(engine, routes):
+    with RouteScheduler(lambda search: None, engine=engine, max_jitter=600, rng=random.Random(1)) as scheduler:
+        scheduler.sync(routes, now=NOW)
+
+    for i, (search, _) in enumerate(routes):
+        shift = seconds_of_day(next_runs(engine)[search.id]) - i * 21600
+        shift = (shift + DAILY / 2) % DAILY - DAILY / 2
+        assert 0 < abs(shift) <= 600
+
+
+def test_a_restart_keeps_the_plan(engine, routes):
+    with RouteScheduler(lambda search: None, engine=engine) as scheduler:
+        scheduler.sync(routes, now=NOW)
+    planned = next_runs(engine)
+
+    with RouteScheduler(lambda search: None, engine=engine) as scheduler:
+        scheduler.sync(routes, now=NOW + timedelta(hours=5))
+        # A changed cadence is planned anew
+        scheduler.sync([routes[0]] + [(search, CADENCES["weekly"]) for search, _ in routes[1:]], now=NOW)
+    replanned = next_runs(engine)
+    assert replanned[routes[0][0].id] == planned[routes[0][0].id]
+    assert all(replanned[search.id] != planned[search.id] for search, _ in routes[1:])
+
+
+def test_concurrency_cap_holds(engine, routes):
+    release = threading.Event()
+    lock = threading.Lock()
+    running, peak, ran = [0], [0], []
+
+    def run_route(search):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(timeout=10)
+        with lock:
+            running[0] -= 1
+            ran.append(search.id)
+
+    due = NOW + timedelta(days=2)
+    with RouteScheduler(run_route, engine=engine, max_concurrency=2) as scheduler:
+        scheduler.sync(routes, now=NOW)
+        assert scheduler.run_pending(now=due) == 2
+        # All four are due, but two are running already
+        assert scheduler.run_pending(now=due) == 0
+
+        # The next two start as soon as the first two are done
+        release.set()
+        started, deadline = 0, time.monotonic() + 10
+        while started < 2 and time.monotonic() < deadline:
+            started += scheduler.run_pending(now=due)
+        assert started == 2
+
+    assert peak[0] == 2
+    assert len(ran) == 4
+
+
+@pytest.mark.parametrize("value, seconds", [(None, 86400), ("hourly", 3600), ("weekly", 604800), (6, 21600), ("0.5", 1800)])
+def test_parse_cadence(value, seconds):
+    assert parse_cadence(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["monthly", 0, -2])
+def test_invalid_cadences_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_cadence(value)
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.orm import Session
+
+from db import PriceTimeSeries, Search
+
+
+def test_deleting_a_search_deletes_its_prices(engine, search_id):
+    with engine.begin() as conn:
+        conn.execute(insert(PriceTimeSeries.__table__), [
+            {"search_id": search_id, "departure_date": date(2026, 11, 1), "price": 100, "scraped_at": date(2026, 10, 1)},
+            {"search_id": search_id, "departure_date": date(2026, 11, 2), "price": 110, "scraped_at": date(2026, 10, 1)},
+        ])
+
+    with Session(engine) as session:
+        session.delete(session.get(Search, search_id))
+        session.commit()
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM price_time_series")).scalar() == 0
+
+
+def add_history(engine, search_id, days, start=date(2026, 1, 1)):
+    """Adds `days` daily scrapes of 10 departure dates each, from `start` on."""
+    with engine.begin() as conn:
+        conn.execute(insert(PriceTimeSeries.__table__), [
+            {
+                "search_id": search_id,
+                "departure_date": start + timedelta(days=day + offset),
+                "price": 100 + offset,
+                "scraped_at": start + timedelta(days=day),
+            }
+            for day in range(days)
+            for offset in range(10)
+        ])
+
+
+def lookup(engine):
+    """
+    Looks the search up like the tracker does.
+
+    :return: the SQL statements run and the number of objects loaded
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        with Session(engine) as session:
+            search = session.scalars(
+                select(Search).filter_by(origin="Vienna", destination="Agadir", distance=2960)
+            ).first()
+            assert search is not None
+            loaded = len(session.identity_map)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return statements, loaded
+
+
+def test_search_lookup_does_not_grow_with_the_history(engine, search_id):
+    add_history(engine, search_id, 10)
+    small_statements, small_loaded = lookup(engine)
+
+    add_history(engine, search_id, 90, start=date(2026, 1, 11))
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM price_time_series")).scalar() == 1000
+    large_statements, large_loaded = lookup(engine)
+
+    assert len(large_statements) == len(small_statements) == 1
+    assert large_loaded == small_loaded == 1
+    assert not any("price_time_series" in statement for statement in large_statements)
+
+
+def test_price_history_pages(engine, search_id):
+    add_history(engine, search_id, 30)
+    with Session(engine) as session:
+        search = session.get(Search, search_id)
+        first = search.price_history(session, limit=100)
+        rest = search.price_history(session, limit=1000, offset=100)
+        january = search.price_history(session, scraped_to=date(2026, 1, 31), limit=1000)
+
+    assert len(first) == 100 and len(rest) == 200
+    assert first[0].scraped_at == date(2026, 1, 1)
+    assert rest[-1].scraped_at == date(2026, 1, 30)
+    assert len(january) == 300
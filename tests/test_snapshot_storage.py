@@ -0,0 +1,67 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from ingestion import PriceWriter
+from snapshot_storage import (
+    MISSING_PRICE,
+    NULL_PRICE,
+    load_snapshot,
+    load_snapshots,
+    pack_prices,
+    snapshot_to_frame,
+    unpack_prices,
+)
+
+
+def test_pack_and_unpack_round_trip():
+    rows = [
+        {"departure_date": date(2026, 11, 3), "price": 250},
+        {"departure_date": date(2026, 11, 1), "price": 120},
+        {"departure_date": date(2026, 11, 2), "price": None},
+        # 2026-11-04 is not in the calendar
+        {"departure_date": date(2026, 11, 5), "price": 2 ** 31 - 1},
+    ]
+    start, blob = pack_prices(rows)
+
+    assert start == date(2026, 11, 1)
+    assert len(blob) == 5 * 4
+    prices = unpack_prices(blob)
+    assert prices.tolist() == [120, NULL_PRICE, 250, MISSING_PRICE, 2 ** 31 - 1]
+    assert MISSING_PRICE == np.iinfo(np.int32).min
+    assert not prices.flags.writeable
+
+    df = snapshot_to_frame(start, prices)
+    assert df["departure_date"].tolist() == ["2026-11-01", "2026-11-02", "2026-11-03", "2026-11-05"]
+    assert df["price"].isna().tolist() == [False, True, False, False]
+    assert df["price"].dropna().tolist() == [120, 250, 2 ** 31 - 1]
+
+
+def test_writer_stores_one_snapshot_per_scrape(engine, search_id):
+    def scrape(prices, scraped_at):
+        return pd.DataFrame({
+            "departure_date": [f"2026-11-{day:02d}" for day in range(1, len(prices) + 1)],
+            "price": prices,
+            "scraped_at": scraped_at,
+        })
+
+    with PriceWriter(engine, flush_interval=0.05, storage_mode="snapshot") as writer:
+        writer.submit(scrape([100, None, 120], "2026-10-01"), search_id)
+        writer.submit(scrape([90, 95], "2026-10-02"), search_id)
+
+    start, prices = load_snapshot(engine, search_id, date(2026, 10, 1))
+    assert (start, prices.tolist()) == (date(2026, 11, 1), [100, NULL_PRICE, 120])
+    assert load_snapshot(engine, search_id, date(2026, 10, 3)) is None
+    assert [scraped_at for scraped_at, _, _ in load_snapshots(engine, search_id)] == [date(2026, 10, 1), date(2026, 10, 2)]
+    assert [scraped_at for scraped_at, _, _ in load_snapshots(engine, search_id, start=date(2026, 10, 2))] == [date(2026, 10, 2)]
+
+    # A repeated scrape of the day replaces its snapshot
+    with PriceWriter(engine, flush_interval=0.05, storage_mode="snapshot") as writer:
+        writer.submit(scrape([80], "2026-10-02"), search_id)
+    assert load_snapshot(engine, search_id, date(2026, 10, 2))[1].tolist() == [80]
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM price_time_series")).scalar() == 0
+        assert conn.execute(text("SELECT COUNT(*) FROM price_snapshots")).scalar() == 2
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from ingestion import PriceWriter
+from summary_tables import SUMMARY_SOURCES, load_latest_prices, rebuild_summaries, verify_summaries
+
+
+def scrape(prices, scraped_at):
+    """Prices per departure day of November, None for a cell without price."""
+    return pd.DataFrame({
+        "departure_date": [f"2026-11-{day:02d}" for day in prices],
+        "price": list(prices.values()),
+        "scraped_at": scraped_at,
+    })
+
+
+def write(engine, search_id, storage_mode, *scrapes):
+    with PriceWriter(engine, flush_interval=0.05, storage_mode=storage_mode) as writer:
+        for prices, scraped_at in scrapes:
+            writer.submit(scrape(prices, scraped_at), search_id)
+
+
+def in_sync(engine, storage_mode):
+    return set(verify_summaries(engine, SUMMARY_SOURCES[storage_mode]).values()) == {0}
+
+
+def latest_prices(engine):
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(
+            "SELECT departure_date, price, scraped_at FROM latest_price ORDER BY departure_date"
+        ))]
+
+
+def daily_minimums(engine):
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(
+            "SELECT scraped_at, departure_date, price FROM daily_route_min ORDER BY scraped_at"
+        ))]
+
+
+@pytest.mark.parametrize("storage_mode", ["append", "change_only", "both"])
+def test_summaries_match_the_raw_rows_after_a_re_run(engine, search_id, storage_mode):
+    write(engine, search_id, storage_mode, ({1: 100, 2: 95, 3: 70, 4: None}, "2026-10-01"))
+    write(engine, search_id, storage_mode, ({1: 120, 2: 90, 3: 80}, "2026-10-02"))
+    assert in_sync(engine, storage_mode)
+
+    # A re-run of the day without 2026-11-03
+    write(engine, search_id, storage_mode, ({1: 110, 2: 85}, "2026-10-02"))
+    assert in_sync(engine, storage_mode)
+
+    assert latest_prices(engine) == [
+        ("2026-11-01", 110, "2026-10-02"),
+        ("2026-11-02", 85, "2026-10-02"),
+        # Back to its earlier scrape
+        ("2026-11-03", 70, "2026-10-01"),
+        ("2026-11-04", None, "2026-10-01"),
+    ]
+    assert daily_minimums(engine) == [
+        ("2026-10-01", "2026-11-03", 70),
+        ("2026-10-02", "2026-11-02", 85),
+    ]
+
+
+def test_an_older_scrape_does_not_replace_the_latest_price(engine, search_id):
+    write(engine, search_id, "append", ({1: 120, 2: 90}, "2026-10-02"))
+    write(engine, search_id, "append", ({1: 100, 3: 70}, "2026-10-01"))
+    assert in_sync(engine, "append")
+
+    assert latest_prices(engine) == [
+        ("2026-11-01", 120, "2026-10-02"),
+        ("2026-11-02", 90, "2026-10-02"),
+        ("2026-11-03", 70, "2026-10-01"),
+    ]
+
+
+def test_rebuild_repairs_the_summaries(engine, search_id):
+    write(engine, search_id, "append", ({1: 100, 2: 90}, "2026-10-01"), ({1: 80}, "2026-10-02"))
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE latest_price SET price = 1"))
+        conn.execute(text("DELETE FROM daily_route_min"))
+
+    report = verify_summaries(engine)
+    assert report["latest_price_extra"] == report["latest_price_missing"] == 2
+    assert report["daily_route_min_missing"] == 2
+
+    rebuild_summaries(engine)
+    assert in_sync(engine, "append")
+    assert load_latest_prices(engine, search_id)["price"].tolist() == [80, 90]
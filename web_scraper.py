@@ -1,20 +1,28 @@
+from __future__ import annotations
+
 import os
 import time
 import re
-import pandas as pd
+import json
+import base64
 import logging
 from logging.handlers import RotatingFileHandler
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Generator, List, Dict, Optional, Tuple
 
+# Only the cheap selenium modules are imported here, the Chrome driver
+# classes load on first use so that importing this module stays fast
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+
+from calendar_rpc import is_calendar_rpc_url, parse_calendar_payloads
+from http_scraper import HttpCalendarClient
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from driver_pool import DriverPool
 
 
 # --- 1. LOGGING SETUP ---
@@ -31,6 +39,60 @@ stream_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 logger.addHandler(stream_handler)
 
+# Scraper backends, "http" fetches the calendar RPC without a browser
+SCRAPER_BACKENDS = ("selenium", "http")
+DEFAULT_BACKEND = "selenium"
+
+# Calendar cell extraction strategies, "js" reads all cells in one round trip,
+# "network" parses the calendar RPC responses (needs network_logging on the driver)
+EXTRACTION_STRATEGIES = ("js", "elements", "network")
+DEFAULT_EXTRACTION = "js"
+
+CALENDAR_CELLS_JS = """
+return Array.from(document.querySelectorAll("div[role='gridcell'][data-iso]")).map(function (cell) {
+    var priceEl = cell.querySelector("div[jsname='qCDwBb']");
+    return [cell.getAttribute("data-iso"), priceEl ? priceEl.getAttribute("aria-label") : null];
+});
+"""
+
+# Page preamble, one probe decides which of consent/pop-up handling is needed
+PREAMBLE_TIMEOUT = 15
+PREAMBLE_POLL_INTERVAL = 0.2
+
+PAGE_STATE_JS = """
+var buttons = Array.from(document.querySelectorAll("button"));
+function hasText(btn, words) {
+    var text = btn.textContent || "";
+    return words.some(function (word) { return text.indexOf(word) !== -1; });
+}
+if (location.hostname.indexOf("consent.") === 0
+        || buttons.some(function (b) { return hasText(b, ["Reject all", "Alle ablehnen"]); })) {
+    return "consent";
+}
+if (buttons.some(function (b) { return b.offsetParent !== null && hasText(b, ["Got it", "Verstanden", "Done"]); })) {
+    return "overlay";
+}
+if (document.querySelector("input[placeholder='Departure']")) {
+    return "ready";
+}
+return "loading";
+"""
+
+# Calendar pagination waits on the rendered state instead of fixed sleeps
+PAGINATION_CLICKS = 10
+CLICK_TIMEOUT = 5               # seconds budget per calendar page
+RENDER_SETTLE_TIMEOUT = 3       # seconds budget for the final render
+CALENDAR_POLL_INTERVAL = 0.2
+ELEMENT_TIMEOUT = 15            # seconds to wait for an element to become clickable
+
+# Returns [number of priced cells, last rendered data-iso]
+CALENDAR_STATE_JS = """
+var cells = document.querySelectorAll("div[role='gridcell'][data-iso]");
+var priced = document.querySelectorAll("div[role='gridcell'][data-iso] div[jsname='qCDwBb'][aria-label]");
+var last = cells.length ? cells[cells.length - 1].getAttribute("data-iso") : null;
+return [priced.length, last];
+"""
+
 
 def generate_google_flights_url(
         origin: str, 
@@ -65,7 +127,19 @@ def generate_google_flights_url(
     return f"https://www.google.com/travel/flights?q={encoded_query}", encoded_query
 
 
-def scrape_google_flights(url: str) -> pd.DataFrame:
+def create_chrome_driver(network_logging: bool = False) -> webdriver.Chrome:
+    """
+    Builds a headless Chrome driver with the stealth options used for scraping.
+
+    :param network_logging: enable the Chrome performance log needed by the
+        "network" extraction strategy, defaults to False
+    :type network_logging: bool
+    :return: ready to use Chrome WebDriver
+    :rtype: webdriver.Chrome
+    """
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     chrome_options.page_load_strategy = 'eager'
     chrome_options.add_argument("--headless")
@@ -73,7 +147,13 @@ def scrape_google_flights(url: str) -> pd.DataFrame:
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
+    # Keep background tabs running at full speed for scrape_google_flights_in_tabs
+    chrome_options.add_argument("--disable-background-timer-throttling")
+    chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+    chrome_options.add_argument("--disable-renderer-backgrounding")
     chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    if network_logging:
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
 
     # --- CROSS-PLATFORM PATH DETECTION ---
     pi_browser_path = "/usr/bin/chromium"
@@ -88,83 +168,315 @@ def scrape_google_flights(url: str) -> pd.DataFrame:
         driver = webdriver.Chrome(options=chrome_options)
         
     driver.set_page_load_timeout(60)
-    
+    return driver
+
+
+def parse_price_label(price_label: str | None) -> int | None:
+    """
+    Turns a price aria-label (e.g. "123 euros" or "1.234 €") into an int.
+    """
+    if price_label:
+        digits = re.sub(r'\D', '', price_label)
+        if digits:
+            return int(digits)
+    return None
+
+
+def _extract_cells_js(driver: webdriver.Chrome) -> List[Dict]:
+    # One execute_script round trip returns compact [data-iso, aria-label] pairs
+    pairs = driver.execute_script(CALENDAR_CELLS_JS)
+    return [
+        {"departure_date": date_iso, "price": parse_price_label(price_label)}
+        for date_iso, price_label in pairs
+    ]
+
+
+def _extract_cells_elements(driver: webdriver.Chrome) -> List[Dict]:
+    all_elements = driver.find_elements(By.CSS_SELECTOR, "div[role='gridcell'][data-iso]")
+    logger.info(f"Total elements found in HTML: {len(all_elements)}")
+
+    results = []
+    for cell in all_elements:
+        # We ignore aria-hidden here to see 'ghost' elements too
+        date_iso = cell.get_attribute("data-iso")
+        price = None
+        
+        try:
+            # Look for the price div
+            price_el = cell.find_element(By.CSS_SELECTOR, "div[jsname='qCDwBb']")
+            price = parse_price_label(price_el.get_attribute("aria-label"))
+        except:
+            pass
+        
+        results.append({"departure_date": date_iso, "price": price})
+
+    return results
+
+
+def drain_performance_log(driver: webdriver.Chrome) -> list:
+    """Returns and clears all buffered Chrome performance log entries."""
     try:
-        logger.info(f"Scraping URL: {url}")
-        driver.get(url)
-        wait = WebDriverWait(driver, 15)
+        return driver.get_log("performance")
+    except Exception as e:
+        logger.warning(f"Performance log not available (driver without network_logging?): {e}")
+        return []
+
 
-        # A. CONSENT SCREEN
+def _extract_cells_network(driver: webdriver.Chrome) -> List[Dict]:
+    # Find the calendar RPC responses seen since the log was last drained
+    request_ids = []
+    for entry in drain_performance_log(driver):
         try:
-            reject_xpath = "//button[contains(., 'Reject all') or contains(., 'Alle ablehnen')]"
-            reject_btn = wait.until(EC.element_to_be_clickable((By.XPATH, reject_xpath)))
-            reject_btn.click()
-            logger.info("Consent screen cleared.")
-        except Exception:
-            pass # Already cleared or didn't appear
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, json.JSONDecodeError):
+            continue
+        if message.get("method") != "Network.responseReceived":
+            continue
+        params = message.get("params", {})
+        if is_calendar_rpc_url(params.get("response", {}).get("url", "")):
+            request_ids.append(params["requestId"])
+
+    bodies = []
+    for request_id in request_ids:
+        try:
+            response = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception as e:
+            logger.warning(f"Could not read calendar response body {request_id}: {e}")
+            continue
+        body = response.get("body", "")
+        if response.get("base64Encoded"):
+            body = base64.b64decode(body).decode("utf-8", errors="replace")
+        bodies.append(body)
+
+    logger.info(f"Captured {len(bodies)} calendar RPC responses.")
+    return parse_calendar_payloads(bodies).to_dict("records")
+
+
+def extract_calendar_cells(driver: webdriver.Chrome, extraction: str = DEFAULT_EXTRACTION) -> List[Dict]:
+    """
+    Reads all calendar cells currently rendered on the page.
+
+    :param driver: driver with the opened departure calendar
+    :type driver: webdriver.Chrome
+    :param extraction: "js" for a single execute_script round trip,
+        "elements" for the per-element WebDriver path, "network" for the
+        captured calendar RPC responses, defaults to "js"
+    :type extraction: str
+    :return: list of {"departure_date", "price"} dicts
+    :rtype: List[Dict]
+    """
+    if extraction not in EXTRACTION_STRATEGIES:
+        raise ValueError(f"Unknown extraction strategy '{extraction}', use one of {EXTRACTION_STRATEGIES}")
+
+    start = time.perf_counter()
+    results = None
+
+    if extraction == "network":
+        try:
+            results = _extract_cells_network(driver) or None
+        except Exception as e:
+            logger.warning(f"Network extraction failed: {e}")
+        if results is None:
+            logger.warning("No calendar RPC payloads captured, falling back to js.")
+            extraction = "js"
+
+    if extraction == "js":
+        try:
+            results = _extract_cells_js(driver)
+        except Exception as e:
+            logger.warning(f"JavaScript extraction failed, falling back to elements: {e}")
+            extraction = "elements"
+
+    if results is None:
+        results = _extract_cells_elements(driver)
+
+    logger.info(f"Extracted {len(results)} cells via '{extraction}' in {time.perf_counter() - start:.2f}s")
+    return results
+
+
+def _probe_page_state(driver: webdriver.Chrome) -> str:
+    return driver.execute_script(PAGE_STATE_JS)
+
+
+def _poll_until(condition: Callable[[], Any], timeout: float) -> Generator[None, None, Tuple[Any, float]]:
+    """
+    Polls `condition` until it returns something truthy or `timeout` runs out.
+
+    Yields between polls so the caller decides how to spend the wait: a
+    single tab sleeps, the multi-tab runner works on other tabs meanwhile.
 
-        # B. POP-UP KILLER (Recommended Flights / Tips)
+    :return: (last condition result, seconds waited)
+    """
+    start = time.perf_counter()
+    while True:
         try:
-            time.sleep(2) # Small pause for animations
+            result = condition()
+        except (NoSuchElementException, StaleElementReferenceException):
+            result = None
+        elapsed = time.perf_counter() - start
+        if result or elapsed >= timeout:
+            return result, elapsed
+        yield
+
+
+def _clickable(driver: webdriver.Chrome, locator: Tuple[str, str]) -> Callable[[], Any]:
+    from selenium.webdriver.support import expected_conditions as EC
+
+    return lambda: EC.element_to_be_clickable(locator)(driver)
+
+
+def _run_preamble(driver: webdriver.Chrome, timeout: float) -> Generator[None, None, str]:
+    """
+    Clears the consent screen and pop-ups, but only if the page shows them.
+
+    A single probe classifies the page as "consent", "overlay", "ready" or
+    "loading" and only the matching step runs, so a clean page costs one
+    round trip instead of fixed waits.
+
+    :return: last observed page state
+    :rtype: str
+    """
+    start = time.perf_counter()
+    state = _probe_page_state(driver)
+
+    while state != "ready" and time.perf_counter() - start < timeout:
+        if state == "consent":
+            reject_xpath = "//button[contains(., 'Reject all') or contains(., 'Alle ablehnen')]"
+            for btn in driver.find_elements(By.XPATH, reject_xpath):
+                try:
+                    btn.click()
+                    logger.info("Consent screen cleared.")
+                    break
+                except Exception:
+                    continue
+        elif state == "overlay":
             driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
-            
+
             pop_up_xpath = "//button[contains(., 'Got it') or contains(., 'Verstanden') or contains(., 'Done')]"
-            pop_ups = driver.find_elements(By.XPATH, pop_up_xpath)
-            for btn in pop_ups:
-                btn.click()
-                logger.info("Recommendation pop-up cleared.")
-        except Exception:
-            pass
+            for btn in driver.find_elements(By.XPATH, pop_up_xpath):
+                try:
+                    btn.click()
+                    logger.info("Recommendation pop-up cleared.")
+                except Exception:
+                    pass
+        
+        yield from _poll_until(lambda: False, PREAMBLE_POLL_INTERVAL)
+        next_state = _probe_page_state(driver)
+        if next_state == "overlay" and state == "overlay":
+            # Pop-up survived the clicks, leave it to the departure input wait
+            break
+        state = next_state
+
+    logger.info(f"Preamble finished in {time.perf_counter() - start:.2f}s (page state: {state}).")
+    return state
+
+
+def _calendar_state(driver: webdriver.Chrome) -> Tuple:
+    return tuple(driver.execute_script(CALENDAR_STATE_JS))
+
+
+def _wait_for_calendar_change(driver: webdriver.Chrome, previous: Tuple, timeout: float) -> Generator[None, None, float]:
+    """
+    Waits until the calendar differs from `previous` (more priced cells or new months).
+
+    :return: seconds waited, the full timeout if nothing changed
+    :rtype: float
+    """
+    changed, waited = yield from _poll_until(lambda: _calendar_state(driver) != previous, timeout)
+    if not changed:
+        logger.warning(f"Calendar did not change within {timeout}s.")
+    return waited
+
+
+def _wait_for_calendar_settle(driver: webdriver.Chrome, timeout: float) -> Generator[None, None, float]:
+    """
+    Waits until the calendar state is unchanged between two consecutive polls.
+
+    :return: seconds waited
+    :rtype: float
+    """
+    previous = [_calendar_state(driver)]
+
+    def settled():
+        current = _calendar_state(driver)
+        stable = current == previous[0] and current[0] > 0
+        previous[0] = current
+        return stable
+
+    # The first poll would compare the state with itself, skip it
+    yield
+    _, waited = yield from _poll_until(settled, timeout)
+    return waited
+
+
+def _scrape_steps(
+        driver: webdriver.Chrome, 
+        url: str, 
+        extraction: str, 
+        metrics: dict | None,
+        ) -> Generator[None, None, pd.DataFrame]:
+    """
+    The scrape of one route as a generator that yields whenever it waits for the page.
+
+    Always acts on the driver's current window, callers switch to the right
+    tab before resuming it.
+    """
+    import pandas as pd
+
+    try:
+        logger.info(f"Scraping URL: {url}")
+        if extraction == "network":
+            # Drop events of earlier pages so only this route's responses are parsed
+            drain_performance_log(driver)
+        driver.get(url)
+
+        # A./B. CONSENT SCREEN AND POP-UPS (only the steps the page actually needs)
+        yield from _run_preamble(driver, PREAMBLE_TIMEOUT)
 
         # C. CLICK DEPARTURE INPUT
+        departure_input, _ = yield from _poll_until(
+            _clickable(driver, (By.XPATH, "//input[@placeholder='Departure']")), ELEMENT_TIMEOUT
+        )
         try:
-            departure_input = wait.until(EC.element_to_be_clickable((By.XPATH, "//input[@placeholder='Departure']")))
             departure_input.click()
             logger.info("'Departure' input clicked.")
         except Exception:
             logger.warning("Could not click 'Departure' input.")
 
         # D. EXTRACT PRICES FROM CALENDER
-        logger.info("Executing 10 clicks for all months to load...")
-        for i in range(10):
+        logger.info(f"Executing {PAGINATION_CLICKS} clicks for all months to load...")
+        pagination_waits = []
+        for i in range(PAGINATION_CLICKS):
+            # Use a short wait to ensure the button is ready for the next click
+            next_btn, _ = yield from _poll_until(
+                _clickable(driver, (By.CSS_SELECTOR, "button[jsname='KpyLEe']")), ELEMENT_TIMEOUT
+            )
             try:
-                # Use a short wait to ensure the button is ready for the next click
-                next_btn = wait.until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, "button[jsname='KpyLEe']"))
-                )
+                before = _calendar_state(driver)
                 driver.execute_script("arguments[0].click();", next_btn)
-                # Small buffer to prevent the browser from freezing
-                time.sleep(3) 
             except Exception as e:
                 logger.warning(f"Stopped at click {i+1}: {e}")
                 break
 
+            # Wait for the click to actually render instead of a fixed sleep
+            waited = yield from _wait_for_calendar_change(driver, before, CLICK_TIMEOUT)
+            pagination_waits.append(waited)
+            logger.info(f"Click {i+1}: calendar rendered in {waited:.2f}s")
+
         # Give the final view a moment to load prices for the current months
         logger.info("Clicks finished. Waiting for final render...")
-        time.sleep(3)
+        render_wait = yield from _wait_for_calendar_settle(driver, RENDER_SETTLE_TIMEOUT)
+
+        logger.info(
+            f"Pagination waits: total {sum(pagination_waits):.2f}s over {len(pagination_waits)} clicks, "
+            f"final render {render_wait:.2f}s"
+            )
+        if metrics is not None:
+            metrics["pagination_waits"] = pagination_waits
+            metrics["render_wait"] = render_wait
 
         # 3. Scrape EVERYTHING currently in the HTML
-        all_elements = driver.find_elements(By.CSS_SELECTOR, "div[role='gridcell'][data-iso]")
-        logger.info(f"Total elements found in HTML: {len(all_elements)}")
-
-        results = []
-        for cell in all_elements:
-            # We ignore aria-hidden here to see 'ghost' elements too
-            date_iso = cell.get_attribute("data-iso")
-            price = None
-            
-            try:
-                # Look for the price div
-                price_el = cell.find_element(By.CSS_SELECTOR, "div[jsname='qCDwBb']")
-                price_label = price_el.get_attribute("aria-label")
-                if price_label:
-                    digits = re.sub(r'\D', '', price_label)
-                    if digits:
-                        price = int(digits)
-            except:
-                pass
-            
-            results.append({"departure_date": date_iso, "price": price})
+        results = extract_calendar_cells(driver, extraction)
 
         # 4. Analyze what we found
         df = pd.DataFrame(results)
@@ -176,8 +488,117 @@ def scrape_google_flights(url: str) -> pd.DataFrame:
     except Exception as e:
         logger.error(f"Critical error during scrape: {e}")
         return pd.DataFrame(columns=['departure_date', 'price'])
+
+
+def scrape_google_flights(
+        url: str, 
+        driver: webdriver.Chrome | None = None, 
+        extraction: str = DEFAULT_EXTRACTION,
+        metrics: dict | None = None,
+        ) -> pd.DataFrame:
+    """
+    Scrapes the price calendar of a Google Flights search.
+
+    :param url: Google Flights search url
+    :type url: str
+    :param driver: borrowed driver (e.g. from a DriverPool), defaults to None.
+        If None, a fresh driver is created and quit after the scrape.
+    :type driver: webdriver.Chrome | None
+    :param extraction: calendar cell extraction strategy ("js", "elements" or "network"), defaults to "js"
+    :type extraction: str
+    :param metrics: optional dict that receives the wait timings in seconds
+        ("pagination_waits" per click and "render_wait"), defaults to None
+    :type metrics: dict | None
+    :return: DataFrame with departure_date and price columns
+    :rtype: pd.DataFrame
+    """
+    owns_driver = driver is None
+    if owns_driver:
+        driver = create_chrome_driver(network_logging=extraction == "network")
+    
+    try:
+        steps = _scrape_steps(driver, url, extraction, metrics)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+            time.sleep(CALENDAR_POLL_INTERVAL)
+    finally:
+        if owns_driver:
+            driver.quit()
+
+
+def scrape_google_flights_in_tabs(
+        urls: List[str], 
+        driver: webdriver.Chrome, 
+        extraction: str = DEFAULT_EXTRACTION,
+        ) -> List[pd.DataFrame]:
+    """
+    Scrapes several Google Flights searches in parallel tabs of one browser.
+
+    Every url gets its own tab, and the tabs are advanced round-robin: while
+    one tab waits for the page to render, the others keep working.
+
+    :param urls: Google Flights search urls
+    :type urls: List[str]
+    :param driver: driver to open the tabs in, its current window is kept
+    :type driver: webdriver.Chrome
+    :param extraction: "js" or "elements", the "network" strategy falls back to
+        "js" because the performance log is shared by all tabs
+    :type extraction: str
+    :return: one DataFrame per url, in the order of `urls`
+    :rtype: List[pd.DataFrame]
+    """
+    import pandas as pd
+
+    if extraction == "network":
+        logger.warning("Network extraction is not supported with tabs, using 'js'.")
+        extraction = "js"
+
+    home = driver.current_window_handle
+    results: List[pd.DataFrame | None] = [None] * len(urls)
+    tabs = {}
+
+    try:
+        for i, url in enumerate(urls):
+            driver.switch_to.new_window('tab')
+            tabs[i] = (driver.current_window_handle, _scrape_steps(driver, url, extraction, None))
+
+        while tabs:
+            for i, (handle, steps) in list(tabs.items()):
+                try:
+                    driver.switch_to.window(handle)
+                    next(steps)
+                    continue
+                except StopIteration as done:
+                    results[i] = done.value
+                except Exception as e:
+                    logger.error(f"Tab for {urls[i]} failed: {e}")
+                    steps.close()
+
+                del tabs[i]
+                try:
+                    driver.close()
+                except Exception:
+                    pass
+
+            if tabs:
+                time.sleep(CALENDAR_POLL_INTERVAL / len(tabs))
     finally:
-        driver.quit()
+        for handle, steps in tabs.values():
+            steps.close()
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception:
+                pass
+        driver.switch_to.window(home)
+
+    return [
+        df if df is not None else pd.DataFrame(columns=['departure_date', 'price'])
+        for df in results
+    ]
 
 
 def edit_flight_data(df: pd.DataFrame) -> pd.DataFrame:
@@ -219,13 +640,71 @@ def get_flight_route_data(
         depature_date: str, 
         return_date: str | None = None, 
         one_way: bool = True,
+        driver_pool: DriverPool | None = None,
+        extraction: str = DEFAULT_EXTRACTION,
+        backend: str = DEFAULT_BACKEND,
+        http_client: HttpCalendarClient | None = None,
         ) -> pd.DataFrame:
-    
+    """
+    Scrapes the price calendar of one route.
+
+    With backend="http" the calendar is fetched without a browser first and
+    the Selenium scraper is only used when that returns nothing.
+    """
+    if backend not in SCRAPER_BACKENDS:
+        raise ValueError(f"Unknown scraper backend '{backend}', use one of {SCRAPER_BACKENDS}")
+
+    if backend == "http" and one_way:
+        try:
+            if http_client is None:
+                with HttpCalendarClient() as client:
+                    data = client.fetch_calendar(origin, dest, depature_date)
+            else:
+                data = http_client.fetch_calendar(origin, dest, depature_date)
+            if not data.empty:
+                return edit_flight_data(data)
+            logger.warning(f"HTTP backend returned no prices for {origin} -> {dest}, falling back to Selenium.")
+        except Exception as e:
+            logger.warning(f"HTTP backend failed for {origin} -> {dest}, falling back to Selenium: {e}")
+
     url, _ = generate_google_flights_url(origin, dest, depature_date, return_date, one_way)
-    data = scrape_google_flights(url)
+    metrics = {}
+    start = time.perf_counter()
+    if driver_pool is None:
+        data = scrape_google_flights(url, extraction=extraction, metrics=metrics)
+    else:
+        with driver_pool.driver() as driver:
+            data = scrape_google_flights(url, driver=driver, extraction=extraction, metrics=metrics)
+
+    if metrics:
+        logger.info(
+            f"{origin} -> {dest}: {len(data)} calendar cells in {time.perf_counter() - start:.1f}s, "
+            f"{sum(metrics['pagination_waits']):.1f}s waiting for {len(metrics['pagination_waits'])} pages, "
+            f"{metrics['render_wait']:.1f}s for the final render"
+            )
     return edit_flight_data(data)
 
 
+def get_flight_routes_data_in_tabs(
+        routes: List[Dict],
+        depature_date: str,
+        driver_pool: DriverPool,
+        extraction: str = DEFAULT_EXTRACTION,
+        ) -> List[pd.DataFrame]:
+    """
+    Scrapes several one way routes in parallel tabs of one pooled browser.
+
+    :param routes: dicts with "origin" and "dest" keys
+    :type routes: List[Dict]
+    :return: one DataFrame per route, as get_flight_route_data returns it
+    :rtype: List[pd.DataFrame]
+    """
+    urls = [generate_google_flights_url(r["origin"], r["dest"], depature_date)[0] for r in routes]
+    with driver_pool.driver() as driver:
+        data = scrape_google_flights_in_tabs(urls, driver, extraction=extraction)
+    return [edit_flight_data(df) for df in data]
+
+
 def main():
     # Simple test run
     # Example: Search Vienna to Agadir